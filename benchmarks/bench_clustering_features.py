@@ -0,0 +1,180 @@
+"""
+Проверка и бенчмарк признаков кластеризации step_4_2: create_clustering_features (схема общего слоя загрузки,
+векторные calculate_completeness / calculate_time_diff / parse_russian_dates) против прежней версии шага,
+которая читала CSV через pd.read_csv и строила признаки построчными df.apply по исходным строкам.
+
+Сначала признаки сравниваются на настоящих CSV и на CSV с крайними случаями (даты с любым префиксом,
+'Неизвестно', пустые значения), затем - на выборке из --rows строк с замером времени. Значения должны
+совпадать точно (assert_frame_equal); при расхождении скрипт завершается с кодом 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_clustering_features --rows 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.dataset import LOST_FILE, FOUND_FILE, load_combined_dataset, clear_cache
+from src.step_4_2 import create_clustering_features
+
+FEATURE_COLUMNS = [
+    'количество_фото_норм', 'длина_описания_норм', 'полнота_заполнения',
+    'скорость_публикации_дни', 'активность_обсуждения'
+]
+
+# Крайние значения, которые подставляются в исходные строки CSV
+EDGE_DATES = ['Пт, 26.09.2025', 'xx, 26.09.2025', 'пт, сб, 26.09.2025', '26.09.2025', ', 1.2.2025',
+              'пт 26.09.2025', 'пт, 31.02.2025', 'Неизвестно', '']
+EDGE_VALUES = ['', '  ', 'Неизвестно', ' Unknown ', 'Unknown', 'nan']
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Прежняя версия шага (в исходном виде, без печати): загрузка через pd.read_csv и построчные признаки
+# ----------------------------------------------------------------------------------------------------------------------
+def legacy_load_and_prepare_data(lost_file, found_file):
+    df_lost = pd.read_csv(lost_file)
+    df_found = pd.read_csv(found_file)
+    df_lost['объявление_тип'] = 'lost'
+    df_found['объявление_тип'] = 'found'
+    return pd.concat([df_lost, df_found], ignore_index=True)
+
+
+def legacy_create_clustering_features(df):
+    df['количество_фото_норм'] = df['количество_фото'].fillna(0)
+    df['длина_описания_норм'] = df['Длина_описания_в_словах'].fillna(0)
+
+    key_columns = ['тип_животного', 'порода', 'пол', 'возраст', 'окрас', 'место события']
+
+    def calculate_completeness(row):
+        filled = 0
+        total = len(key_columns)
+
+        for col in key_columns:
+            if (col in row and
+                pd.notna(row[col]) and
+                str(row[col]).strip() not in ['', 'Неизвестно', 'Unknown']):
+                filled += 1
+
+        return filled / total if total > 0 else 0
+
+    df['полнота_заполнения'] = df.apply(calculate_completeness, axis=1)
+
+    def parse_date(date_str):
+        try:
+            if pd.isna(date_str):
+                return None
+            date_part = str(date_str).split(',')[-1].strip()
+            return datetime.strptime(date_part, '%d.%m.%Y')
+        except:
+            return None
+
+    df['дата_публикации_парс'] = df['дата_публикации'].apply(parse_date)
+
+    def get_event_date(row):
+        if row['объявление_тип'] == 'lost':
+            return parse_date(row['дата пропажи'])
+        else:
+            return parse_date(row['дата находки'])
+
+    df['дата_события_парс'] = df.apply(get_event_date, axis=1)
+
+    def calculate_time_diff(row):
+        if pd.isna(row['дата_публикации_парс']) or pd.isna(row['дата_события_парс']):
+            return 0
+        diff = (row['дата_публикации_парс'] - row['дата_события_парс']).days
+        return max(0, diff)
+
+    df['скорость_публикации_дни'] = df.apply(calculate_time_diff, axis=1)
+    df['активность_обсуждения'] = df['количество_комментариев'].fillna(0)
+
+    return df[FEATURE_COLUMNS].copy().fillna(0)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Подготовка данных, сверка и замеры
+# ----------------------------------------------------------------------------------------------------------------------
+def write_sample(directory, rows=None, edge_share=0.0, seed=42):
+    """
+    Пишет в directory lost/found CSV: строки настоящих CSV (rows - случайная выборка такого размера
+    на каждый тип) с долей edge_share крайних значений в датах и ключевых полях. Возвращает пути к файлам
+    """
+    rng = np.random.default_rng(seed)
+    paths = []
+    for file_path, event_column in [(LOST_FILE, 'дата пропажи'), (FOUND_FILE, 'дата находки')]:
+        raw = pd.read_csv(file_path, dtype=str, keep_default_na=False)
+        if rows is not None:
+            raw = raw.iloc[rng.integers(0, len(raw), size=rows)].reset_index(drop=True)
+        for col in ['дата_публикации', event_column]:
+            edge = rng.random(len(raw)) < edge_share
+            raw.loc[edge, col] = rng.choice(EDGE_DATES, size=edge.sum())
+        for col in ['порода', 'пол', 'возраст', 'окрас', 'место события']:
+            edge = rng.random(len(raw)) < edge_share
+            raw.loc[edge, col] = rng.choice(EDGE_VALUES, size=edge.sum())
+        path = os.path.join(directory, os.path.basename(file_path))
+        raw.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def compare(name, lost_file, found_file, legacy_rows=None, seed=42):
+    """
+    Строит признаки обеими версиями по одним и тем же CSV и сверяет их (legacy_rows - число случайных строк
+    для прежней версии, время экстраполируется). Возвращает True при точном совпадении
+    """
+    clear_cache()
+    df = load_combined_dataset(lost_file, found_file, use_cache=False)
+    legacy_df = legacy_load_and_prepare_data(lost_file, found_file)
+    (features, _), vec_time = timed(create_clustering_features, df, False)
+
+    rows = len(legacy_df)
+    if legacy_rows is not None and legacy_rows < rows:
+        subset = np.sort(np.random.default_rng(seed).choice(rows, size=legacy_rows, replace=False))
+        legacy_df = legacy_df.iloc[subset]
+    legacy, legacy_time = timed(legacy_create_clustering_features, legacy_df)
+    legacy_time *= rows / len(legacy_df)
+
+    print(f"\n🧮 {name}: {rows:,} строк (прежняя версия - на {len(legacy_df):,})")
+    print(f"   векторно:               {vec_time:8.3f} c")
+    print(f"   прежняя (df.apply):     {legacy_time:8.3f} c  (ускорение x{legacy_time / vec_time:,.0f})")
+    try:
+        pd.testing.assert_frame_equal(features.loc[legacy.index], legacy, check_dtype=False, check_exact=True)
+    except AssertionError as e:
+        print(f"   ❌ Признаки расходятся:\n{e}")
+        return False
+    print("   ✅ Признаки совпадают")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка и бенчмарк признаков кластеризации step_4_2")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Число строк выборки каждого типа для замера")
+    parser.add_argument('--legacy-rows', type=int, default=100_000,
+                        help="Число строк для прежней версии (время экстраполируется до полного размера)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        same = compare("Настоящие CSV", LOST_FILE, FOUND_FILE)
+        edge_dir = os.path.join(directory, 'edge')
+        os.makedirs(edge_dir)
+        same &= compare("Крайние случаи", *write_sample(edge_dir, edge_share=0.3))
+        same &= compare("Выборка", *write_sample(directory, rows=args.rows, edge_share=0.05), args.legacy_rows)
+
+    if not same:
+        print("\n❌ Векторная и прежняя версии дают разные признаки")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
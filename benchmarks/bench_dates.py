@@ -0,0 +1,172 @@
+"""
+Бенчмарк разбора русских дат: векторный parse_russian_dates против построчных реализаций,
+которые раньше жили в step_1_2, step_4_2 и step_5. Перед замерами проверяются крайние случаи (EDGE_CASES):
+векторный разбор и прежний разбор step_4_2 должны дать ожидаемые даты; при расхождении скрипт завершается с кодом 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_dates --rows 1000000
+    python -m benchmarks.bench_dates --rows 1000000 --legacy-rows 1000000   # без экстраполяции, долго
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.dataset import LOST_FILE, FOUND_FILE, EVENT_DATE_COLUMNS, parse_russian_dates
+
+DAY_MAP = {'пн': 'Mon', 'вт': 'Tue', 'ср': 'Wed', 'чт': 'Thu', 'пт': 'Fri', 'сб': 'Sat', 'вс': 'Sun'}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Построчные реализации (в прежнем виде) для сравнения
+# ----------------------------------------------------------------------------------------------------------------------
+def legacy_step_1_2(date_str):
+    """step_1_2.load_and_prepare_data.parse_russian_date"""
+    try:
+        parts = date_str.split(', ')
+        if len(parts) == 2:
+            day_abbr = parts[0].strip()
+            date_part = parts[1].strip()
+
+            if day_abbr in DAY_MAP:
+                return pd.to_datetime(f"{DAY_MAP[day_abbr]}, {date_part}", format='%a, %d.%m.%Y')
+
+        return pd.to_datetime(date_str, errors='coerce')
+    except:
+        return pd.NaT
+
+
+def legacy_step_4_2(date_str):
+    """step_4_2.create_clustering_features.parse_date"""
+    try:
+        if pd.isna(date_str):
+            return None
+        date_part = str(date_str).split(',')[-1].strip()
+        return datetime.strptime(date_part, '%d.%m.%Y')
+    except:
+        return None
+
+
+def legacy_step_5(date_str):
+    """step_5.Pet911Analyzer.parse_russian_date"""
+    if pd.isna(date_str) or str(date_str).strip() in ['Неизвестно', '', 'nan']:
+        return pd.NaT
+    try:
+        parts = str(date_str).strip().split(', ')
+        if len(parts) != 2:
+            return pd.NaT
+        day_en = DAY_MAP.get(parts[0].strip())
+        if not day_en:
+            return pd.NaT
+        return pd.to_datetime(f"{day_en}, {parts[1]}", format='%a, %d.%m.%Y', errors='coerce')
+    except Exception:
+        return pd.NaT
+
+
+# Крайние случаи разбора: строка -> ожидаемая дата (None - NaT). Ожидания - как у прежнего разбора step_4_2:
+# дата после последней запятой, префикс не проверяется
+EDGE_CASES = {
+    'пт, 26.09.2025': '2025-09-26',
+    'пт,26.09.2025': '2025-09-26',
+    ' сб, 1.2.2025 ': '2025-02-01',
+    '26.09.2025': '2025-09-26',              # без дня недели
+    'Пт, 26.09.2025': '2025-09-26',          # день недели с заглавной буквы
+    'ПТ, 26.09.2025': '2025-09-26',
+    'xx, 26.09.2025': '2025-09-26',          # неизвестный день недели
+    'Friday, 26.09.2025': '2025-09-26',
+    ', 26.09.2025': '2025-09-26',            # пустой префикс
+    'пт, сб, 26.09.2025': '2025-09-26',      # несколько запятых - дата после последней
+    'пт 26.09.2025': None,                   # префикс без запятой
+    'пт, 31.02.2025': None,                  # несуществующая дата
+    'пт, 26.09.2025, 10:00': None,
+    'Неизвестно': None,
+    '': None,
+    None: None,
+}
+
+
+LEGACY_PARSERS = {
+    'step_1_2 (apply)': legacy_step_1_2,
+    'step_4_2 (apply)': legacy_step_4_2,
+    'step_5 (apply)': legacy_step_5
+}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Подготовка данных и замеры
+# ----------------------------------------------------------------------------------------------------------------------
+def build_sample(rows, seed=42):
+    """Собирает колонки дат нужной длины, сэмплируя реальные строки из обоих CSV"""
+    columns = {}
+    for dataset_type, file_path in [('lost', LOST_FILE), ('found', FOUND_FILE)]:
+        raw = pd.read_csv(file_path, dtype=str)
+        for col in ['дата_публикации', EVENT_DATE_COLUMNS[dataset_type]]:
+            columns[f"{dataset_type}: {col}"] = raw[col]
+
+    rng = np.random.default_rng(seed)
+    return {
+        name: pd.Series(rng.choice(values.to_numpy(dtype=object), size=rows), name=name)
+        for name, values in columns.items()
+    }
+
+
+def check_edge_cases():
+    """Сверяет parse_russian_dates и прежний разбор step_4_2 с EDGE_CASES; возвращает True, если все случаи совпали"""
+    values = pd.Series(list(EDGE_CASES), dtype=object)
+    expected = pd.Series(pd.to_datetime(list(EDGE_CASES.values())))
+    ok = True
+    for name, parsed in [('parse_russian_dates', parse_russian_dates(values)),
+                         ('step_4_2 (прежний)', pd.to_datetime(values.map(legacy_step_4_2)))]:
+        same = (parsed == expected) | (parsed.isna() & expected.isna())
+        failed = list(zip(values[~same], expected[~same], parsed[~same]))
+        print(f"🧪 Крайние случаи, {name}: {len(EDGE_CASES) - len(failed)} из {len(EDGE_CASES)} совпадают")
+        for value, expected_date, result in failed:
+            print(f"   ❌ {value!r}: ожидалось {expected_date}, получено {result}")
+        ok = ok and not failed
+    return ok
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(rows, legacy_rows=None):
+    samples = build_sample(rows)
+    legacy_rows = min(legacy_rows or rows, rows)
+
+    print(f"📊 Строк в колонке: {rows:,}; построчные версии на {legacy_rows:,} строк")
+    if legacy_rows < rows:
+        print("   (время построчных версий линейно экстраполировано до полного размера)")
+
+    for name, values in samples.items():
+        vectorized, vec_time = timed(parse_russian_dates, values)
+        print(f"\n🗓  {name} (уникальных значений: {values.nunique()})")
+        print(f"   parse_russian_dates: {vec_time:8.3f} c")
+
+        subset = values.iloc[:legacy_rows]
+        for legacy_name, parser in LEGACY_PARSERS.items():
+            legacy, legacy_time = timed(subset.apply, parser)
+            legacy_time *= rows / legacy_rows
+            same = pd.to_datetime(legacy).equals(vectorized.iloc[:legacy_rows])
+            print(f"   {legacy_name:20}: {legacy_time:8.3f} c  "
+                  f"(ускорение x{legacy_time / vec_time:,.0f}, совпадает: {'да' if same else 'нет'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора русских дат")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Размер каждой колонки")
+    parser.add_argument('--legacy-rows', type=int, default=100_000,
+                        help="Число строк для построчных версий (время экстраполируется до --rows)")
+    args = parser.parse_args()
+    if not check_edge_cases():
+        sys.exit(1)
+    run(args.rows, args.legacy_rows)
+
+
+if __name__ == '__main__':
+    main()
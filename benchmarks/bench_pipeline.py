@@ -0,0 +1,369 @@
+"""
+Бенчмарк конвейера на синтетических данных разного объёма: каждый шаг step_* и горячие внутренние функции
+(analyze_regions, prepare_weekly_data, preprocess_text, create_clustering_features, find_optimal_clusters,
+Pet911Analyzer.prepare_data) на 10 тыс., 100 тыс. и 1 млн строк.
+
+Каждый замер - отдельный процесс (чистый пик памяти): время (wall), процессорное время (с дочерними процессами
+отрисовки и лемматизации), пиковый RSS и объём результата (файлы шага на диске или размер возвращённых данных).
+Данные генерирует src.synthetic (data/synthetic/<rows>, повторно используются), кэши и results - во временной
+папке отдельно для каждого объёма, поэтому шаги 4.1 и 4.2 замеряются как первый анализ нового архива.
+Перед шагами замеряется холодная загрузка CSV (load_dataset), после неё шаги читают колоночный кэш.
+
+Результаты дописываются в историю (benchmarks/history.json) и сравниваются с сохранённым базовым запуском
+(benchmarks/baseline.json): рост времени или памяти больше допуска - регрессия, скрипт завершается с кодом 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_pipeline --rows 10000 100000 1000000
+    python -m benchmarks.bench_pipeline --rows 10000 --save-baseline
+    python -m benchmarks.bench_pipeline --rows 100000 --targets step_4_1 preprocess_text --tolerance 0.3
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_FILE = os.path.join(PROJECT_ROOT, 'benchmarks', 'history.json')
+BASELINE_FILE = os.path.join(PROJECT_ROOT, 'benchmarks', 'baseline.json')
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+
+# Допуск регрессии (доля роста) и порог, ниже которого время считается шумом
+DEFAULT_TOLERANCE = 0.20
+MIN_SECONDS = 0.5
+COMPARED_METRICS = ('wall_s', 'cpu_s', 'peak_rss_mb')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Цели замера: функция подготовки возвращает (вызываемый объект, аргументы); подготовка в замер не входит
+# ----------------------------------------------------------------------------------------------------------------------
+def setup_load_dataset():
+    from src.dataset import load_dataset
+    return lambda: [load_dataset(dataset_type) for dataset_type in ('lost', 'found')], ()
+
+
+def setup_step(name):
+    def setup():
+        from src.pipeline import STEPS_BY_NAME
+        return STEPS_BY_NAME[name].func, ()
+    return setup
+
+
+def setup_analyze_regions():
+    from src.dataset import LOST_FILE
+    from src.step_1_1 import load_and_prepare_data, analyze_regions
+    return analyze_regions, (load_and_prepare_data(LOST_FILE, 'lost'), 5)
+
+
+def setup_prepare_weekly_data():
+    from src.dataset import LOST_FILE
+    from src.step_1_2 import load_and_prepare_data, prepare_weekly_data
+    return prepare_weekly_data, (load_and_prepare_data(LOST_FILE, 'lost'),)
+
+
+def setup_preprocess_text():
+    from src.dataset import LOST_FILE, FOUND_FILE
+    from src.lemmatizer import LemmaCache
+    from src.step_4_1 import load_and_prepare_data, setup_russian_analysis, preprocess_text
+    texts = load_and_prepare_data(LOST_FILE, FOUND_FILE)['описание'].tolist()
+    stopwords_list, morph = setup_russian_analysis()
+    # Пустой кэш лемм: замеряется лемматизация нового архива
+    cache = LemmaCache()
+    return lambda: [preprocess_text(text, stopwords_list, morph, cache) for text in texts], ()
+
+
+def setup_create_clustering_features():
+    from src.dataset import LOST_FILE, FOUND_FILE
+    from src.step_4_2 import load_and_prepare_data, create_clustering_features
+    return create_clustering_features, (load_and_prepare_data(LOST_FILE, FOUND_FILE), False)
+
+
+def setup_find_optimal_clusters():
+    from src.deps import StandardScaler
+    from src.dataset import LOST_FILE, FOUND_FILE
+    from src.step_4_2 import load_and_prepare_data, create_clustering_features, create_directories, find_optimal_clusters
+    features, _ = create_clustering_features(load_and_prepare_data(LOST_FILE, FOUND_FILE), verbose=False)
+    _, clustering_dir = create_directories()
+    return find_optimal_clusters, (StandardScaler().fit_transform(features), clustering_dir)
+
+
+def setup_pet911_prepare_data():
+    from src.step_5 import Pet911Analyzer
+    analyzer = Pet911Analyzer()
+
+    def prepare():
+        analyzer.prepare_data()
+        return [analyzer.lost_df, analyzer.found_df]
+    return prepare, ()
+
+
+# Порядок замеров: загрузка, шаги в порядке конвейера (3.2 читает статистику 3.1), затем внутренние функции
+TARGETS = {
+    'load_dataset': ('load', setup_load_dataset),
+    **{name: ('step', setup_step(name)) for name in (
+        'step_1_1', 'step_1_2', 'step_2_1', 'step_2_2', 'step_3_1', 'step_3_2', 'step_4_1', 'step_4_2', 'step_5'
+    )},
+    'analyze_regions': ('function', setup_analyze_regions),
+    'prepare_weekly_data': ('function', setup_prepare_weekly_data),
+    'preprocess_text': ('function', setup_preprocess_text),
+    'create_clustering_features': ('function', setup_create_clustering_features),
+    'find_optimal_clusters': ('function', setup_find_optimal_clusters),
+    'Pet911Analyzer.prepare_data': ('function', setup_pet911_prepare_data),
+}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Замер в отдельном процессе
+# ----------------------------------------------------------------------------------------------------------------------
+def cpu_seconds(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
+def path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def result_size(value):
+    """Объём возвращённых данных в байтах (таблицы pandas - с содержимым строк)"""
+    if hasattr(value, 'memory_usage'):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if isinstance(value, (list, tuple)):
+        return sum(result_size(item) for item in value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+def step_outputs_size(name):
+    """Размер файлов, которые шаг записал в results (по выходам из описания шагов конвейера)"""
+    from src.pipeline import STEPS_BY_NAME
+    paths = {path for output in STEPS_BY_NAME[name].outputs for path in glob.glob(output)}
+    return sum(path_size(path) for path in paths)
+
+
+def measure(target):
+    """Выполняет цель в текущем процессе и возвращает замеры"""
+    kind, setup = TARGETS[target]
+    func, args = setup()
+
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    result = func(*args)
+    wall = time.perf_counter() - start
+    self_after = resource.getrusage(resource.RUSAGE_SELF)
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return {
+        'wall_s': round(wall, 3),
+        'cpu_s': round(cpu_seconds(self_after) - cpu_seconds(self_before)
+                       + cpu_seconds(children_after) - cpu_seconds(children_before), 3),
+        # ru_maxrss в Linux - в килобайтах; пик с учётом процессов-исполнителей
+        'peak_rss_mb': round(max(self_after.ru_maxrss, children_after.ru_maxrss) / 1024, 1),
+        'output_bytes': step_outputs_size(target) if kind == 'step' else result_size(result),
+    }
+
+
+def run_target(target, rows, data_dir, work_dir, timeout=None, render_profile=None):
+    """Запускает замер цели в отдельном процессе; при ошибке или превышении времени - статус failed/timeout"""
+    result_file = os.path.join(work_dir, f'.{target}.json')
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT, MPLBACKEND='Agg',
+               PET911_DATA_DIR=data_dir, PET911_CACHE_DIR=os.path.join(work_dir, 'cache'))
+    if render_profile:
+        env['PET911_RENDER_PROFILE'] = render_profile
+
+    record = {'rows': rows, 'target': target, 'kind': TARGETS[target][0]}
+    log_path = os.path.join(work_dir, f'{target}.log')
+    try:
+        with open(log_path, 'w', encoding='utf-8') as log:
+            subprocess.run([sys.executable, '-m', 'benchmarks.bench_pipeline', '--measure', target,
+                            '--result-file', result_file],
+                           cwd=work_dir, env=env, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                           timeout=timeout, check=True)
+        with open(result_file, 'r', encoding='utf-8') as f:
+            record.update(json.load(f))
+        record['status'] = 'ok'
+    except subprocess.TimeoutExpired:
+        record['status'] = 'timeout'
+    except subprocess.CalledProcessError:
+        record['status'] = 'failed'
+        record['log'] = log_path
+    return record
+
+
+def prepare_data(rows, seed):
+    """Синтетические CSV для объёма rows (генерируются один раз, дальше используются повторно)"""
+    from src.dataset import DATASET_FILES
+    from src.synthetic import SYNTHETIC_DIR, generate_datasets
+
+    data_dir = os.path.join(PROJECT_ROOT, SYNTHETIC_DIR, f'{rows}-seed{seed}')
+    if not all(os.path.exists(os.path.join(data_dir, os.path.basename(path))) for path in DATASET_FILES.values()):
+        print(f"⚙️ Генерация синтетических данных: {rows:,} строк")
+        generate_datasets(rows, data_dir, seed)
+    return data_dir
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# История, базовый запуск и сравнение
+# ----------------------------------------------------------------------------------------------------------------------
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def find_regressions(records, baseline, tolerance, min_seconds=MIN_SECONDS):
+    """
+    Сравнивает замеры с базовым запуском по (объём, цель): рост метрики больше чем в 1 + tolerance раз - регрессия.
+    Времена меньше min_seconds в обоих запусках не сравниваются (шум). Шаг, который раньше проходил,
+    а теперь упал или не уложился во время, - тоже регрессия.
+    """
+    reference = {(item['rows'], item['target']): item for item in baseline.get('results', [])}
+    regressions = []
+    for record in records:
+        base = reference.get((record['rows'], record['target']))
+        if base is None or base.get('status') != 'ok':
+            continue
+        if record['status'] != 'ok':
+            regressions.append((record, 'status', base['status'], record['status']))
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = base.get(metric), record.get(metric)
+            if not old or new is None:
+                continue
+            if metric != 'peak_rss_mb' and max(old, new) < min_seconds:
+                continue
+            if new > old * (1 + tolerance):
+                regressions.append((record, metric, old, new))
+    return regressions
+
+
+def format_bytes(size):
+    for unit in ('Б', 'КБ', 'МБ', 'ГБ'):
+        if size < 1024 or unit == 'ГБ':
+            return f"{size:.0f} {unit}" if unit == 'Б' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def print_table(records):
+    print(f"\n{'строк':>10}  {'цель':<28} {'статус':<8} {'wall, c':>9} {'cpu, c':>9} {'пик RSS, МБ':>12} {'результат':>10}")
+    for record in records:
+        if record['status'] == 'ok':
+            print(f"{record['rows']:>10,}  {record['target']:<28} {'ok':<8} {record['wall_s']:>9.2f} "
+                  f"{record['cpu_s']:>9.2f} {record['peak_rss_mb']:>12.1f} {format_bytes(record['output_bytes']):>10}")
+        else:
+            print(f"{record['rows']:>10,}  {record['target']:<28} {record['status']:<8}")
+
+
+def run(rows_list, targets, seed=42, tolerance=DEFAULT_TOLERANCE, timeout=None, render_profile=None,
+        history_file=HISTORY_FILE, baseline_file=BASELINE_FILE, save_baseline=False, keep_work=False):
+    records = []
+    for rows in rows_list:
+        data_dir = prepare_data(rows, seed)
+        work_dir = tempfile.mkdtemp(prefix=f'pet911_bench_{rows}_')
+        print(f"\n📊 {rows:,} строк (рабочая папка {work_dir})")
+        try:
+            for target in targets:
+                record = run_target(target, rows, data_dir, work_dir, timeout, render_profile)
+                records.append(record)
+                if record['status'] == 'ok':
+                    print(f"   ✅ {target}: {record['wall_s']:.2f} c, cpu {record['cpu_s']:.2f} c, "
+                          f"пик {record['peak_rss_mb']:.0f} МБ")
+                else:
+                    print(f"   ❌ {target}: {record['status']}" + (f" (лог: {record['log']})" if 'log' in record else ''))
+        finally:
+            if not keep_work:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    run_record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'render_profile': render_profile or os.environ.get('PET911_RENDER_PROFILE') or 'print',
+        'results': records,
+    }
+    history = load_json(history_file, [])
+    history.append(run_record)
+    save_json(history_file, history)
+
+    print_table(records)
+    print(f"\n💾 История замеров: {history_file}")
+
+    ok = True
+    baseline = load_json(baseline_file, None)
+    if baseline is not None:
+        regressions = find_regressions(records, baseline, tolerance)
+        print(f"📏 Сравнение с базовым запуском {baseline.get('commit')} ({baseline.get('timestamp')}), "
+              f"допуск {tolerance:.0%}: регрессий {len(regressions)}")
+        for record, metric, old, new in regressions:
+            change = f"{old} -> {new}" if metric == 'status' else f"{old:.2f} -> {new:.2f} (x{new / old:.2f})"
+            print(f"   ⚠️ {record['rows']:,} строк, {record['target']}: {metric} {change}")
+        ok = not regressions
+
+    if save_baseline:
+        save_json(baseline_file, run_record)
+        print(f"💾 Базовый запуск сохранён: {baseline_file}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк шагов конвейера на синтетических данных")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="Объёмы данных (строк)")
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS),
+                        help="Шаги и функции для замера (по умолчанию все)")
+    parser.add_argument('--seed', type=int, default=42, help="Зерно генератора синтетических данных")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Допустимый рост времени и памяти относительно базового запуска (доля)")
+    parser.add_argument('--timeout', type=float, default=None, help="Ограничение времени одного замера, с")
+    parser.add_argument('--render-profile', default=None, help="Профиль отрисовки графиков (draft, web, print)")
+    parser.add_argument('--history', default=HISTORY_FILE, help="Файл истории замеров")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="Файл базового запуска")
+    parser.add_argument('--save-baseline', action='store_true', help="Сохранить этот запуск как базовый")
+    parser.add_argument('--keep-work', action='store_true', help="Не удалять рабочие папки (results, кэши, логи)")
+    # Внутренний режим: замер одной цели в отдельном процессе
+    parser.add_argument('--measure', choices=list(TARGETS), help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        save_json(args.result_file, measure(args.measure))
+        return
+
+    if not run(args.rows, args.targets, args.seed, args.tolerance, args.timeout, args.render_profile,
+               args.history, args.baseline, args.save_baseline, args.keep_work):
+        print("\n❌ Найдены регрессии относительно базового запуска")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Бенчмарк времени запуска: сколько стоит импорт модулей src (по данным python -X importtime)
+и не подтягивает ли он тяжёлые библиотеки (sklearn, scipy, seaborn, nltk, pymorphy3, matplotlib.pyplot),
+которые src.deps загружает только при первом обращении.
+Если медианное время импорта превышает бюджет или тяжёлая библиотека загружается при импорте,
+скрипт завершается с кодом 1 - его можно запускать как регрессионную проверку.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --targets src.step_3_2 src.server --repeats 10 --budget-ms 800
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Модули, время импорта которых отслеживается (прогноз 3.2 и сервис - холодный старт виден пользователю)
+TARGETS = {
+    'src.step_3_2': 'прогноз 3.2 (CLI)',
+    'src.server': 'сервис прогноза',
+    'src.step_2_1': 'отдельный шаг',
+    'src': 'пакет целиком',
+}
+
+# Библиотеки, которые не должны загружаться при импорте (только при использовании)
+HEAVY_MODULES = ('sklearn', 'scipy', 'seaborn', 'nltk', 'pymorphy3', 'matplotlib.pyplot')
+
+# Бюджет на импорт одного модуля, мс (до отложенных импортов - около 2100 мс, после - около 450 мс)
+STARTUP_BUDGET_MS = 1000
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr):
+    """Строки 'import time: self | cumulative | module' -> {модуль: (self мкс, cumulative мкс)}"""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(target):
+    """Импорт target в чистом процессе: (время импорта в мс, загруженные тяжёлые библиотеки, времена модулей)"""
+    code = (f"import sys, {target}; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, check=True)
+    times = parse_importtime(result.stderr)
+    heavy = [name for name in result.stdout.strip().split(',') if name]
+    return times[target][1] / 1000, heavy, times
+
+
+def run(targets, repeats, budget_ms, top):
+    print(f"⏱️ Импорт модулей: медиана из {repeats} запусков, бюджет {budget_ms:.0f} мс")
+
+    ok = True
+    for target in targets:
+        runs = [measure(target) for _ in range(repeats)]
+        median_ms = statistics.median(elapsed for elapsed, _, _ in runs)
+        heavy = sorted({name for _, loaded, _ in runs for name in loaded})
+        target_ok = median_ms <= budget_ms and not heavy
+        ok &= target_ok
+
+        print(f"\n{'✅' if target_ok else '❌'} {target} ({TARGETS.get(target, '')}): {median_ms:7.1f} мс "
+              f"(мин {min(elapsed for elapsed, _, _ in runs):.1f}, макс {max(elapsed for elapsed, _, _ in runs):.1f})")
+        if heavy:
+            print(f"   загружены при импорте: {', '.join(heavy)}")
+
+        # Самые дорогие модули последнего запуска (собственное время, без вложенных импортов)
+        times = runs[-1][2]
+        for name, (self_us, _) in sorted(times.items(), key=lambda item: -item[1][0])[:top]:
+            print(f"   {self_us / 1000:7.1f} мс  {name}")
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк времени импорта модулей src")
+    parser.add_argument('--targets', nargs='+', default=list(TARGETS), help="Модули для замера")
+    parser.add_argument('--repeats', type=int, default=5, help="Число запусков на модуль")
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help="Допустимое медианное время импорта, мс")
+    parser.add_argument('--top', type=int, default=5, help="Сколько самых дорогих модулей показать")
+    args = parser.parse_args()
+    if not run(args.targets, args.repeats, args.budget_ms, args.top):
+        print("\n❌ Время запуска превышает бюджет или тяжёлые библиотеки загружаются при импорте")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Бенчмарк потокового TF-IDF (src.corpus.streaming_tfidf) на сгенерированных корпусах растущего объёма:
+словарь корпуса растёт вместе с ним (номера слов по закону Ципфа), порции текстов создаются на лету.
+Проверки (при нарушении скрипт завершается с кодом 1):
+  - пик памяти (tracemalloc) на самом большом корпусе не больше чем на (1 + --tolerance) выше, чем на самом малом;
+  - на самом малом корпусе результат совпадает с TfidfVectorizer: те же термины (кроме равных по числу вхождений
+    на границе max_features) и средний TF-IDF с точностью до 1e-9.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_streaming_tfidf
+    python -m benchmarks.bench_streaming_tfidf --docs 10000 100000 1000000 --max-terms 5000
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from src.corpus import STREAM_CHUNK_SIZE, STREAM_MAX_TERMS, streaming_tfidf
+from src.step_4_1 import TFIDF_PARAMS
+
+DEFAULT_DOCS = [10_000, 40_000, 160_000]
+DEFAULT_TOLERANCE = 0.25
+WORDS_PER_DOC = 20
+
+
+def make_chunks(docs, seed=42, chunk_size=STREAM_CHUNK_SIZE):
+    """Фабрика итераторов порций (тексты, метки): одинаковые порции при каждом вызове, корпус не хранится"""
+    def chunks():
+        for start in range(0, docs, chunk_size):
+            size = min(chunk_size, docs - start)
+            rng = np.random.default_rng([seed, start])
+            words = rng.zipf(1.3, size=(size, WORDS_PER_DOC))
+            texts = [" ".join(f"w{word}" for word in row) for row in words]
+            yield texts, rng.random(size) < 0.3
+    return chunks
+
+
+def measure(docs, max_terms):
+    """Время и пик памяти streaming_tfidf на корпусе из docs документов"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = streaming_tfidf(make_chunks(docs), TFIDF_PARAMS, max_terms=max_terms)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def check_exact(docs, result):
+    """Сверяет результат с TfidfVectorizer на том же корпусе; возвращает True при совпадении"""
+    texts, labels = [], []
+    for chunk_texts, chunk_labels in make_chunks(docs)():
+        texts += chunk_texts
+        labels.append(chunk_labels)
+    labels = np.concatenate(labels)
+    vectorizer = TfidfVectorizer(**TFIDF_PARAMS)
+    X = vectorizer.fit_transform(texts)
+    exact = pd.DataFrame({
+        'word': vectorizer.get_feature_names_out(),
+        'success_tfidf': X[labels].mean(axis=0).A1,
+        'fail_tfidf': X[~labels].mean(axis=0).A1
+    })
+
+    merged = exact.merge(result, on='word', how='outer', suffixes=('_exact', '_stream'), indicator=True)
+    differing = merged[merged['_merge'] != 'both']
+    both = merged[merged['_merge'] == 'both']
+    error = max((both[f'{col}_stream'] - both[f'{col}_exact']).abs().max() for col in ('success_tfidf', 'fail_tfidf'))
+    print(f"🧪 Сверка с TfidfVectorizer ({docs:,} документов): общих терминов {len(both)} из {len(exact)}, "
+          f"наибольшее расхождение TF-IDF {error:.1e}")
+    if len(differing):
+        # Выбор среди равных по числу вхождений на границе max_features зависит от порядка сортировки
+        print(f"   различаются {len(differing)} терминов (равные по числу вхождений на границе max_features)")
+    return error < 1e-9 and len(differing) <= 0.01 * len(exact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк потокового TF-IDF")
+    parser.add_argument('--docs', type=int, nargs='+', default=DEFAULT_DOCS, help="Размеры корпусов")
+    parser.add_argument('--max-terms', type=int, default=STREAM_MAX_TERMS, help="Ограничение словаря кандидатов")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Допустимый рост пика памяти от самого малого корпуса к самому большому")
+    args = parser.parse_args()
+
+    peaks = []
+    for docs in sorted(args.docs):
+        result, elapsed, peak = measure(docs, args.max_terms)
+        peaks.append(peak)
+        print(f"📊 {docs:>9,} документов: {elapsed:7.2f} c, пик памяти {peak:6.1f} МБ, терминов {len(result)}")
+        if docs == min(args.docs) and not check_exact(docs, result):
+            print("❌ Результат расходится с TfidfVectorizer")
+            sys.exit(1)
+
+    growth = peaks[-1] / peaks[0] - 1
+    print(f"📈 Рост пика памяти: {growth:+.0%} (допуск {args.tolerance:.0%})")
+    if growth > args.tolerance:
+        print("❌ Память потокового TF-IDF растёт с объёмом корпуса")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,19 +2,36 @@ import shutil
 import os
 
 from src import *
+from src.pipeline import run_pipeline, build_arg_parser
+from src.metrics import metrics_enabled, print_metrics_summary
 
 results_dir = 'results'
-if os.path.exists(results_dir):
-    shutil.rmtree(results_dir)
-    os.makedirs(results_dir, exist_ok=True)
 
 if __name__ == "__main__":
-    step_1_1()
-    step_1_2()
-    step_2_1()
-    step_2_2()
-    step_3_1()
-    step_3_2()
-    step_4_1()
-    step_4_2()
-    step_5()
\ No newline at end of file
+    args = build_arg_parser().parse_args()
+
+    if args.clean and os.path.exists(results_dir):
+        shutil.rmtree(results_dir)
+    os.makedirs(results_dir, exist_ok=True)
+
+    # Профиль и формат графиков передаются шагам (и их процессам) через переменные окружения
+    if args.render_profile:
+        os.environ['PET911_RENDER_PROFILE'] = args.render_profile
+    if args.render_format:
+        os.environ['PET911_RENDER_FORMAT'] = args.render_format
+
+    # Пик памяти фаз через tracemalloc (замедляет шаги, поэтому только по запросу)
+    if args.trace_memory:
+        os.environ['PET911_METRICS_MEMORY'] = '1'
+
+    # Профилирование выбранных шагов (src/profiling.py)
+    if args.profile:
+        os.environ['PET911_PROFILE'] = ','.join(args.profile)
+    if args.profiler:
+        os.environ['PET911_PROFILER'] = args.profiler
+
+    run_pipeline(workers=args.workers, step_names=args.steps, force=args.force)
+
+    # Сводка по времени и памяти шагов (подробно по фазам - results/run_metrics.json)
+    if metrics_enabled():
+        print_metrics_summary()
\ No newline at end of file
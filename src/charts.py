@@ -0,0 +1,329 @@
+from .deps import *
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import inspect
+
+from .metrics import instrumented
+
+matplotlib = lazy_import('matplotlib')
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Отрисовка графиков в два этапа: шаг считает данные графика и описывает его (ChartSpec),
+# а сохранение PNG (самая долгая часть - растеризация в 300 dpi) выполняется пачкой в пуле процессов с бэкендом Agg
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Параметры savefig по умолчанию (как во всех шагах)
+SAVEFIG_DEFAULTS = {'dpi': 300, 'bbox_inches': 'tight'}
+
+# Профили отрисовки (PET911_RENDER_PROFILE или --render-profile):
+#   print - как раньше: параметры savefig шага (300 dpi, обрезка полей по содержимому);
+#   web   - умеренное разрешение и сжатый PNG (Pillow optimize);
+#   draft - черновик для проверок и разработки: низкое разрешение, без второго прохода bbox_inches='tight'
+#           и без подписей значений на столбцах.
+# Параметры профиля дополняют параметры savefig графика
+RENDER_PROFILES = {
+    'print': {'savefig': {}, 'annotations': True},
+    'web': {'savefig': {'dpi': 110, 'pil_kwargs': {'optimize': True}}, 'annotations': True},
+    'draft': {'savefig': {'dpi': 60, 'bbox_inches': None}, 'annotations': False},
+}
+DEFAULT_RENDER_PROFILE = 'print'
+
+# Формат файлов графиков (PET911_RENDER_FORMAT или --render-format): png, webp или векторный svg
+RENDER_FORMATS = ('png', 'webp', 'svg')
+
+# Параметры rcParams, которые не влияют на картинку и не передаются в процессы отрисовки
+STYLE_IGNORED = ('backend', 'backend_fallback', 'interactive')
+
+# Кэш отрисовки: для каждого графика хранится ключ (хэш данных, функции рисования, стиля, параметров savefig и пути).
+# Если ключ не изменился и файл на месте, график не перерисовывается. Записи - по одному JSON на график,
+# поэтому параллельные шаги не пишут в один файл
+RENDER_CACHE_DIR = os.path.join('results', '.render_cache')
+
+
+def render_workers():
+    """Число процессов отрисовки: переменная окружения PET911_RENDER_WORKERS или число ядер"""
+    return int(os.environ.get('PET911_RENDER_WORKERS') or os.cpu_count() or 1)
+
+
+def render_cache_enabled():
+    """Кэш отрисовки можно отключить переменной окружения PET911_RENDER_CACHE=0"""
+    return os.environ.get('PET911_RENDER_CACHE', '1') != '0'
+
+
+def render_profile():
+    """Имя профиля отрисовки из переменной окружения PET911_RENDER_PROFILE (по умолчанию print)"""
+    name = os.environ.get('PET911_RENDER_PROFILE') or DEFAULT_RENDER_PROFILE
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Неизвестный профиль отрисовки {name!r}, доступны: {', '.join(RENDER_PROFILES)}")
+    return name
+
+
+def render_format():
+    """Формат файлов графиков из переменной окружения PET911_RENDER_FORMAT (по умолчанию png)"""
+    fmt = (os.environ.get('PET911_RENDER_FORMAT') or 'png').lower()
+    if fmt not in RENDER_FORMATS:
+        raise ValueError(f"Неизвестный формат графиков {fmt!r}, доступны: {', '.join(RENDER_FORMATS)}")
+    return fmt
+
+
+def chart_annotations():
+    """Рисовать ли подписи значений на графиках (в черновом профиле они не рисуются)"""
+    return RENDER_PROFILES[render_profile()]['annotations']
+
+
+def output_params(path, save=None):
+    """
+    Путь файла и параметры savefig с учётом профиля и формата: расширение .png заменяется на выбранный формат,
+    параметры профиля дополняют параметры графика (save, по умолчанию SAVEFIG_DEFAULTS).
+    """
+    params = dict(SAVEFIG_DEFAULTS if save is None else save)
+    params.update(RENDER_PROFILES[render_profile()]['savefig'])
+
+    fmt = render_format()
+    root, ext = os.path.splitext(path)
+    if ext.lower() == '.png' and fmt != 'png':
+        path = f'{root}.{fmt}'
+    if fmt == 'svg':
+        # Векторный формат: Pillow не участвует, dpi влияет только на растровые элементы
+        params.pop('pil_kwargs', None)
+    return path, params
+
+
+def current_style():
+    """Отличия текущих rcParams от значений matplotlib по умолчанию (стиль, шрифты, палитра seaborn)"""
+    defaults = matplotlib.rcParamsDefault
+    return {
+        key: value for key, value in matplotlib.rcParams.items()
+        if key not in STYLE_IGNORED and value != defaults.get(key)
+    }
+
+
+class ChartSpec:
+    """
+    Описание графика: функция рисования (уровня модуля, чтобы передаваться в другой процесс),
+    её аргументы - уже посчитанные данные графика, путь к файлу, параметры savefig и стиль rcParams.
+    """
+
+    def __init__(self, path, draw, args=(), kwargs=None, save=None, style=None):
+        self.path, self.save = output_params(path, save)
+        self.draw = draw
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.style = current_style() if style is None else style
+        # Профиль влияет не только на savefig (подписи значений), поэтому входит в ключ кэша
+        self.profile = render_profile()
+        self._key = None
+
+    def __repr__(self):
+        return f"ChartSpec({self.path!r}, {self.draw.__module__}.{self.draw.__name__})"
+
+    @property
+    def key(self):
+        """Ключ кэша: меняется при изменении данных, кода рисования, стиля, профиля, параметров сохранения или пути"""
+        if self._key is None:
+            digest = hashlib.sha256()
+            for part in (os.path.normpath(self.path), matplotlib.__version__, draw_source_hash(self.draw),
+                         self.args, self.kwargs, self.style, self.profile, self.save):
+                hash_value(digest, part)
+            self._key = digest.hexdigest()
+        return self._key
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Ключи и записи кэша отрисовки
+# ----------------------------------------------------------------------------------------------------------------------
+_SOURCE_HASHES = {}
+
+
+def draw_source_hash(draw):
+    """Хэш исходного кода функции рисования (изменение оформления графика сбрасывает кэш)"""
+    name = f"{draw.__module__}.{draw.__qualname__}"
+    if name not in _SOURCE_HASHES:
+        try:
+            source = inspect.getsource(draw)
+        except (OSError, TypeError):
+            source = ''
+        _SOURCE_HASHES[name] = hashlib.sha256(f"{name}\n{source}".encode('utf-8')).hexdigest()
+    return _SOURCE_HASHES[name]
+
+
+def hash_value(digest, value):
+    """
+    Добавляет значение в хэш. Таблицы pandas и массивы numpy хэшируются по содержимому
+    (с индексом, именами колонок и типами), словари - независимо от порядка ключей.
+    """
+    if isinstance(value, pd.DataFrame):
+        digest.update(f"DataFrame{list(value.columns)!r}{list(value.dtypes)!r}{value.index.dtype!r}".encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(f"Series{value.name!r}{value.dtype!r}{value.index.dtype!r}".encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Index):
+        digest.update(f"Index{value.dtype!r}".encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"ndarray{value.dtype.str}{value.shape}".encode('utf-8'))
+        if value.dtype.hasobject:
+            for item in value.ravel():
+                hash_value(digest, item)
+        else:
+            digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(f"dict{len(value)}".encode('utf-8'))
+        for key in sorted(value, key=repr):
+            hash_value(digest, key)
+            hash_value(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}".encode('utf-8'))
+        for item in value:
+            hash_value(digest, item)
+    else:
+        digest.update(f"{type(value).__name__}:{value!r};".encode('utf-8'))
+
+
+def cache_entry_path(path):
+    name = hashlib.sha1(os.path.normpath(path).encode('utf-8')).hexdigest()
+    return os.path.join(RENDER_CACHE_DIR, f'{name}.json')
+
+
+def load_cache_entry(path):
+    entry_path = cache_entry_path(path)
+    if not os.path.exists(entry_path):
+        return None
+    try:
+        with open(entry_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_cached(spec, entry):
+    """Файл графика на месте, не менялся после отрисовки и нарисован с тем же ключом"""
+    if entry is None or entry.get('key') != spec.key or not os.path.exists(spec.path):
+        return False
+    stat = os.stat(spec.path)
+    return entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+
+
+def save_cache_entry(spec, entry, status):
+    """Обновляет запись графика: ключ, размер и время изменения файла, счётчики попаданий и промахов"""
+    entry = dict(entry or {})
+    stat = os.stat(spec.path)
+    entry.update({
+        'path': spec.path,
+        'key': spec.key,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'last_status': status,
+        'hits': entry.get('hits', 0) + (status == 'hit'),
+        'misses': entry.get('misses', 0) + (status == 'miss'),
+        'updated_at': datetime.now().isoformat(timespec='seconds')
+    })
+    os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+    entry_path = cache_entry_path(spec.path)
+    tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, entry_path)
+
+
+def render_manifest():
+    """Все записи кэша отрисовки: путь графика -> запись (ключ, последний статус, счётчики)"""
+    manifest = {}
+    if os.path.isdir(RENDER_CACHE_DIR):
+        for name in sorted(os.listdir(RENDER_CACHE_DIR)):
+            if name.endswith('.json'):
+                with open(os.path.join(RENDER_CACHE_DIR, name), 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                manifest[entry['path']] = entry
+    return manifest
+
+
+def render_chart(spec):
+    """
+    Рисует и сохраняет один график. Стиль задаётся только описанием графика,
+    поэтому результат не зависит от того, в каком процессе и после каких графиков он рисуется.
+    """
+    with plt.rc_context():
+        matplotlib.rcParams.update({key: value for key, value in matplotlib.rcParamsDefault.items()
+                                    if key not in STYLE_IGNORED})
+        matplotlib.rcParams.update(spec.style)
+        try:
+            spec.draw(*spec.args, **spec.kwargs)
+            plt.savefig(spec.path, **spec.save)
+        finally:
+            plt.close('all')
+    return spec.path
+
+
+def _init_worker():
+    # Процессы отрисовки не показывают окон: растровый бэкенд без GUI
+    matplotlib.use('Agg', force=True)
+    warnings.filterwarnings('ignore')
+
+
+@instrumented('render')
+def render_charts(specs, workers=None, use_cache=None):
+    """
+    Рисует графики: один процесс или один график - в текущем процессе, иначе в пуле процессов.
+    Графики, чей ключ совпадает с записью кэша, не перерисовываются.
+    Возвращает пути файлов в порядке описаний.
+    """
+    specs = list(specs)
+    if workers is None:
+        workers = render_workers()
+    if use_cache is None:
+        use_cache = render_cache_enabled()
+
+    entries = [load_cache_entry(spec.path) if use_cache else None for spec in specs]
+    cached = [use_cache and is_cached(spec, entry) for spec, entry in zip(specs, entries)]
+    misses = [spec for spec, hit in zip(specs, cached) if not hit]
+
+    workers = max(1, min(workers, len(misses)))
+    if workers == 1:
+        for spec in misses:
+            render_chart(spec)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            list(executor.map(render_chart, misses))
+
+    if use_cache:
+        for spec, entry, hit in zip(specs, entries, cached):
+            save_cache_entry(spec, entry, 'hit' if hit else 'miss')
+        if len(specs) > 1:
+            print(f"🖼️ Графики: нарисовано {len(misses)}, без изменений (из кэша) {len(specs) - len(misses)}")
+
+    return [spec.path for spec in specs]
+
+
+# Открытые пачки графиков (вложенные chart_batch складывают графики во внешнюю пачку)
+_BATCHES = []
+
+
+def submit_chart(path, draw, *args, save=None, **kwargs):
+    """
+    Описывает график: внутри chart_batch() он будет нарисован вместе с остальными графиками пачки,
+    вне пачки - сразу. Стиль rcParams запоминается на момент вызова.
+    """
+    spec = ChartSpec(path, draw, args, kwargs, save=save)
+    if _BATCHES:
+        _BATCHES[-1].append(spec)
+    else:
+        render_charts([spec])
+    return spec
+
+
+@contextmanager
+def chart_batch(workers=None):
+    """Собирает графики, описанные внутри блока, и рисует их параллельно при выходе из блока"""
+    specs = []
+    _BATCHES.append(specs)
+    try:
+        yield specs
+    finally:
+        _BATCHES.pop()
+
+    if _BATCHES:
+        _BATCHES[-1].extend(specs)
+    elif specs:
+        render_charts(specs, workers)
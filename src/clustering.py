@@ -0,0 +1,311 @@
+from .deps import *
+from concurrent.futures import ProcessPoolExecutor
+
+from .dataset import CACHE_DIR
+
+MiniBatchKMeans = lazy_import('sklearn.cluster', 'MiniBatchKMeans')
+euclidean_distances = lazy_import('sklearn.metrics.pairwise', 'euclidean_distances')
+threadpool_limits = lazy_import('threadpoolctl', 'threadpool_limits')
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Быстрый подбор числа кластеров для больших архивов (4.2): параллельный перебор k с тёплым стартом,
+# silhouette по стратифицированной выборке с доверительным интервалом и MiniBatchKMeans для больших входов
+# ----------------------------------------------------------------------------------------------------------------------
+
+# Режим подбора: 'exact' - KMeans(n_init=10) и точный silhouette для каждого k, 'fast' - быстрый режим,
+# 'auto' - быстрый режим начиная с FAST_SELECTION_MIN_ROWS строк
+CLUSTER_SELECTION = os.environ.get('PET911_CLUSTER_SELECTION', 'auto')
+FAST_SELECTION_MIN_ROWS = 20_000
+
+# Начиная с этого размера в быстром режиме используется MiniBatchKMeans
+MINIBATCH_MIN_ROWS = 100_000
+MINIBATCH_BATCH_SIZE = 4096
+
+# Число запусков k-means++ для первого k каждой группы (следующие k стартуют с найденных центров)
+FAST_N_INIT = 3
+
+# Наименьшее число k в группе перебора: группа из одного k не получает тёплого старта,
+# поэтому групп (и процессов) не больше len(k_range) // MIN_SEGMENT_KS
+MIN_SEGMENT_KS = 3
+
+# Silhouette по выборке (точный расчёт требует O(n^2) времени): общий размер, число независимых повторов
+# и уровень доверия интервала
+SILHOUETTE_SAMPLE_SIZE = 10_000
+SILHOUETTE_REPLICATES = 10
+CONFIDENCE_LEVEL = 0.95
+
+RANDOM_STATE = 42
+
+
+def selection_mode(n_samples):
+    """'exact' или 'fast' для данных из n_samples строк"""
+    if CLUSTER_SELECTION in ('exact', 'fast'):
+        return CLUSTER_SELECTION
+    return 'fast' if n_samples >= FAST_SELECTION_MIN_ROWS else 'exact'
+
+
+def cluster_workers():
+    """Число процессов перебора k: переменная окружения PET911_CLUSTER_WORKERS или число ядер"""
+    return int(os.environ.get('PET911_CLUSTER_WORKERS') or os.cpu_count() or 1)
+
+
+def make_kmeans(k, n_samples, init='k-means++', n_init=FAST_N_INIT, random_state=RANDOM_STATE):
+    """KMeans или MiniBatchKMeans (для n_samples >= MINIBATCH_MIN_ROWS)"""
+    if isinstance(init, np.ndarray):
+        n_init = 1
+    if n_samples >= MINIBATCH_MIN_ROWS:
+        return MiniBatchKMeans(n_clusters=k, init=init, n_init=n_init, random_state=random_state,
+                               batch_size=MINIBATCH_BATCH_SIZE)
+    return KMeans(n_clusters=k, init=init, n_init=n_init, random_state=random_state)
+
+
+def stratified_sample(labels, sample_size, rng):
+    """
+    Индексы выборки, пропорциональной размерам кластеров (не меньше 2 точек из каждого кластера,
+    иначе silhouette для него не определён). Возвращает (индексы, кластеры, доли кластеров в данных).
+    """
+    clusters, counts = np.unique(labels, return_counts=True)
+    weights = counts / counts.sum()
+    sizes = np.minimum(counts, np.maximum(2, np.round(weights * sample_size).astype(int)))
+
+    indices = [rng.choice(np.flatnonzero(labels == cluster), size=size, replace=False)
+               for cluster, size in zip(clusters, sizes)]
+    return indices, clusters, weights
+
+
+def stratified_silhouette(X, labels, sample_size, rng):
+    """Silhouette по одной стратифицированной выборке: среднее по кластерам, взвешенное по их долям в данных"""
+    indices, _, weights = stratified_sample(labels, sample_size, rng)
+    sample = np.concatenate(indices)
+    values = silhouette_samples(X[sample], labels[sample])
+
+    estimate = 0.0
+    start = 0
+    for idx, weight in zip(indices, weights):
+        estimate += weight * values[start:start + len(idx)].mean()
+        start += len(idx)
+    return estimate
+
+
+def sampled_silhouette(X, labels, sample_size=SILHOUETTE_SAMPLE_SIZE, replicates=SILHOUETTE_REPLICATES,
+                       random_state=RANDOM_STATE):
+    """
+    Оценка silhouette по replicates независимым стратифицированным (по кластерам) выборкам общим размером sample_size.
+    Оценка - среднее по повторам, интервал - t-интервал по их разбросу: он учитывает и случайность выбора точек,
+    и то, что расстояния до кластеров тоже считаются по выборке (нормальное приближение по точкам одной выборки
+    давало заметно меньшее покрытие). Для данных не больше sample_size считается точно.
+    Возвращает (оценка, нижняя граница, верхняя граница).
+    """
+    labels = np.asarray(labels)
+    if len(labels) <= sample_size:
+        score = silhouette_score(X, labels)
+        return score, score, score
+
+    rng = np.random.default_rng(random_state)
+    estimates = np.array([stratified_silhouette(X, labels, sample_size // replicates, rng)
+                          for _ in range(replicates)])
+
+    estimate = estimates.mean()
+    margin = stats.t.ppf((1 + CONFIDENCE_LEVEL) / 2, replicates - 1) * estimates.std(ddof=1) / np.sqrt(replicates)
+    return estimate, estimate - margin, estimate + margin
+
+
+def extend_centers(X, centers, rng, sample_size=10_000):
+    """Тёплый старт для k+1: центры для k и ещё один, выбранный как в k-means++ (вероятность ~ D^2)"""
+    candidates = X if len(X) <= sample_size else X[rng.choice(len(X), size=sample_size, replace=False)]
+    distances = ((candidates[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+    if distances.sum() == 0:
+        new_center = candidates[rng.integers(len(candidates))]
+    else:
+        new_center = candidates[rng.choice(len(candidates), p=distances / distances.sum())]
+    return np.vstack([centers, new_center])
+
+
+def sweep_segment(X, ks, random_state=RANDOM_STATE):
+    """
+    Перебор подряд идущих k: первое k - k-means++ с FAST_N_INIT запусками,
+    каждое следующее стартует с центров предыдущего плюс один новый центр.
+    """
+    rng = np.random.default_rng(random_state + ks[0])
+    results = []
+    centers = None
+    for k in ks:
+        init = 'k-means++' if centers is None else extend_centers(X, centers, rng)
+        model = make_kmeans(k, len(X), init=init, random_state=random_state)
+        labels = model.fit_predict(X)
+        centers = model.cluster_centers_
+
+        score, low, high = sampled_silhouette(X, labels, random_state=random_state + k)
+        results.append({'k': k, 'inertia': model.inertia_, 'silhouette': score,
+                        'silhouette_low': low, 'silhouette_high': high})
+    return results
+
+
+# Данные для процессов перебора передаются один раз при запуске процесса
+_WORKER = {}
+
+
+def _init_worker(X, threads):
+    _WORKER['X'] = X
+    # Ограничиваем потоки BLAS/OpenMP внутри процесса, чтобы процессы не делили ядра друг с другом
+    _WORKER['limits'] = threadpool_limits(limits=threads)
+
+
+def _sweep_worker(ks):
+    return sweep_segment(_WORKER['X'], ks)
+
+
+def fast_k_sweep(X, k_range, workers=None):
+    """
+    Быстрый перебор числа кластеров. Диапазон k делится на непрерывные группы по числу процессов,
+    но не короче MIN_SEGMENT_KS (для k от 2 до 7 - не больше двух групп по три k): группы считаются
+    параллельно, внутри группы k перебираются с тёплым стартом.
+    Возвращает DataFrame: k, inertia, silhouette, silhouette_low, silhouette_high.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    ks = list(k_range)
+    if workers is None:
+        workers = cluster_workers()
+    workers = max(1, min(workers, len(ks) // MIN_SEGMENT_KS))
+
+    segments = [[int(k) for k in segment] for segment in np.array_split(ks, workers)]
+    if workers == 1:
+        results = sweep_segment(X, segments[0])
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, threads)) as executor:
+            results = [row for segment in executor.map(_sweep_worker, segments) for row in segment]
+
+    return pd.DataFrame(results).sort_values('k', ignore_index=True)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Сохранённая модель кластеров (4.2): масштабирование, центроиды, k, названия кластеров и результаты подбора k.
+# Новые объявления размечаются по ближайшему центроиду за O(n·k); полное переобучение - только при дрейфе данных
+# ----------------------------------------------------------------------------------------------------------------------
+CLUSTER_MODEL_FILE = os.path.join(CACHE_DIR, 'cluster_model.json')
+CLUSTER_MODEL_VERSION = 1
+
+# Переобучение: 'auto' - при дрейфе, 'always' - каждый запуск, 'never' - всегда по сохранённой модели (если она есть)
+CLUSTER_REFIT = os.environ.get('PET911_CLUSTER_REFIT', 'auto')
+
+# Пороги дрейфа: относительный рост среднего квадрата расстояния до ближайшего центроида
+# и сдвиг долей кластеров (total variation distance) относительно данных, на которых модель обучалась
+DRIFT_INERTIA_THRESHOLD = 0.25
+DRIFT_SHARE_THRESHOLD = 0.10
+
+
+class ClusterModel:
+    """
+    Обученная модель кластеров: параметры StandardScaler, центроиды KMeans (в масштабированном пространстве),
+    названия кластеров и опорные характеристики обучающих данных для контроля дрейфа.
+    """
+
+    def __init__(self, feature_names, scaler_mean, scaler_scale, centers, cluster_names,
+                 reference, selection=None, fitted_at=None):
+        self.feature_names = list(feature_names)
+        self.scaler_mean = np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64)
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.cluster_names = {int(cluster): name for cluster, name in cluster_names.items()}
+        # n_samples, mean_sq_distance, shares - по обучающим данным
+        self.reference = reference
+        # Результаты подбора k (k, wcss, silhouette, ошибки silhouette) для графика 4.2.1
+        self.selection = selection
+        self.fitted_at = fitted_at or datetime.now().isoformat(timespec='seconds')
+
+    @property
+    def k(self):
+        return len(self.centers)
+
+    @classmethod
+    def from_fit(cls, scaler, kmeans, feature_names, cluster_names, features_scaled, labels, selection=None):
+        """Модель по обученным StandardScaler и KMeans; опорные характеристики считаются по обучающим данным"""
+        model = cls(feature_names, scaler.mean_, scaler.scale_, kmeans.cluster_centers_, cluster_names,
+                    reference={}, selection=selection)
+        _, sq_distances = model.nearest(features_scaled)
+        labels = np.asarray(labels)
+        model.reference = {
+            'n_samples': int(len(labels)),
+            'mean_sq_distance': float(sq_distances.mean()),
+            'shares': model.cluster_shares(labels).tolist()
+        }
+        return model
+
+    def transform(self, features):
+        """Масштабирование признаков параметрами обучающих данных (как StandardScaler.transform)"""
+        values = features[self.feature_names].to_numpy(dtype=np.float64) if isinstance(features, pd.DataFrame) \
+            else np.asarray(features, dtype=np.float64)
+        return (values - self.scaler_mean) / self.scaler_scale
+
+    def nearest(self, features_scaled):
+        """Номер ближайшего центроида и квадрат расстояния до него для каждой строки"""
+        sq_distances = euclidean_distances(features_scaled, self.centers, squared=True)
+        # Тот же тип меток, что у KMeans.labels_ (int32): таблицы профилей и графики не зависят от способа разметки
+        labels = sq_distances.argmin(axis=1).astype(np.int32)
+        return labels, sq_distances[np.arange(len(labels)), labels]
+
+    def predict(self, features):
+        """Метки кластеров для немасштабированных признаков"""
+        return self.nearest(self.transform(features))[0]
+
+    def cluster_shares(self, labels):
+        return np.bincount(labels, minlength=self.k) / max(len(labels), 1)
+
+    def drift(self, labels, sq_distances):
+        """
+        Дрейф данных относительно обучающих по результату nearest(): рост среднего квадрата расстояния
+        до центроидов и сдвиг долей кластеров. Возвращает (словарь показателей, превышен ли порог).
+        """
+        reference_distance = self.reference['mean_sq_distance']
+        inertia_growth = sq_distances.mean() / reference_distance - 1 if reference_distance > 0 else 0.0
+        share_shift = 0.5 * np.abs(self.cluster_shares(labels) - np.asarray(self.reference['shares'])).sum()
+
+        metrics = {'inertia_growth': float(inertia_growth), 'share_shift': float(share_shift)}
+        exceeded = bool(inertia_growth > DRIFT_INERTIA_THRESHOLD or share_shift > DRIFT_SHARE_THRESHOLD)
+        return metrics, exceeded
+
+    def to_dict(self):
+        return {
+            'version': CLUSTER_MODEL_VERSION,
+            'fitted_at': self.fitted_at,
+            'k': self.k,
+            'feature_names': self.feature_names,
+            'scaler_mean': self.scaler_mean.tolist(),
+            'scaler_scale': self.scaler_scale.tolist(),
+            'centers': self.centers.tolist(),
+            'cluster_names': {str(cluster): name for cluster, name in self.cluster_names.items()},
+            'reference': self.reference,
+            'selection': self.selection
+        }
+
+    def save(self, path=CLUSTER_MODEL_FILE):
+        """Сохраняет модель (временный файл + атомарная замена)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CLUSTER_MODEL_FILE, feature_names=None):
+        """
+        Загружает модель; None, если файла нет, он повреждён, другой версии
+        или обучен на других признаках (feature_names).
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Модель кластеров {path} не прочитана: {e}")
+            return None
+
+        if data.get('version') != CLUSTER_MODEL_VERSION:
+            return None
+        if feature_names is not None and data.get('feature_names') != list(feature_names):
+            return None
+
+        return cls(data['feature_names'], data['scaler_mean'], data['scaler_scale'], data['centers'],
+                   data['cluster_names'], data['reference'], data.get('selection'), data.get('fitted_at'))
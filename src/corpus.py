@@ -0,0 +1,406 @@
+from .deps import *
+import struct
+import zipfile
+
+from .dataset import CACHE_DIR
+from .lemmatizer import LEMMA_CACHE, lemmatize_corpus, morph_version
+
+sparse = lazy_import('scipy.sparse')
+CountVectorizer = lazy_import('sklearn.feature_extraction.text', 'CountVectorizer')
+HashingVectorizer = lazy_import('sklearn.feature_extraction.text', 'HashingVectorizer')
+FeatureHasher = lazy_import('sklearn.feature_extraction', 'FeatureHasher')
+normalize = lazy_import('sklearn.preprocessing', 'normalize')
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Лемматизированный корпус описаний и матрица TF-IDF с хранением на диске.
+# Ключ кэша - хэш исходных описаний и параметров обработки, поэтому повторный анализ неизменного архива
+# не выполняет лемматизацию и не обучает TfidfVectorizer заново.
+# ----------------------------------------------------------------------------------------------------------------------
+CORPUS_DIR = os.path.join(CACHE_DIR, 'corpus')
+
+# Версия формата корпуса (увеличивать при изменении правил токенизации/лемматизации)
+CORPUS_VERSION = 1
+
+# Потоковый TF-IDF: размер хэш-пространства и число документов в порции.
+# Память: четыре массива счётчиков длины HASHING_FEATURES, одна порция документов и словарь не больше
+# STREAM_MAX_TERMS терминов-кандидатов - не зависит от размера корпуса (погрешность - см. streaming_tfidf)
+HASHING_FEATURES = 2 ** 20
+RAW_HASH_FEATURES = 2 ** 31 - 1
+STREAM_CHUNK_SIZE = 10_000
+STREAM_MAX_TERMS = 20_000
+
+
+def params_hash(params):
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def corpus_key(texts, stopwords_list):
+    """Хэш описаний (с учётом пропусков), стоп-слов, версии pymorphy3 и формата корпуса"""
+    digest = hashlib.sha256()
+    digest.update(params_hash({
+        'version': CORPUS_VERSION,
+        'morph_version': morph_version(),
+        'stopwords': sorted(stopwords_list)
+    }).encode('ascii'))
+    for text in texts:
+        digest.update(b'\x00N' if pd.isna(text) else str(text).encode('utf-8') + b'\x00')
+    return digest.hexdigest()[:16]
+
+
+def save_npz(path, **arrays):
+    """Сохраняет массивы в несжатый .npz (временный файл + атомарная замена)"""
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_npz(path):
+    """
+    Загружает массивы из несжатого .npz через memory-map (np.load так не умеет): данные массива внутри
+    zip-архива лежат как есть, поэтому достаточно найти их смещение в файле.
+    Режим copy-on-write - массивы можно изменять, файл при этом не меняется.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+
+            # Локальный заголовок zip: 30 байт + имя файла + дополнительное поле
+            f.seek(info.header_offset)
+            header = f.read(30)
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            data_offset = f.tell()
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                dtype = None
+
+            if dtype is None or dtype.hasobject or int(np.prod(shape)) == 0:
+                f.seek(data_offset)
+                arrays[name] = np.lib.format.read_array(f)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='c', offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    return arrays
+
+
+def corpus_paths(key, directory=CORPUS_DIR):
+    prefix = os.path.join(directory, f"descriptions.{key}")
+    return f"{prefix}.tokens.npz", f"{prefix}.vocabulary.json"
+
+
+class TextCorpus:
+    """
+    Лемматизированный корпус в компактном виде: леммы всех документов подряд как массив номеров в словаре
+    (token_ids) и границы документов (offsets, документ i - token_ids[offsets[i]:offsets[i + 1]]).
+    """
+
+    def __init__(self, key, vocabulary, token_ids, offsets):
+        self.key = key
+        self.vocabulary = list(vocabulary)
+        # Массивы корпуса только для чтения: порядок лемм важен для биграмм, случайное изменение на месте
+        # (например, сортировка индексов в scipy.sparse) должно давать ошибку, а не портить корпус
+        self.token_ids = token_ids.view()
+        self.token_ids.flags.writeable = False
+        self.offsets = offsets.view()
+        self.offsets.flags.writeable = False
+        # Словарь как массив: номера лемм документа переводятся в строки одной операцией индексации
+        self._words = np.array(self.vocabulary, dtype=object)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_texts(cls, key, processed_texts):
+        """Строит корпус из текстов с леммами через пробел"""
+        word_ids = {}
+        token_ids = []
+        offsets = [0]
+        for text in processed_texts:
+            for word in text.split():
+                token_ids.append(word_ids.setdefault(word, len(word_ids)))
+            offsets.append(len(token_ids))
+        return cls(key, word_ids, np.asarray(token_ids, dtype=np.int32), np.asarray(offsets, dtype=np.int64))
+
+    def document_tokens(self, i):
+        return self._words[self.token_ids[self.offsets[i]:self.offsets[i + 1]]].tolist()
+
+    def iter_texts(self, start=0, stop=None):
+        """Тексты документов (леммы через пробел) по одному, без построения всего списка"""
+        stop = len(self) if stop is None else stop
+        for i in range(start, stop):
+            yield " ".join(self.document_tokens(i))
+
+    def texts(self):
+        return list(self.iter_texts())
+
+    def iter_chunks(self, labels, chunk_size=STREAM_CHUNK_SIZE):
+        """Порции (тексты, метки) по chunk_size документов - вход для потокового TF-IDF"""
+        labels = np.asarray(labels)
+        for start in range(0, len(self), chunk_size):
+            stop = min(start + chunk_size, len(self))
+            yield list(self.iter_texts(start, stop)), labels[start:stop]
+
+    def count_matrix(self):
+        """Разреженная матрица документ x лемма (CSR) с числом вхождений леммы в документ"""
+        data = np.ones(len(self.token_ids), dtype=np.int32)
+        matrix = sparse.csr_matrix((data, self.token_ids, self.offsets), shape=(len(self), len(self.vocabulary)),
+                                   copy=True)
+        matrix.sum_duplicates()
+        return matrix
+
+    def save(self, directory=CORPUS_DIR):
+        """Сохраняет корпус; корпуса других ключей (устаревшие версии архива) удаляются"""
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith('descriptions.') and not name.startswith(f"descriptions.{self.key}."):
+                os.remove(os.path.join(directory, name))
+
+        tokens_path, vocabulary_path = corpus_paths(self.key, directory)
+        save_npz(tokens_path, token_ids=self.token_ids, offsets=self.offsets)
+        tmp_path = f"{vocabulary_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.vocabulary, f, ensure_ascii=False)
+        os.replace(tmp_path, vocabulary_path)
+
+    @classmethod
+    def load(cls, key, directory=CORPUS_DIR):
+        """Загружает корпус (массивы - через memory-map); None, если корпуса с таким ключом нет"""
+        tokens_path, vocabulary_path = corpus_paths(key, directory)
+        if not (os.path.exists(tokens_path) and os.path.exists(vocabulary_path)):
+            return None
+
+        arrays = load_npz(tokens_path)
+        with open(vocabulary_path, 'r', encoding='utf-8') as f:
+            vocabulary = json.load(f)
+        return cls(key, vocabulary, arrays['token_ids'], arrays['offsets'])
+
+
+def load_or_build_corpus(texts, stopwords_list, morph_analyzer, directory=CORPUS_DIR):
+    """
+    Возвращает лемматизированный корпус описаний: из кэша, если описания не менялись,
+    иначе лемматизирует (с кэшем лемм между запусками) и сохраняет.
+    """
+    texts = list(texts)
+    key = corpus_key(texts, stopwords_list)
+
+    try:
+        corpus = TextCorpus.load(key, directory)
+    except Exception as e:
+        print(f"⚠️ Кэш корпуса {key} повреждён, строим заново: {e}")
+        corpus = None
+    if corpus is not None:
+        print(f"📖 Корпус описаний загружен из кэша ({len(corpus)} документов, {len(corpus.vocabulary)} лемм)")
+        return corpus
+
+    if LEMMA_CACHE.load():
+        print(f"📖 Загружен кэш лемм: {len(LEMMA_CACHE)} слов")
+
+    corpus = TextCorpus.from_texts(key, lemmatize_corpus(texts, stopwords_list, morph_analyzer))
+    print(f"📖 Кэш лемм: {LEMMA_CACHE.stats()}")
+
+    try:
+        LEMMA_CACHE.save()
+        corpus.save(directory)
+    except OSError as e:
+        print(f"⚠️ Не удалось сохранить корпус: {e}")
+
+    return corpus
+
+
+def tfidf_paths(corpus, params, directory=CORPUS_DIR):
+    prefix = os.path.join(directory, f"descriptions.{corpus.key}.tfidf-{params_hash(params)[:8]}")
+    return f"{prefix}.npz", f"{prefix}.features.json"
+
+
+def load_tfidf(corpus, params, directory=CORPUS_DIR):
+    """Матрица TF-IDF (CSR поверх memory-map) и названия признаков; None, если её нет в кэше"""
+    matrix_path, features_path = tfidf_paths(corpus, params, directory)
+    if not (os.path.exists(matrix_path) and os.path.exists(features_path)):
+        return None
+
+    arrays = load_npz(matrix_path)
+    X = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                          shape=tuple(arrays['shape']), copy=False)
+    with open(features_path, 'r', encoding='utf-8') as f:
+        feature_names = np.array(json.load(f), dtype=object)
+    return X, feature_names
+
+
+def save_tfidf(corpus, params, X, feature_names, directory=CORPUS_DIR):
+    matrix_path, features_path = tfidf_paths(corpus, params, directory)
+    os.makedirs(directory, exist_ok=True)
+    X = X.tocsr()
+    # Формат совпадает со scipy.sparse.save_npz(compressed=False), файл читается и sparse.load_npz
+    save_npz(matrix_path, data=X.data, indices=X.indices, indptr=X.indptr,
+             format=np.array(X.format.encode('ascii')), shape=np.array(X.shape))
+    tmp_path = f"{features_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(list(feature_names), f, ensure_ascii=False)
+    os.replace(tmp_path, features_path)
+
+
+def load_or_fit_tfidf(corpus, params, directory=CORPUS_DIR):
+    """
+    Матрица TF-IDF корпуса для TfidfVectorizer(**params): из кэша или обучением векторайзера
+    с последующим сохранением. Возвращает (X, feature_names).
+    """
+    try:
+        cached = load_tfidf(corpus, params, directory)
+    except Exception as e:
+        print(f"⚠️ Кэш TF-IDF повреждён, обучаем заново: {e}")
+        cached = None
+    if cached is not None:
+        print(f"📖 Матрица TF-IDF загружена из кэша ({cached[0].shape[0]}x{cached[0].shape[1]})")
+        return cached
+
+    vectorizer = TfidfVectorizer(**params)
+    X = vectorizer.fit_transform(corpus.iter_texts())
+    feature_names = vectorizer.get_feature_names_out()
+
+    try:
+        save_tfidf(corpus, params, X, feature_names, directory)
+    except OSError as e:
+        print(f"⚠️ Не удалось сохранить матрицу TF-IDF: {e}")
+
+    return X, feature_names
+
+
+def _limit_document_frequency(value, n_docs):
+    """min_df/max_df TfidfVectorizer: целое - число документов, дробное - доля"""
+    return value if isinstance(value, int) else value * n_docs
+
+
+def _chunk_counts(texts, ngram_range):
+    """Матрица документ x термин порции и термины порции по алфавиту; (None, None), если терминов нет"""
+    counter = CountVectorizer(ngram_range=ngram_range)
+    try:
+        X = counter.fit_transform(texts)
+    except ValueError:
+        # В порции нет ни одного термина
+        return None, None
+    return X, counter.get_feature_names_out()
+
+
+def _term_hashes(terms, hasher):
+    """Хэши терминов: весь словарь порции хэшируется одним вызовом FeatureHasher (как в HashingVectorizer)"""
+    return hasher.transform([term] for term in terms).indices.astype(np.int64)
+
+
+def streaming_tfidf(make_chunks, params, n_features=HASHING_FEATURES, max_terms=STREAM_MAX_TERMS):
+    """
+    Средний TF-IDF терминов в успешных и неуспешных объявлениях в фиксированном объёме памяти.
+    make_chunks() должен каждый раз возвращать новый итератор порций (тексты, метки успеха); корпус читается трижды:
+      1) HashingVectorizer: документная частота и число вхождений по хэш-ячейкам двух таблиц (count-min: n_features
+         и n_features - 1 ячеек). Меньшее из чисел двух ячеек термина - оценка сверху его частоты;
+      2) точные документная частота и число вхождений терминов-кандидатов: оценка документной частоты не ниже min_df,
+         в словаре не больше max_terms терминов с наибольшей оценкой числа вхождений (при переполнении термины
+         с меньшей оценкой удаляются и больше не принимаются). Отбор признаков как в TfidfVectorizer
+         (min_df, max_df, max_features) и idf;
+      3) TF-IDF порции по отобранным терминам (l2-нормировка строк) и суммы по группам.
+    Память: четыре массива счётчиков длины n_features, одна порция документов и не больше max_terms кандидатов -
+    от размера корпуса и его словаря не зависит.
+    Погрешность: удалённые из словаря термины встречаются не чаще порога вытеснения (оценка сверху), поэтому
+    результат совпадает с TfidfVectorizer(**params), если у последнего отобранного термина вхождений больше порога.
+    Иначе в отбор могли не попасть термины с числом вхождений не выше порога (печатается предупреждение,
+    помогает больший max_terms или n_features). Среди терминов с равным числом вхождений на границе max_features
+    выбор может отличаться от TfidfVectorizer (он зависит от порядка сортировки всего словаря). На 100 000
+    синтетических объявлений вытеснения до 1500 признаков не доходят, отличаются 2 термина из 1500 на границе.
+    Возвращает DataFrame: word, success_tfidf, fail_tfidf (термины по алфавиту, как get_feature_names_out).
+    """
+    ngram_range = params.get('ngram_range', (1, 1))
+    # Термин хэшируется один раз (murmurhash в пространстве RAW_HASH_FEATURES), ячейки таблиц - остатки от деления.
+    # Вторая таблица - тот же хэш по другому модулю: n_features - 1 взаимно просто с n_features,
+    # термины из одной ячейки первой таблицы во второй почти всегда расходятся
+    table_sizes = (n_features, n_features - 1)
+    hashing = HashingVectorizer(n_features=RAW_HASH_FEATURES, ngram_range=ngram_range, alternate_sign=False, norm=None)
+    hasher = FeatureHasher(n_features=RAW_HASH_FEATURES, input_type='string', alternate_sign=False)
+
+    # Проход 1: документная частота и число вхождений по ячейкам обеих таблиц (термины порции не строятся)
+    bucket_dfs = [np.zeros(size, dtype=np.int32) for size in table_sizes]
+    bucket_tfs = [np.zeros(size, dtype=np.int64) for size in table_sizes]
+    n_docs = 0
+    for texts, _ in make_chunks():
+        X = hashing.transform(texts)
+        n_docs += X.shape[0]
+        for size, bucket_df, bucket_tf in zip(table_sizes, bucket_dfs, bucket_tfs):
+            buckets = X.indices % size
+            bucket_df += np.bincount(buckets, minlength=size).astype(np.int32)
+            bucket_tf += np.bincount(buckets, weights=X.data, minlength=size).astype(np.int64)
+
+    min_doc_count = _limit_document_frequency(params.get('min_df', 1), n_docs)
+    max_doc_count = _limit_document_frequency(params.get('max_df', 1.0), n_docs)
+
+    # Проход 2: точные частоты кандидатов; порог вытеснения только растёт, поэтому у оставшихся в словаре
+    # терминов (оценка выше порога) счётчики полные - они принимались с первой порции, где встретились
+    candidates = {}  # термин -> [документная частота, число вхождений, оценка числа вхождений]
+    threshold = -1
+    for texts, _ in make_chunks():
+        X, terms = _chunk_counts(texts, ngram_range)
+        if X is None:
+            continue
+        hashes = _term_hashes(terms, hasher)
+        buckets = [hashes % size for size in table_sizes]
+        df_estimate = np.minimum(bucket_dfs[0][buckets[0]], bucket_dfs[1][buckets[1]])
+        tf_estimate = np.minimum(bucket_tfs[0][buckets[0]], bucket_tfs[1][buckets[1]])
+        keep = np.flatnonzero((df_estimate >= min_doc_count) & (tf_estimate > threshold))
+        chunk_df = np.bincount(X.indices, minlength=len(terms))[keep]
+        chunk_tf = np.asarray(X.sum(axis=0)).ravel()[keep]
+        for term, df_value, tf_value, estimate in zip(terms[keep], chunk_df, chunk_tf, tf_estimate[keep]):
+            counts = candidates.setdefault(term, [0, 0, int(estimate)])
+            counts[0] += int(df_value)
+            counts[1] += int(tf_value)
+        if len(candidates) > max_terms:
+            estimates = np.fromiter((counts[2] for counts in candidates.values()), dtype=np.int64)
+            threshold = max(threshold, int(np.partition(estimates, len(estimates) - max_terms - 1)[-max_terms - 1]))
+            candidates = {term: counts for term, counts in candidates.items() if counts[2] > threshold}
+    del bucket_dfs, bucket_tfs
+
+    # Отбор признаков - как TfidfVectorizer._limit_features (термины по алфавиту)
+    terms = np.array(sorted(candidates), dtype=object)
+    dfs = np.array([candidates[term][0] for term in terms], dtype=np.int64)
+    tfs = np.array([candidates[term][1] for term in terms], dtype=np.int64)
+    mask = (dfs >= min_doc_count) & (dfs <= max_doc_count)
+    max_features = params.get('max_features')
+    truncated = max_features is not None and mask.sum() >= max_features
+    if max_features is not None and mask.sum() > max_features:
+        mask_inds = (-tfs[mask]).argsort()[:max_features]
+        new_mask = np.zeros(len(dfs), dtype=bool)
+        new_mask[np.where(mask)[0][mask_inds]] = True
+        mask = new_mask
+    if threshold >= 0 and not (truncated and tfs[mask].min() > threshold):
+        print(f"⚠️ Потоковый TF-IDF: словарь кандидатов ограничен {max_terms} терминами, в отбор могли не попасть "
+              f"термины с числом вхождений до {threshold}")
+    terms, dfs = terms[mask], dfs[mask]
+    del candidates
+
+    # Сглаженный idf (smooth_idf=True по умолчанию в TfidfVectorizer)
+    idf_diagonal = sparse.diags(np.log((1 + n_docs) / (1 + dfs)) + 1)
+    counter = CountVectorizer(ngram_range=ngram_range, vocabulary=list(terms))
+
+    # Проход 3: суммы TF-IDF по группам
+    sums = np.zeros((len(terms), 2))
+    group_sizes = np.zeros(2)
+    for texts, labels in make_chunks():
+        X = normalize(counter.transform(texts) @ idf_diagonal, norm='l2')
+        labels = np.asarray(labels, dtype=bool)
+        groups = np.column_stack([labels, ~labels]).astype(np.float64)
+        sums += np.asarray(X.T @ groups)
+        group_sizes += groups.sum(axis=0)
+
+    means = sums / np.maximum(group_sizes, 1)
+    return pd.DataFrame({
+        'word': terms,
+        'success_tfidf': means[:, 0],
+        'fail_tfidf': means[:, 1]
+    })
@@ -0,0 +1,291 @@
+from .deps import *
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = feather = None
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Общий слой загрузки данных: каждый CSV парсится один раз за запуск и приводится к единой схеме
+# ----------------------------------------------------------------------------------------------------------------------
+# Папку с данными можно подменить переменной окружения PET911_DATA_DIR (например, синтетическими данными src.synthetic)
+DATA_DIR = os.environ.get('PET911_DATA_DIR', 'data')
+LOST_FILE = os.path.join(DATA_DIR, 'Dataset_final_Pet911_lost.csv')
+FOUND_FILE = os.path.join(DATA_DIR, 'dataset_final_Pet911_found.csv')
+
+DATASET_FILES = {
+    'lost': LOST_FILE,
+    'found': FOUND_FILE
+}
+
+ENCODINGS = ['utf-8', 'cp1251', 'latin1']
+
+# Колоночный кэш нормализованных датафреймов (Feather), ключ - хэш содержимого CSV + версия схемы
+CACHE_DIR = os.environ.get('PET911_CACHE_DIR', os.path.join('data', 'cache'))
+
+# Версия схемы (увеличивать при любом изменении правил приведения типов)
+SCHEMA_VERSION = 4
+
+TEXT_COLUMNS = [
+    'url', 'id', 'тип объявления', 'регион', 'статус', 'тип_животного',
+    'окрас', 'порода', 'место события', 'пол', 'возраст', 'описание'
+]
+# Колонки с небольшим числом различных значений хранятся как category (коды + словарь значений):
+# память не зависит от длины строк, группировки и сравнения идут по целочисленным кодам
+CATEGORY_COLUMNS = ['тип объявления', 'регион', 'статус', 'тип_животного', 'окрас', 'порода', 'пол', 'возраст']
+# Значения, почти уникальные для каждого объявления, остаются строками
+STRING_COLUMNS = [col for col in TEXT_COLUMNS if col not in CATEGORY_COLUMNS]
+BOOL_COLUMNS = ['наличие_описания', 'есть_фото', 'есть_контакты']
+# Счётчики хранятся в наименьшем беззнаковом типе, в который помещаются (uint8/uint16/...)
+COUNT_COLUMNS = ['Длина_описания_в_словах', 'количество_фото', 'количество_комментариев']
+
+# Столбец с датой события зависит от типа датасета
+EVENT_DATE_COLUMNS = {
+    'lost': 'дата пропажи',
+    'found': 'дата находки'
+}
+# Даты хранятся исходными строками ('пт, 26.09.2025', 'Неизвестно') как category: в отчёты они попадают
+# в том же виде, что и в CSV. Шагам, которым нужны datetime, - parse_russian_dates (разбирает словарь категорий)
+DATE_COLUMNS = {
+    dataset_type: ['дата_публикации', event_column]
+    for dataset_type, event_column in EVENT_DATE_COLUMNS.items()
+}
+
+# Шаблон даты публикации/события: 'пт, 26.09.2025' или просто '26.09.2025'. Всё до последней запятой
+# (день недели в любом регистре или любой другой префикс) отбрасывается - как в прежнем разборе step_4_2
+DATE_PATTERN = r'^(?:.*,)?\s*(\d{1,2}\.\d{1,2}\.\d{4})$'
+
+BOOL_MAPPING = {'true': True, 'false': False, 'да': True, 'нет': False, '1': True, '0': False}
+
+# Строки в Arrow-буферах (pyarrow) вместо Python-объектов: компактнее и читаются из колоночного кэша без копирования.
+# Пропуски остаются NaN, сравнения возвращают обычный bool - как у колонок object
+try:
+    STRING_DTYPE = pd.StringDtype('pyarrow', na_value=np.nan) if feather is not None else object
+except TypeError:
+    # pandas до 2.3 не поддерживает строки с NaN в качестве пропуска
+    STRING_DTYPE = object
+
+# Кэш уже разобранных датафреймов в пределах процесса: путь -> DataFrame
+_FRAMES = {}
+
+
+def parse_russian_dates(values):
+    """
+    Векторный разбор колонки дат вида 'пт, 26.09.2025' или '26.09.2025' -> datetime64.
+    Различных дат в дампе всего несколько сотен, поэтому разбираются только уникальные строки
+    (один вызов to_datetime), а результат раскладывается обратно по кодам factorize
+    (у категориальной колонки - по её кодам и словарю категорий).
+    Префикс до последней запятой не проверяется ('Пт, 26.09.2025' и 'xx, 26.09.2025' - тоже 26.09.2025),
+    некорректные даты дают NaT.
+    """
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+
+    unique_str = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    date_part = unique_str.str.extract(DATE_PATTERN)[0]
+    parsed = pd.to_datetime(date_part, format='%d.%m.%Y', errors='coerce').to_numpy()
+
+    # Код -1 (пропуск в исходных данных) отображаем в NaT
+    parsed = np.append(parsed, np.datetime64('NaT', 'ns'))
+    return pd.Series(parsed[codes], index=values.index, name=values.name)
+
+
+def read_csv_with_fallback(file_path):
+    """Читает CSV, перебирая кодировки из ENCODINGS"""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Файл {file_path} не найден")
+
+    dtypes = {col: str for col in TEXT_COLUMNS}
+
+    for encoding in ENCODINGS:
+        try:
+            return pd.read_csv(file_path, encoding=encoding, dtype=dtypes)
+        except UnicodeDecodeError:
+            continue
+
+    raise ValueError(f"Не удалось прочитать {file_path} ни в одной из кодировок {ENCODINGS}")
+
+
+def apply_schema(df, dataset_type):
+    """Приводит сырой датафрейм к единой схеме: категории, строки, булевы флаги, счётчики и даты (category)"""
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    for col in STRING_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(STRING_DTYPE)
+
+    for col in BOOL_COLUMNS:
+        if col in df.columns and df[col].dtype != bool:
+            df[col] = df[col].astype(str).str.strip().str.lower().map(BOOL_MAPPING).fillna(False).astype(bool)
+
+    # downcast='unsigned' сужает только неотрицательные колонки, отрицательные значения остаются в int64
+    for col in COUNT_COLUMNS:
+        if col in df.columns:
+            counts = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('int64')
+            df[col] = pd.to_numeric(counts, downcast='unsigned')
+
+    for col in DATE_COLUMNS[dataset_type]:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    return df
+
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """SHA-256 содержимого файла (читается блоками, чтобы не держать большой дамп в памяти)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_prefix(file_path):
+    """
+    Общее начало имён кэшей одного CSV: имя файла и хэш его папки. Настоящие и синтетические данные
+    (PET911_DATA_DIR) называются одинаково, но делят CACHE_DIR - по хэшу папки их кэши не вытесняют друг друга
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    folder = os.path.dirname(os.path.abspath(file_path))
+    return f"{stem}.{hashlib.sha256(folder.encode('utf-8')).hexdigest()[:8]}."
+
+
+def get_cache_path(file_path, content_hash):
+    """Путь к кэшу для конкретной версии CSV и схемы"""
+    return os.path.join(CACHE_DIR, f"{cache_prefix(file_path)}{content_hash[:16]}.v{SCHEMA_VERSION}.feather")
+
+
+def _arrow_types(arrow_type):
+    """Строковые колонки кэша читаются как STRING_DTYPE (категории Arrow хранит как dictionary и возвращает как category)"""
+    if STRING_DTYPE is not object and arrow_type in (pa.string(), pa.large_string()):
+        return STRING_DTYPE
+    return None
+
+
+def read_cache(cache_path):
+    """Читает кэш через memory-map: числовые колонки, даты и строки не копируются при загрузке"""
+    table = feather.read_table(cache_path, memory_map=True)
+    return table.to_pandas(types_mapper=_arrow_types)
+
+
+def write_cache(df, file_path, cache_path):
+    """Сохраняет нормализованный датафрейм и удаляет устаревшие кэши того же CSV (из той же папки)"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    prefix = cache_prefix(file_path)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    # Кэши в прежнем формате имён (без хэша папки) больше не читаются - удаляются вместе с устаревшими
+    legacy_name = re.compile(rf'^{re.escape(stem)}\.[0-9a-f]{{16}}\.v\d+\.feather$')
+    for name in os.listdir(CACHE_DIR):
+        if (name.startswith(prefix) and name.endswith('.feather')) or legacy_name.match(name):
+            os.remove(os.path.join(CACHE_DIR, name))
+
+    # Пишем во временный файл и атомарно переименовываем, чтобы параллельные шаги не прочитали половину файла
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache_path)
+
+
+def load_normalized(dataset_type, file_path, use_cache=True):
+    """Разбирает CSV и приводит к схеме, используя колоночный кэш, если он актуален"""
+    if not use_cache or feather is None:
+        return apply_schema(read_csv_with_fallback(file_path), dataset_type)
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Файл {file_path} не найден")
+
+    cache_path = get_cache_path(file_path, file_sha256(file_path))
+    if os.path.exists(cache_path):
+        try:
+            return read_cache(cache_path)
+        except Exception as e:
+            print(f"⚠️ Кэш {cache_path} повреждён, пересоздаём: {e}")
+
+    df = apply_schema(read_csv_with_fallback(file_path), dataset_type)
+    try:
+        write_cache(df, file_path, cache_path)
+    except Exception as e:
+        print(f"⚠️ Не удалось сохранить кэш {cache_path}: {e}")
+
+    return df
+
+
+def load_dataset(dataset_type, file_path=None, use_cache=True):
+    """
+    Возвращает датафрейм lost/found, приведённый к схеме.
+    Файл парсится только при первом обращении (или читается из колоночного кэша на диске);
+    каждый вызывающий получает собственную копию, так что шаги могут свободно добавлять и менять колонки.
+    """
+    if file_path is None:
+        file_path = DATASET_FILES[dataset_type]
+
+    key = os.path.abspath(file_path)
+    if key not in _FRAMES:
+        _FRAMES[key] = load_normalized(dataset_type, file_path, use_cache)
+
+    return _FRAMES[key].copy()
+
+
+def load_combined_dataset(lost_file=None, found_file=None, use_cache=True):
+    """
+    Объединяет lost и found в один датафрейм с меткой 'объявление_тип' и целевой переменной is_success.
+    """
+    df_lost = load_dataset('lost', lost_file, use_cache)
+    df_found = load_dataset('found', found_file, use_cache)
+
+    # Общий словарь категорий: иначе concat превратит категориальные колонки обратно в object
+    union_categories([df_lost, df_found], CATEGORY_COLUMNS + ['дата_публикации'])
+
+    # Добавляем метку типа объявления
+    df_lost['объявление_тип'] = 'lost'
+    df_found['объявление_тип'] = 'found'
+
+    # Объединяем датасеты
+    df_combined = pd.concat([df_lost, df_found], ignore_index=True)
+
+    # Создаем целевую переменную is_success
+    df_combined['is_success'] = df_combined['статус'].isin(['питомец найден', 'хозяин найден'])
+
+    return df_combined
+
+
+def union_categories(frames, columns=CATEGORY_COLUMNS):
+    """Приводит одноимённые категориальные колонки датафреймов к общему отсортированному словарю категорий"""
+    for col in columns:
+        if all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in frames):
+            categories = sorted(set().union(*(df[col].cat.categories for df in frames)))
+            for df in frames:
+                df[col] = df[col].cat.set_categories(categories)
+    return frames
+
+
+def fill_category(values, value):
+    """fillna, допускающий категориальные колонки: value добавляется в словарь категорий с сохранением сортировки"""
+    if isinstance(values.dtype, pd.CategoricalDtype) and value not in values.cat.categories:
+        values = values.cat.set_categories(sorted([*values.cat.categories, value]))
+    return values.fillna(value)
+
+
+def map_categories(values, func):
+    """
+    Применяет func к словарю категориальной колонки, а не к каждой строке. Значения, совпавшие после func
+    (например, 'Кошка' и 'кошка' после str.lower), объединяются; категории остаются отсортированными.
+    """
+    categories = values.cat.categories
+    mapped = pd.Index([func(value) for value in categories])
+    new_categories = pd.Index(sorted(set(mapped)))
+    lookup = np.append(new_categories.get_indexer(mapped), -1)
+    codes = lookup[values.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=new_categories),
+                     index=values.index, name=values.name)
+
+
+def clear_cache():
+    """Сбрасывает кэш разобранных датафреймов в памяти (дисковый кэш проверяется по хэшу сам)"""
+    _FRAMES.clear()
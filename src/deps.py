@@ -1,24 +1,56 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 from datetime import datetime, timedelta
 import warnings
 import csv
 import json
-from scipy import stats
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-from sklearn.metrics import silhouette_score, silhouette_samples
-from sklearn.manifold import TSNE
-import matplotlib.patches as mpatches
-from matplotlib.colors import ListedColormap
+import hashlib
+import importlib
 import re
 import string
 from collections import Counter
-from nltk.corpus import stopwords
-import pymorphy3
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.feature_selection import chi2
\ No newline at end of file
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Тяжёлые библиотеки (matplotlib, seaborn, scipy, sklearn, nltk, pymorphy3) импортируются при первом обращении:
+# шаг или прогноз 3.2 загружает только то, чем пользуется, а импорт src не тянет за собой весь стек ML и NLP
+# ----------------------------------------------------------------------------------------------------------------------
+class LazyImport:
+    """Модуль (или объект модуля), который импортируется при первом обращении к атрибуту или вызове"""
+
+    def __init__(self, module_name, attr=None):
+        self.__dict__.update({'_module_name': module_name, '_attr': attr, '_target': None})
+
+    def _resolve(self):
+        if self._target is None:
+            target = importlib.import_module(self._module_name)
+            self.__dict__['_target'] = getattr(target, self._attr) if self._attr else target
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        name = f"{self._module_name}.{self._attr}" if self._attr else self._module_name
+        return f"<lazy {name}{'' if self._target is None else ' (loaded)'}>"
+
+
+def lazy_import(module_name, attr=None):
+    return LazyImport(module_name, attr)
+
+
+plt = lazy_import('matplotlib.pyplot')
+sns = lazy_import('seaborn')
+stats = lazy_import('scipy.stats')
+KMeans = lazy_import('sklearn.cluster', 'KMeans')
+StandardScaler = lazy_import('sklearn.preprocessing', 'StandardScaler')
+PCA = lazy_import('sklearn.decomposition', 'PCA')
+silhouette_score = lazy_import('sklearn.metrics', 'silhouette_score')
+silhouette_samples = lazy_import('sklearn.metrics', 'silhouette_samples')
+TfidfVectorizer = lazy_import('sklearn.feature_extraction.text', 'TfidfVectorizer')
+stopwords = lazy_import('nltk.corpus', 'stopwords')
+pymorphy3 = lazy_import('pymorphy3')
@@ -0,0 +1,185 @@
+from .deps import *
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from .dataset import CACHE_DIR
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Лемматизация описаний: кэш token -> lemma поверх pymorphy3 с сохранением на диск между запусками
+# ----------------------------------------------------------------------------------------------------------------------
+LEMMA_CACHE_FILE = os.path.join(CACHE_DIR, 'lemmas.json')
+
+# Словарь описаний Pet911 небольшой (десятки тысяч словоформ), этого размера хватает с большим запасом
+LEMMA_CACHE_SIZE = 200_000
+
+# Регулярные выражения компилируются один раз при импорте
+PUNCTUATION_RE = re.compile(f'[{string.punctuation}«»—…"",,,""]')
+DIGITS_RE = re.compile(r'\d+')
+
+# Параллельная лемматизация: корпус меньше PARALLEL_MIN_TEXTS обрабатывается в текущем процессе -
+# запуск пула и словарей pymorphy3 в каждом процессе обходится дороже выигрыша
+PARALLEL_MIN_TEXTS = 20_000
+CHUNK_SIZE = 2_000
+
+
+def morph_version():
+    """Версия pymorphy3 (и его словарей) - сохранённый кэш действителен только для неё"""
+    return getattr(pymorphy3, '__version__', 'unknown')
+
+
+class LemmaCache:
+    """
+    Ограниченный LRU-кэш лемм: повторные словоформы не разбираются морфологическим анализатором заново.
+    При переполнении вытесняются давно не использованные слова.
+    """
+
+    def __init__(self, max_size=LEMMA_CACHE_SIZE, track_new=False):
+        self.max_size = max_size
+        self.lemmas = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # В процессах-исполнителях запоминаем новые слова, чтобы вернуть их в общий кэш
+        self.new_lemmas = {} if track_new else None
+
+    def __len__(self):
+        return len(self.lemmas)
+
+    def lemmatize(self, word, morph_analyzer):
+        """Нормальная форма слова (первый разбор pymorphy3), из кэша или с разбором"""
+        lemma = self.lemmas.get(word)
+        if lemma is not None:
+            self.hits += 1
+            self.lemmas.move_to_end(word)
+            return lemma
+
+        self.misses += 1
+        lemma = morph_analyzer.parse(word)[0].normal_form
+        self.lemmas[word] = lemma
+        if self.new_lemmas is not None:
+            self.new_lemmas[word] = lemma
+        if len(self.lemmas) > self.max_size:
+            self.lemmas.popitem(last=False)
+        return lemma
+
+    def drain_new(self):
+        """Возвращает слова, разобранные с прошлого вызова, и очищает их список"""
+        new_lemmas, self.new_lemmas = self.new_lemmas, {}
+        return new_lemmas
+
+    def update(self, lemmas):
+        """Добавляет готовые пары слово -> лемма (например, из кэшей процессов-исполнителей)"""
+        for word, lemma in lemmas.items():
+            self.lemmas[word] = lemma
+            self.lemmas.move_to_end(word)
+        while len(self.lemmas) > self.max_size:
+            self.lemmas.popitem(last=False)
+
+    def load(self, path=LEMMA_CACHE_FILE):
+        """Загружает сохранённый кэш; файл другой версии pymorphy3 или повреждённый файл игнорируется"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Кэш лемм {path} не прочитан: {e}")
+            return False
+
+        if data.get('morph_version') != morph_version():
+            return False
+
+        self.update(data.get('lemmas', {}))
+        return True
+
+    def save(self, path=LEMMA_CACHE_FILE):
+        """Сохраняет кэш (временный файл + атомарная замена)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'morph_version': morph_version(), 'lemmas': self.lemmas}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        return f"{len(self.lemmas)} слов в кэше, попаданий {self.hits} из {total} ({hit_rate:.1%})"
+
+
+# Кэш процесса по умолчанию (используется, если preprocess_text не передан свой)
+LEMMA_CACHE = LemmaCache()
+
+
+def tokenize(text):
+    """Нижний регистр, удаление пунктуации и цифр, разбиение по пробельным символам"""
+    text = PUNCTUATION_RE.sub(' ', text.lower())
+    text = DIGITS_RE.sub('', text)
+    return text.split()
+
+
+def lemmatize_text(text, stopwords_list, morph_analyzer, lemma_cache):
+    """Токенизация, удаление стоп-слов и коротких слов, лемматизация; результат - леммы через пробел"""
+    if pd.isna(text):
+        return ""
+
+    processed_words = []
+    for word in tokenize(text):
+        if len(word) > 2 and word not in stopwords_list:
+            processed_words.append(lemma_cache.lemmatize(word, morph_analyzer))
+
+    return " ".join(processed_words)
+
+
+def text_workers():
+    """Число процессов лемматизации: переменная окружения PET911_TEXT_WORKERS или число ядер"""
+    return int(os.environ.get('PET911_TEXT_WORKERS') or os.cpu_count() or 1)
+
+
+# Состояние процесса-исполнителя: свой MorphAnalyzer и свой кэш лемм
+_WORKER = {}
+
+
+def _init_worker(stopwords_list, lemmas):
+    _WORKER['stopwords'] = stopwords_list
+    _WORKER['morph'] = pymorphy3.MorphAnalyzer()
+    _WORKER['cache'] = LemmaCache(track_new=True)
+    _WORKER['cache'].update(lemmas)
+
+
+def _lemmatize_chunk(texts):
+    """Обрабатывает часть корпуса; возвращает тексты, новые леммы и счётчики кэша"""
+    cache = _WORKER['cache']
+    hits, misses = cache.hits, cache.misses
+    processed = [lemmatize_text(text, _WORKER['stopwords'], _WORKER['morph'], cache) for text in texts]
+    return processed, cache.drain_new(), cache.hits - hits, cache.misses - misses
+
+
+def lemmatize_corpus(texts, stopwords_list, morph_analyzer, lemma_cache=None, workers=None,
+                     min_texts=PARALLEL_MIN_TEXTS, chunk_size=CHUNK_SIZE):
+    """
+    Лемматизирует корпус описаний. Большой корпус делится на части и обрабатывается в пуле процессов:
+    у каждого процесса свой MorphAnalyzer и копия кэша, новые леммы после каждой части сливаются в lemma_cache.
+    Порядок текстов сохраняется, результат совпадает с последовательной обработкой.
+    """
+    texts = list(texts)
+    if lemma_cache is None:
+        lemma_cache = LEMMA_CACHE
+    if workers is None:
+        workers = text_workers()
+
+    if workers <= 1 or len(texts) < min_texts:
+        return [lemmatize_text(text, stopwords_list, morph_analyzer, lemma_cache) for text in texts]
+
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    workers = min(workers, len(chunks))
+    print(f"⚙️ Лемматизация {len(texts)} текстов в {workers} процессах ({len(chunks)} частей)")
+
+    processed = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(stopwords_list, dict(lemma_cache.lemmas))) as executor:
+        for chunk_result, new_lemmas, hits, misses in executor.map(_lemmatize_chunk, chunks):
+            processed.extend(chunk_result)
+            lemma_cache.update(new_lemmas)
+            lemma_cache.hits += hits
+            lemma_cache.misses += misses
+
+    return processed
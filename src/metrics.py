@@ -0,0 +1,293 @@
+from .deps import *
+from contextlib import contextmanager
+import functools
+import platform
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Замеры шагов конвейера: время, процессорное время, пиковый RSS, пик памяти (tracemalloc) и число строк по фазам
+# (load, preprocess, aggregate, model, predict, plot, render, save). Фазы размечаются декоратором instrumented
+# или блоком with phase(...); записываются только внутри collect_metrics (шаг, запущенный конвейером),
+# при прямом вызове функций (бенчмарки, сервис прогноза) разметка ничего не делает
+# ----------------------------------------------------------------------------------------------------------------------
+METRICS_FILE = os.path.join('results', 'run_metrics.json')
+
+MB = 1024 * 1024
+
+# Открытые фазы текущего процесса: первая - шаг целиком, последняя - самая вложенная
+_STACK = []
+
+
+def metrics_enabled():
+    """Замеры можно отключить переменной окружения PET911_METRICS=0"""
+    return os.environ.get('PET911_METRICS', '1') != '0'
+
+
+def memory_tracing_enabled():
+    """
+    Пик памяти по фазам считается через tracemalloc (PET911_METRICS_MEMORY=1 или main.py --trace-memory).
+    По умолчанию выключен: tracemalloc в 4-5 раз замедляет код с большим числом мелких объектов
+    (импорт библиотек, apply по строкам, KMeans на малых данных) и искажает сами замеры времени
+    """
+    return os.environ.get('PET911_METRICS_MEMORY', '0') == '1'
+
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса, МБ (ru_maxrss в Linux - в килобайтах)"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cpu_time():
+    """Процессорное время процесса и его завершённых дочерних процессов (пулы отрисовки и лемматизации)"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def count_rows(value):
+    """Число строк таблицы, серии или массива; для кортежа - первого элемента, у которого оно есть"""
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    if isinstance(value, tuple):
+        for item in value:
+            rows = count_rows(item)
+            if rows is not None:
+                return rows
+    return None
+
+
+class PhaseRecord:
+    """
+    Замер одной фазы: время, процессорное время, пик памяти tracemalloc сверх памяти на входе в фазу,
+    строки, вложенные фазы. У шага целиком - ещё пиковый RSS процесса
+    """
+
+    def __init__(self, name, function=None, rows=None):
+        self.name = name
+        self.function = function
+        self.rows = rows
+        self.status = 'ok'
+        self.phases = []
+        self.wall_s = self.cpu_s = 0.0
+        self.mem_peak_mb = None
+        self.rss_peak_mb = None
+        self._start = None
+        self._peak = 0
+
+    def begin(self):
+        self._wall = time.perf_counter()
+        self._cpu = _cpu_time()
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # Пик внешней фазы, набранный до этой фазы, сохраняется у неё: счётчик пика сбрасывается
+            if _STACK:
+                _STACK[-1]._peak = max(_STACK[-1]._peak, peak)
+            tracemalloc.reset_peak()
+            self._start, self._peak = current, current
+        return self
+
+    def end(self):
+        self.wall_s = time.perf_counter() - self._wall
+        self.cpu_s = _cpu_time() - self._cpu
+        if self._start is not None and tracemalloc.is_tracing():
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            self.mem_peak_mb = (self._peak - self._start) / MB
+            if _STACK:
+                _STACK[-1]._peak = max(_STACK[-1]._peak, self._peak)
+        return self
+
+    @property
+    def self_s(self):
+        """Время фазы без вложенных фаз"""
+        return max(0.0, self.wall_s - sum(child.wall_s for child in self.phases))
+
+    def as_dict(self):
+        record = {
+            'name': self.name,
+            'status': self.status,
+            'wall_s': round(self.wall_s, 4),
+            'self_s': round(self.self_s, 4),
+            'cpu_s': round(self.cpu_s, 4),
+            'mem_peak_mb': None if self.mem_peak_mb is None else round(self.mem_peak_mb, 2),
+            'rows': self.rows
+        }
+        if self.rss_peak_mb is not None:
+            record['rss_peak_mb'] = round(self.rss_peak_mb, 1)
+        if self.function:
+            record['function'] = self.function
+        if self.phases:
+            record['phases'] = [child.as_dict() for child in self.phases]
+        return record
+
+
+@contextmanager
+def phase(name, rows=None, function=None):
+    """
+    Фаза шага. Число строк можно передать сразу или задать по ходу: with phase('save') as record: record.rows = ...
+    Вне collect_metrics запись не сохраняется.
+    """
+    record = PhaseRecord(name, function, rows)
+    if not _STACK:
+        yield record
+        return
+
+    parent = _STACK[-1]
+    record.begin()
+    _STACK.append(record)
+    try:
+        yield record
+    except BaseException:
+        record.status = 'failed'
+        raise
+    finally:
+        _STACK.pop()
+        record.end()
+        parent.phases.append(record)
+
+
+def instrumented(name):
+    """
+    Декоратор: вызов функции - фаза name. Строки - длина первой таблицы среди аргументов
+    (сколько строк обработано), а если её нет - длина результата (сколько загружено)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _STACK:
+                return func(*args, **kwargs)
+            rows = next((count_rows(arg) for arg in args if isinstance(arg, (pd.DataFrame, pd.Series, np.ndarray))), None)
+            with phase(name, rows, func.__qualname__) as record:
+                result = func(*args, **kwargs)
+                if record.rows is None:
+                    record.rows = count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collect_metrics(name):
+    """
+    Замер шага целиком вместе с размеченными внутри фазами. Возвращаемая запись заполняется при выходе из блока;
+    строки шага - сумма строк его фаз загрузки, пиковый RSS - у процесса, выполнявшего шаг
+    """
+    record = PhaseRecord(name)
+    if not metrics_enabled() or _STACK:
+        yield record
+        return
+
+    started_tracing = memory_tracing_enabled() and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    record.begin()
+    _STACK.append(record)
+    try:
+        yield record
+    except BaseException:
+        record.status = 'failed'
+        raise
+    finally:
+        _STACK.pop()
+        record.end()
+        record.rss_peak_mb = peak_rss_mb()
+        if started_tracing:
+            tracemalloc.stop()
+        if record.rows is None:
+            loaded = [child.rows for child in iter_phases(record) if child.name == 'load' and child.rows is not None]
+            record.rows = sum(loaded) if loaded else None
+
+
+def iter_phases(record):
+    """Все вложенные фазы записи (в глубину)"""
+    for child in record.phases:
+        yield child
+        yield from iter_phases(child)
+
+
+def _reset_after_fork():
+    # Дочерний процесс (пул отрисовки, лемматизации) не продолжает замеры родителя и не платит за tracemalloc:
+    # его время попадает в процессорное время родителя после завершения пула
+    if _STACK:
+        _STACK.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Файл замеров запуска и сводная таблица
+# ----------------------------------------------------------------------------------------------------------------------
+def save_run_metrics(steps, started_at, workers, path=METRICS_FILE):
+    """
+    Записывает замеры запуска: steps - имя шага -> словарь замера (PhaseRecord.as_dict() со статусом шага)
+    """
+    finished_at = datetime.now()
+    report = {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'finished_at': finished_at.isoformat(timespec='seconds'),
+        'wall_s': round((finished_at - started_at).total_seconds(), 3),
+        'workers': workers,
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'memory_tracing': memory_tracing_enabled(),
+        'render_profile': os.environ.get('PET911_RENDER_PROFILE') or 'print',
+        'data_dir': os.environ.get('PET911_DATA_DIR', 'data'),
+        'steps': steps
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def phase_shares(record):
+    """Доли фаз в времени шага по собственному времени фаз (без вложенных): имя фазы -> доля"""
+    totals = Counter()
+
+    def walk(node):
+        for child in node.get('phases', []):
+            totals[child['name']] += child['self_s']
+            walk(child)
+
+    walk(record)
+    wall = record.get('wall_s') or 0.0
+    if wall <= 0:
+        return {}
+    totals['прочее'] = max(0.0, wall - sum(totals.values()))
+    return {name: seconds / wall for name, seconds in totals.most_common()}
+
+
+def print_metrics_summary(path=METRICS_FILE, top_phases=3):
+    """Сводная таблица замеров последнего запуска: по строке на шаг и самые долгие фазы шага"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+
+    print(f"\n📊 Замеры шагов ({path}):")
+    print(f"{'шаг':<10} {'статус':<8} {'время, c':>9} {'CPU, c':>8} {'RSS, МБ':>8} {'tracemalloc, МБ':>15} "
+          f"{'строк':>10}  основные фазы")
+    for name, record in report['steps'].items():
+        if 'wall_s' not in record:
+            print(f"{name:<10} {record['status']:<8}")
+            continue
+        rss = '-' if record.get('rss_peak_mb') is None else f"{record['rss_peak_mb']:.0f}"
+        memory = '-' if record.get('mem_peak_mb') is None else f"{record['mem_peak_mb']:.1f}"
+        rows = '-' if record.get('rows') is None else f"{record['rows']:,}".replace(',', ' ')
+        shares = list(phase_shares(record).items())[:top_phases]
+        phases = ', '.join(f"{phase_name} {share:.0%}" for phase_name, share in shares)
+        print(f"{name:<10} {record['status']:<8} {record['wall_s']:>9.1f} {record['cpu_s']:>8.1f} {rss:>8} "
+              f"{memory:>15} {rows:>10}  {phases}")
+    print(f"⏱️ Всего: {report['wall_s']:.1f} c")
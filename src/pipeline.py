@@ -0,0 +1,392 @@
+from .deps import *
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from fnmatch import fnmatch
+import argparse
+import glob
+import inspect
+import sys
+import time
+
+from .dataset import LOST_FILE, FOUND_FILE, load_dataset, file_sha256
+from .clustering import CLUSTER_MODEL_FILE
+from .corpus import CORPUS_DIR
+from .charts import RENDER_PROFILES, RENDER_FORMATS, render_profile, render_format
+from .metrics import collect_metrics, metrics_enabled, save_run_metrics
+from .profiling import PROFILERS, profile_step, profiling_requested
+from .step_1_1 import step_1_1
+from .step_1_2 import step_1_2
+from .step_2_1 import step_2_1
+from .step_2_2 import step_2_2
+from .step_3_1 import step_3_1
+from .step_3_2 import step_3_2
+from .step_4_1 import step_4_1
+from .step_4_2 import step_4_2
+from .step_5 import step_5
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Описание шагов: входы и выходы задаются путями/glob-шаблонами, по ним строится граф зависимостей
+# ----------------------------------------------------------------------------------------------------------------------
+CHAPTER_1_DIR = 'results/Результаты 1 главы анализа'
+CHAPTER_2_DIR = 'results/Результаты 2 главы анализа'
+CHAPTER_3_DIR = 'results/Результаты 3 главы анализа'
+CHAPTER_4_DIR = 'results/Результаты 4 главы анализа'
+CHAPTER_5_DIR = 'results/Результаты 5 главы анализа'
+STATS_DIR = os.path.join(CHAPTER_3_DIR, '3.1 Stats for 3.2 Prediction')
+
+DATA_FILES = [LOST_FILE, FOUND_FILE]
+
+# Производные кэши в data/cache: корпус лемм и матрицы TF-IDF (step_4_1), модель кластеров (step_4_2)
+CORPUS_CACHE = [os.path.join(CORPUS_DIR, 'descriptions.*')]
+CLUSTER_MODEL_CACHE = [CLUSTER_MODEL_FILE]
+
+# Отпечатки выполненных шагов (хэши входов, параметров и исходного кода) хранятся рядом с результатами
+FINGERPRINT_DIR = os.path.join('results', '.fingerprints')
+
+# Общие модули, от которых зависит результат любого шага
+SHARED_MODULES = [f'{__package__}.deps', f'{__package__}.dataset']
+
+
+def package_modules(module_name, seen=None):
+    """Модуль шага и все модули пакета, из которых он (транзитивно) импортирует функции и классы"""
+    if seen is None:
+        seen = set()
+    seen.add(module_name)
+    for value in vars(sys.modules[module_name]).values():
+        name = value.__name__ if inspect.ismodule(value) else getattr(value, '__module__', None)
+        if isinstance(name, str) and name.startswith(f'{__package__}.') and name not in seen and name in sys.modules:
+            package_modules(name, seen)
+    return seen
+
+
+class PipelineStep:
+    """Шаг конвейера: функция, её входы, выходы и производные кэши"""
+
+    def __init__(self, name, func, inputs, outputs, params=None, caches=None, interactive=False):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        # Кэши шаг читает как входы, но и пишет сам - их хэши в отпечатке пересчитываются после выполнения
+        self.caches = list(caches or [])
+        # Код шага - его модуль и используемые им модули пакета (например, lemmatizer для step_4_1)
+        self.modules = sorted(package_modules(func.__module__).union(SHARED_MODULES))
+        # Шаг с меню (ввод с клавиатуры): в терминале выполняется в основном процессе после остальных,
+        # без терминала - как обычный шаг
+        self.interactive = interactive
+
+    def runs_interactively(self):
+        """Шаг откроет меню: он интерактивный и stdin - терминал (как проверяет step_3_2)"""
+        return self.interactive and sys.stdin is not None and sys.stdin.isatty()
+
+    def produces(self, path):
+        """Проверяет, попадает ли путь под один из выходов шага"""
+        return any(path == output or fnmatch(path, output) or path.startswith(output.rstrip('/') + '/')
+                   for output in self.outputs)
+
+
+STEPS = [
+    PipelineStep('step_1_1', step_1_1, DATA_FILES, [os.path.join(CHAPTER_1_DIR, '1.1*')]),
+    PipelineStep('step_1_2', step_1_2, DATA_FILES, [os.path.join(CHAPTER_1_DIR, '1.2*')]),
+    PipelineStep('step_2_1', step_2_1, DATA_FILES, [os.path.join(CHAPTER_2_DIR, '2.1*')]),
+    PipelineStep('step_2_2', step_2_2, DATA_FILES, [os.path.join(CHAPTER_2_DIR, '2.2*')]),
+    PipelineStep('step_3_1', step_3_1, DATA_FILES, [os.path.join(CHAPTER_3_DIR, '3.1*')]),
+    PipelineStep('step_3_2', step_3_2,
+                 [os.path.join(STATS_DIR, 'pet911_lost_statistics.json'),
+                  os.path.join(STATS_DIR, 'pet911_found_statistics.json')] + DATA_FILES,
+                 [os.path.join(CHAPTER_3_DIR, '3.2*')],
+                 interactive=True),
+    PipelineStep('step_4_1', step_4_1, DATA_FILES, [os.path.join(CHAPTER_4_DIR, '4.1*')], caches=CORPUS_CACHE),
+    PipelineStep('step_4_2', step_4_2, DATA_FILES, [os.path.join(CHAPTER_4_DIR, '4.2*')],
+                 caches=CLUSTER_MODEL_CACHE),
+    PipelineStep('step_5', step_5, DATA_FILES, [CHAPTER_5_DIR]),
+]
+
+STEPS_BY_NAME = {step.name: step for step in STEPS}
+
+
+def build_dependency_graph(steps):
+    """
+    Возвращает словарь: имя шага -> множество шагов, чьи выходы он читает.
+    Выбрасывает ValueError при циклической зависимости.
+    """
+    graph = {}
+    for step in steps:
+        graph[step.name] = {
+            other.name for other in steps
+            if other is not step and any(other.produces(path) for path in step.inputs)
+        }
+
+    # Проверка на циклы (алгоритм Кана)
+    remaining = {name: set(deps) for name, deps in graph.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Циклическая зависимость между шагами: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+    return graph
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Отпечатки шагов для инкрементального перезапуска
+# ----------------------------------------------------------------------------------------------------------------------
+_HASH_MEMO = {}
+
+
+def _cached_file_hash(path):
+    """Хэш файла с мемоизацией по (размер, mtime): большие CSV читаются один раз за запуск"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _HASH_MEMO:
+        _HASH_MEMO[key] = file_sha256(path)
+    return _HASH_MEMO[key]
+
+
+def hash_inputs(patterns):
+    """Хэши всех входных файлов (пути и glob-шаблоны); отсутствующий вход даёт None"""
+    hashes = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            hashes[path] = _cached_file_hash(path) if os.path.isfile(path) else None
+    return hashes
+
+
+def hash_sources(module_names):
+    """Хэш исходного кода модулей шага"""
+    digest = hashlib.sha256()
+    for name in sorted(set(module_names)):
+        with open(inspect.getsourcefile(sys.modules[name]), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def compute_fingerprint(step):
+    """Отпечаток шага: хэши входных данных и кэшей, параметры, профиль отрисовки графиков и хэш исходного кода"""
+    record = {
+        'step': step.name,
+        'inputs': hash_inputs(step.inputs),
+        'caches': hash_inputs(step.caches),
+        'params': step.params,
+        'render': {'profile': render_profile(), 'format': render_format()},
+        'source_hash': hash_sources(step.modules)
+    }
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+    record['fingerprint'] = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return record
+
+
+def fingerprint_path(step):
+    return os.path.join(FINGERPRINT_DIR, f'{step.name}.json')
+
+
+def outputs_exist(step):
+    """Все ли объявленные выходы шага присутствуют на диске"""
+    return all(glob.glob(output) for output in step.outputs)
+
+
+def is_up_to_date(step, record):
+    """Шаг можно пропустить: сохранённый отпечаток совпадает и выходы на месте"""
+    path = fingerprint_path(step)
+    if not os.path.exists(path) or not outputs_exist(step):
+        return False
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return saved.get('fingerprint') == record['fingerprint']
+
+
+def save_fingerprint(step, record):
+    os.makedirs(FINGERPRINT_DIR, exist_ok=True)
+    with open(fingerprint_path(step), 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+
+
+def drop_fingerprint(step):
+    """Удаляет отпечаток, чтобы шаг гарантированно перезапустился (перед запуском и после ошибки)"""
+    path = fingerprint_path(step)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _run_step_by_name(name):
+    """
+    Точка входа для процесса-исполнителя (функции передаются по имени, чтобы не зависеть от pickle).
+    Возвращает время выполнения и замеры шага по фазам (src/metrics.py).
+    Шаг, выбранный в PET911_PROFILE, выполняется под профилировщиком (src/profiling.py)
+    """
+    start = time.perf_counter()
+    with profile_step(name), collect_metrics(name) as record:
+        STEPS_BY_NAME[name].func()
+    return time.perf_counter() - start, record.as_dict()
+
+
+def run_pipeline(workers=None, step_names=None, force=False):
+    """
+    Выполняет шаги в порядке зависимостей; независимые шаги идут параллельно в пуле процессов.
+    Шаги, чей отпечаток (входы, кэши, параметры, код) не изменился с прошлого запуска, пропускаются,
+    если не указан force=True, шаг не выбран для профилирования (PET911_PROFILE) и не открывает меню в терминале.
+    workers=1 - последовательное выполнение в текущем процессе; step_names - подмножество шагов.
+    Возвращает словарь: имя шага -> ('ok' | 'cached' | 'failed' | 'skipped', время в секундах).
+    Замеры выполненных шагов по фазам записываются в results/run_metrics.json.
+    """
+    steps = [STEPS_BY_NAME[name] for name in step_names] if step_names else STEPS
+    workers = workers or int(os.environ.get('PET911_WORKERS', 0)) or os.cpu_count() or 1
+
+    # Шаги рисуют графики в своих пулах процессов: при параллельных шагах делим ядра между ними
+    if workers > 1:
+        os.environ.setdefault('PET911_RENDER_WORKERS', str(max(1, (os.cpu_count() or 1) // workers)))
+
+    graph = build_dependency_graph(steps)
+    status = {}
+    records = {}
+    metrics = {}
+    started_at = datetime.now()
+
+    # Разбираем CSV один раз в родительском процессе: дочерние процессы наследуют кэш через fork
+    with collect_metrics('preload') as preload:
+        for dataset_type in ('lost', 'found'):
+            try:
+                preload.rows = (preload.rows or 0) + len(load_dataset(dataset_type))
+            except Exception as e:
+                print(f"⚠️ Предварительная загрузка {dataset_type} не удалась: {e}")
+    metrics['preload'] = dict(preload.as_dict(), status='ok')
+
+    def is_ready(name):
+        return all(status.get(dep, (None,))[0] in ('ok', 'cached') for dep in graph[name])
+
+    def skip_blocked():
+        for name in pending:
+            if any(status.get(dep, (None,))[0] in ('failed', 'skipped') for dep in graph[name]):
+                status[name] = ('skipped', 0.0)
+                print(f"⏭️ {name}: пропущен из-за ошибки в зависимостях")
+        pending.difference_update(status)
+
+    def needs_run(name):
+        """Считает отпечаток готового к запуску шага; False - результаты актуальны"""
+        if name in interactive:
+            # Меню в терминале открывается всегда; пакетный прогноз шага и его отпечаток оно не трогает
+            return True
+        step = STEPS_BY_NAME[name]
+        records[name] = compute_fingerprint(step)
+        # Профилируемый шаг выполняется всегда - иначе профиля не будет
+        rerun = force or profiling_requested(name)
+        if not rerun and is_up_to_date(step, records[name]):
+            status[name] = ('cached', 0.0)
+            print(f"♻️ {name}: входы и код не изменились, пропуск")
+            return False
+        drop_fingerprint(step)
+        return True
+
+    def finish(name, result, step_metrics=None):
+        status[name] = result
+        metrics[name] = dict(step_metrics or {}, status=result[0])
+        step = STEPS_BY_NAME[name]
+        # Для меню отпечаток не считался: оно не пишет пакетный прогноз, и выходы шага актуальнее не становятся
+        if result[0] == 'ok' and name in records:
+            # Кэши шаг мог только что записать: отпечаток считается заново, иначе следующий запуск не совпадёт
+            save_fingerprint(step, compute_fingerprint(step) if step.caches else records[name])
+
+    interactive = [step.name for step in steps if step.runs_interactively()]
+    background = [step.name for step in steps if step.name not in interactive]
+    pending = set(background)
+
+    print(f"🚀 Запуск конвейера: {len(steps)} шагов, процессов: {workers}")
+
+    if workers <= 1:
+        for name in background:
+            skip_blocked()
+            if name not in pending:
+                continue
+            pending.discard(name)
+            if needs_run(name):
+                finish(name, *_execute_inline(name))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running = {}
+            while pending or running:
+                skip_blocked()
+                ready = [name for name in sorted(pending) if is_ready(name)]
+                for name in ready:
+                    pending.discard(name)
+                    if needs_run(name):
+                        print(f"▶️ {name}: запуск")
+                        running[pool.submit(_run_step_by_name, name)] = name
+
+                if not running:
+                    # Пропущенные по отпечатку шаги могли разблокировать следующие
+                    if ready:
+                        continue
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        elapsed, step_metrics = future.result()
+                        finish(name, ('ok', elapsed), step_metrics)
+                        print(f"✅ {name}: {elapsed:.1f} c")
+                    except Exception as e:
+                        finish(name, ('failed', 0.0))
+                        print(f"❌ {name}: {e}")
+
+    # Интерактивные шаги - в основном процессе, когда остальной вывод уже закончился
+    for name in interactive:
+        if is_ready(name):
+            if needs_run(name):
+                finish(name, *_execute_inline(name))
+        else:
+            status[name] = ('skipped', 0.0)
+            print(f"⏭️ {name}: пропущен из-за ошибки в зависимостях")
+
+    if metrics_enabled():
+        for name in status:
+            metrics.setdefault(name, {'status': status[name][0]})
+        order = ['preload'] + [step.name for step in steps]
+        save_run_metrics({name: metrics[name] for name in order if name in metrics}, started_at, workers)
+
+    return {step.name: status[step.name] for step in steps if step.name in status}
+
+
+def _execute_inline(name):
+    """Выполняет шаг в текущем процессе; возвращает статус с временем и замеры шага"""
+    print(f"▶️ {name}: запуск")
+    try:
+        elapsed, step_metrics = _run_step_by_name(name)
+        print(f"✅ {name}: {elapsed:.1f} c")
+        return ('ok', elapsed), step_metrics
+    except Exception as e:
+        print(f"❌ {name}: {e}")
+        return ('failed', 0.0), None
+
+
+def build_arg_parser():
+    """Аргументы командной строки для main.py"""
+    parser = argparse.ArgumentParser(description="Анализ объявлений Pet911")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Число параллельных процессов (по умолчанию - число ядер, 1 - последовательно)")
+    parser.add_argument('--steps', nargs='+', choices=list(STEPS_BY_NAME), default=None,
+                        help="Выполнить только указанные шаги")
+    parser.add_argument('--force', action='store_true',
+                        help="Перезапустить шаги, даже если их входы и код не изменились")
+    parser.add_argument('--clean', action='store_true',
+                        help="Удалить папку results перед запуском")
+    parser.add_argument('--render-profile', choices=list(RENDER_PROFILES), default=None,
+                        help="Профиль отрисовки графиков: draft - быстрый черновик, web - для экрана, "
+                             "print - качество для печати (по умолчанию, или PET911_RENDER_PROFILE)")
+    parser.add_argument('--render-format', choices=list(RENDER_FORMATS), default=None,
+                        help="Формат файлов графиков (по умолчанию png, или PET911_RENDER_FORMAT)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Считать пик памяти фаз шагов через tracemalloc (медленнее, или PET911_METRICS_MEMORY=1)")
+    parser.add_argument('--profile', nargs='+', metavar='STEP', default=None,
+                        help="Профилировать шаги (имена, шаблоны или all, или PET911_PROFILE); "
+                             "профили и сводки - в results/profiles")
+    parser.add_argument('--profiler', choices=list(PROFILERS), default=None,
+                        help="cprofile - точный учёт вызовов (по умолчанию), sample - сэмплирование стека "
+                             "с малыми накладными расходами (или PET911_PROFILER)")
+    return parser
@@ -0,0 +1,271 @@
+from .deps import *
+from contextlib import contextmanager
+from fnmatch import fnmatch
+import cProfile
+import pstats
+import signal
+import sys
+import time
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Профилирование шагов по запросу, без правки кода: PET911_PROFILE=step_4_2 (или main.py --profile step_4_2)
+# оборачивает выбранные шаги в cProfile или в сэмплирующий профилировщик. Результаты - в results/profiles:
+#   <шаг>.prof      - статистика cProfile (pstats, snakeviz, gprof2dot);
+#   <шаг>.collapsed - стеки в формате collapsed (как py-spy --format raw: flamegraph.pl, speedscope, inferno);
+#   <шаг>.txt       - сводка: самые долгие функции и распределение времени по библиотекам (она же - в журнале запуска)
+# Профилируется процесс шага: работа пулов отрисовки и лемматизации видна только как ожидание
+# (для профиля отрисовки - PET911_RENDER_WORKERS=1)
+# ----------------------------------------------------------------------------------------------------------------------
+PROFILES_DIR = os.path.join('results', 'profiles')
+
+# cprofile - точный учёт всех вызовов (заметно замедляет код с множеством мелких вызовов);
+# sample - сэмплы стека по процессорному времени (SIGPROF), накладные расходы малы, только Unix
+PROFILERS = ('cprofile', 'sample')
+DEFAULT_PROFILER = 'cprofile'
+
+# Интервал сэмплирования, с
+SAMPLE_INTERVAL = 0.005
+
+# Сколько функций показывать в сводке; библиотеки с меньшей долей времени объединяются в одну строку
+PROFILE_TOP = 15
+MIN_LIBRARY_SHARE = 0.01
+
+SITE_PACKAGES_RE = re.compile(r'[/\\](?:site|dist)-packages[/\\]([^/\\]+)')
+# Модуль встроенной функции в cProfile: "<built-in method numpy.core._multiarray_umath.dot>",
+# "<method 'reduce' of 'numpy.ufunc' objects>"
+BUILTIN_MODULE_RE = re.compile(r"(?:built-in method |of ')([A-Za-z_]\w*)\.")
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Профилировщики, запущенные в текущем процессе
+_ACTIVE = []
+# Обёртки, которые в списке "с вложенными вызовами" только повторяют время шага: замеры фаз и контекстные менеджеры
+PLUMBING_RE = re.compile(r'\((?:src/metrics\.py|contextlib\.py):|builtins\.next')
+
+
+def profile_targets():
+    """Шаги для профилирования из PET911_PROFILE: имена или шаблоны через запятую, all - все шаги"""
+    value = os.environ.get('PET911_PROFILE', '')
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def profiling_requested(step_name):
+    return any(pattern in ('all', step_name) or fnmatch(step_name, pattern) for pattern in profile_targets())
+
+
+def profiler_kind():
+    """Профилировщик из PET911_PROFILER (по умолчанию cprofile)"""
+    kind = (os.environ.get('PET911_PROFILER') or DEFAULT_PROFILER).lower()
+    if kind not in PROFILERS:
+        raise ValueError(f"Неизвестный профилировщик {kind!r}, доступны: {', '.join(PROFILERS)}")
+    return kind
+
+
+def profile_top():
+    return int(os.environ.get('PET911_PROFILE_TOP') or PROFILE_TOP)
+
+
+def library_of(filename, name=''):
+    """
+    Библиотека, к которой относится функция: пакет из site-packages, src или stdlib по файлу функции;
+    для встроенных функций cProfile (файл '~') - по модулю в имени функции
+    """
+    if not filename or filename == '~' or filename.startswith('<'):
+        match = BUILTIN_MODULE_RE.search(name)
+        module = match.group(1) if match else 'builtins'
+        if module == 'builtins':
+            return 'встроенные'
+        return 'stdlib' if module in sys.stdlib_module_names else module.lstrip('_')
+    match = SITE_PACKAGES_RE.search(filename)
+    if match:
+        return match.group(1).split('.')[0].split('-')[0]
+    if os.path.abspath(filename).startswith(PROJECT_DIR):
+        return 'src'
+    return 'stdlib'
+
+
+def short_path(filename):
+    """Путь файла без префикса site-packages/проекта: sklearn/cluster/_kmeans.py, src/step_4_2.py"""
+    match = SITE_PACKAGES_RE.search(filename)
+    if match:
+        return filename[match.start(1):]
+    if os.path.abspath(filename).startswith(PROJECT_DIR):
+        return os.path.join('src', os.path.relpath(filename, PROJECT_DIR))
+    return os.path.basename(filename)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Сэмплирующий профилировщик
+# ----------------------------------------------------------------------------------------------------------------------
+class SamplingProfiler:
+    """
+    Сэмплы стека основного потока по таймеру процессорного времени (ITIMER_PROF).
+    Обработчик сигнала выполняется между инструкциями интерпретатора, поэтому долгий вызов C-кода
+    (numpy, KMeans, savefig) даёт один поздний сигнал: каждому сэмплу приписывается процессорное время
+    с предыдущего сэмпла, и время C-кода достаётся вызвавшей его функции Python.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.libraries = Counter()
+        self._labels = {}
+        self._previous_handler = None
+        self._last = None
+
+    def _label(self, code):
+        """Подпись кадра 'функция (файл:строка)', один раз на объект кода"""
+        if code not in self._labels:
+            self._labels[code] = f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})"
+        return self._labels[code]
+
+    @staticmethod
+    def available():
+        return hasattr(signal, 'setitimer') and hasattr(signal, 'SIGPROF')
+
+    def _sample(self, signum, frame):
+        now = time.process_time()
+        elapsed, self._last = now - self._last, now
+        if frame is None:
+            return
+        self.libraries[library_of(frame.f_code.co_filename)] += elapsed
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(stack))] += elapsed
+
+    def start(self):
+        self._last = time.process_time()
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    def write_collapsed(self, path):
+        """Стеки в формате collapsed: 'корень;...;лист число_сэмплов' (число интервалов сэмплирования)"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, seconds in sorted(self.stacks.items()):
+                f.write(f"{stack} {max(1, round(seconds / self.interval))}\n")
+
+    def summary(self, top=PROFILE_TOP):
+        """(собственное время функций, время с вложенными вызовами, время по библиотекам) в секундах"""
+        own, total = Counter(), Counter()
+        for stack, seconds in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += seconds
+            for frame in set(frames):
+                total[frame] += seconds
+        return own.most_common(top), top_total(total, top), self.libraries.most_common()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Сводка по профилю
+# ----------------------------------------------------------------------------------------------------------------------
+def cprofile_summary(stats, top=PROFILE_TOP):
+    """То же, что SamplingProfiler.summary, по статистике cProfile (собственное и полное время функций)"""
+    own, total, libraries = Counter(), Counter(), Counter()
+    for (filename, line, name), (_, _, tottime, cumtime, _) in stats.stats.items():
+        label = name if filename == '~' else f"{name} ({short_path(filename)}:{line})"
+        own[label] += tottime
+        total[label] = max(total[label], cumtime)
+        libraries[library_of(filename, name)] += tottime
+    return own.most_common(top), top_total(total, top), libraries.most_common()
+
+
+def top_total(total, top):
+    """Самые долгие функции с вложенными вызовами без обёрток PLUMBING_RE"""
+    return [(label, seconds) for label, seconds in total.most_common() if not PLUMBING_RE.search(label)][:top]
+
+
+def format_summary(step_name, kind, own, total, libraries):
+    total_time = sum(seconds for _, seconds in libraries) or 1.0
+    lines = [f"🔬 Профиль {step_name} ({kind}, {total_time:.1f} c)", "   По библиотекам (собственное время функций):"]
+    shown = [(library, seconds) for library, seconds in libraries if seconds / total_time >= MIN_LIBRARY_SHARE]
+    rest = total_time - sum(seconds for _, seconds in shown)
+    if len(shown) < len(libraries):
+        shown.append((f'остальные ({len(libraries) - len(shown)})', rest))
+    lines += [f"   {seconds:8.2f} c {seconds / total_time:6.1%}  {library}" for library, seconds in shown]
+    lines.append("   Самые долгие функции (собственное время):")
+    lines += [f"   {seconds:8.2f} c  {label}" for label, seconds in own]
+    lines.append("   Самые долгие функции (с вложенными вызовами):")
+    lines += [f"   {seconds:8.2f} c  {label}" for label, seconds in total]
+    return '\n'.join(lines)
+
+
+@contextmanager
+def profile_step(step_name):
+    """
+    Профилирует блок, если шаг выбран в PET911_PROFILE: сохраняет профиль в results/profiles
+    и печатает сводку. Для невыбранных шагов ничего не делает
+    """
+    if not profiling_requested(step_name):
+        yield None
+        return
+
+    kind = profiler_kind()
+    if kind == 'sample' and not SamplingProfiler.available():
+        print("⚠️ Сэмплирующий профилировщик недоступен на этой платформе, используется cProfile")
+        kind = 'cprofile'
+
+    if kind == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = SamplingProfiler()
+        profiler.start()
+    _ACTIVE.append(profiler)
+    try:
+        yield profiler
+    finally:
+        _ACTIVE.remove(profiler)
+        if kind == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+        save_profile(step_name, kind, profiler)
+
+
+def _stop_after_fork():
+    # Пулы отрисовки и лемматизации, запущенные из профилируемого шага, наследуют хук cProfile
+    # (таймер сэмплирования при fork не наследуется): отключаем, их профиль всё равно не сохраняется
+    for profiler in _ACTIVE:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+    _ACTIVE.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_stop_after_fork)
+
+
+def save_profile(step_name, kind, profiler):
+    """Записывает файлы профиля шага и печатает сводку; возвращает пути файлов"""
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    base = os.path.join(PROFILES_DIR, step_name)
+    paths = []
+
+    # Профиль другого вида от прошлого запуска не должен выдавать себя за свежий
+    for stale in (f'{base}.prof', f'{base}.collapsed'):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    if kind == 'cprofile':
+        profiler.dump_stats(f'{base}.prof')
+        paths.append(f'{base}.prof')
+        own, total, libraries = cprofile_summary(pstats.Stats(profiler), profile_top())
+    else:
+        profiler.write_collapsed(f'{base}.collapsed')
+        paths.append(f'{base}.collapsed')
+        own, total, libraries = profiler.summary(profile_top())
+
+    summary = format_summary(step_name, kind, own, total, libraries)
+    with open(f'{base}.txt', 'w', encoding='utf-8') as f:
+        f.write(summary + '\n')
+    paths.append(f'{base}.txt')
+
+    print(summary)
+    print(f"💾 Профиль {step_name}: {', '.join(paths)}")
+    sys.stdout.flush()
+    return paths
@@ -0,0 +1,298 @@
+from .deps import *
+import argparse
+import asyncio
+import sys
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from .step_3_2 import AD_TYPES, PetSearchPredictor, STATS_DIR, normalize_ad
+
+# ----------------------------------------------------------------------------------------------------------------------
+# HTTP-сервис прогноза (3.2): статистика загружается один раз при старте и перезагружается при её пересохранении
+# ----------------------------------------------------------------------------------------------------------------------
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8911
+
+# Период проверки файлов статистики, секунды (0 - без горячей перезагрузки)
+RELOAD_INTERVAL = 2.0
+
+# Ограничения на размер запроса
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+
+class HttpError(Exception):
+    """Ошибка запроса, которая возвращается клиенту с указанным HTTP-статусом"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class PredictionService:
+    """Держит загруженную модель и обрабатывает запросы прогноза"""
+
+    def __init__(self, stats_dir=STATS_DIR):
+        self.stats_dir = stats_dir
+        self.predictor = PetSearchPredictor(stats_dir=stats_dir)
+        self.signature = self.predictor.stats_signature()
+        self.loaded_at = datetime.now()
+        self.reloads = 0
+
+    def reload_if_changed(self):
+        """
+        Перезагружает статистику, если файлы изменились.
+        Новая модель собирается целиком и только потом подменяет текущую, поэтому запросы
+        никогда не видят наполовину загруженную статистику; при ошибке остаётся прежняя модель.
+        """
+        signature = self.predictor.stats_signature()
+        if signature == self.signature:
+            return False
+
+        try:
+            predictor = PetSearchPredictor(stats_dir=self.stats_dir)
+        except Exception as e:
+            print(f"⚠️ Не удалось перезагрузить статистику, работаем на прежней: {e}")
+            return False
+
+        self.predictor = predictor
+        self.signature = signature
+        self.loaded_at = datetime.now()
+        self.reloads += 1
+        print(f"🔄 Статистика перезагружена ({self.loaded_at:%Y-%m-%d %H:%M:%S})")
+        return True
+
+    def predict(self, payload):
+        """Прогноз для одного объявления с факторами и рекомендациями"""
+        if not isinstance(payload, dict):
+            raise HttpError(400, "Ожидается JSON-объект объявления")
+
+        ad_type = payload.get('ad_type')
+        if ad_type not in AD_TYPES:
+            raise HttpError(400, f"Поле ad_type должно быть одним из {list(AD_TYPES)}")
+
+        predictor = self.predictor
+        ad = normalize_ad({field: value for field, value in payload.items() if field != 'ad_type'})
+        probability, factors, base_rate = predictor.explain_probability(ad, ad_type)
+
+        return {
+            'ad_type': ad_type,
+            'probability': probability,
+            'base_rate': base_rate,
+            'factors': factors,
+            'recommendations': predictor.get_recommendations(ad, probability, ad_type, base_rate)
+        }
+
+    def predict_batch(self, payload):
+        """Пакетный прогноз: {"ad_type": ..., "ads": [...]} или просто список объявлений с полем ad_type"""
+        if isinstance(payload, list):
+            ads, ad_type = payload, None
+        elif isinstance(payload, dict):
+            ads, ad_type = payload.get('ads'), payload.get('ad_type')
+        else:
+            raise HttpError(400, "Ожидается список объявлений или объект с полем ads")
+
+        if not isinstance(ads, list) or not all(isinstance(ad, dict) for ad in ads):
+            raise HttpError(400, "Поле ads должно быть списком JSON-объектов")
+        if ad_type is not None and ad_type not in AD_TYPES:
+            raise HttpError(400, f"Поле ad_type должно быть одним из {list(AD_TYPES)}")
+        if not ads:
+            return {'count': 0, 'results': []}
+
+        try:
+            scores = self.predictor.score_batch(ads, ad_type)
+        except ValueError as e:
+            raise HttpError(400, str(e))
+
+        return {'count': len(scores), 'results': scores.to_dict(orient='records')}
+
+    def health(self):
+        predictor = self.predictor
+        return {
+            'status': 'ok',
+            'stats_loaded': {'lost': predictor.stats_lost is not None, 'found': predictor.stats_found is not None},
+            'loaded_at': self.loaded_at.isoformat(timespec='seconds'),
+            'reloads': self.reloads
+        }
+
+
+# Маршруты: (метод, путь) -> (имя метода PredictionService, выполнять ли в пуле потоков)
+# Пакетный прогноз может занять заметное время, поэтому он не блокирует цикл событий
+ROUTES = {
+    ('POST', '/predict'): ('predict', False),
+    ('POST', '/predict/batch'): ('predict_batch', True),
+    ('GET', '/health'): ('health', False)
+}
+
+
+async def read_request(reader):
+    """Читает один HTTP-запрос; None - клиент закрыл соединение"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise HttpError(400, "Неполный запрос")
+    except asyncio.LimitOverrunError:
+        raise HttpError(431, "Слишком большие заголовки")
+
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ', 2)
+    except ValueError:
+        raise HttpError(400, "Некорректная строка запроса")
+
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        raise HttpError(411, "Передайте тело запроса с заголовком Content-Length")
+
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise HttpError(400, "Некорректный Content-Length")
+    if length < 0:
+        raise HttpError(400, "Некорректный Content-Length")
+    if length > MAX_BODY_SIZE:
+        raise HttpError(413, f"Тело запроса больше {MAX_BODY_SIZE} байт")
+
+    try:
+        body = await reader.readexactly(length) if length else b''
+    except asyncio.IncompleteReadError:
+        raise HttpError(400, "Неполное тело запроса")
+
+    return method.upper(), urlsplit(target).path, version.strip().upper(), headers, body
+
+
+def keep_alive_requested(version, headers):
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+
+async def dispatch(service, method, path, body):
+    """Выбирает обработчик по маршруту и возвращает (статус, JSON-ответ)"""
+    route = ROUTES.get((method, path))
+    if route is None:
+        if any(route_path == path for _, route_path in ROUTES):
+            return 405, {'error': f"Метод {method} не поддерживается для {path}"}
+        return 404, {'error': f"Неизвестный путь {path}"}
+
+    handler_name, in_executor = route
+    handler = getattr(service, handler_name)
+
+    try:
+        if method == 'GET':
+            return 200, handler()
+
+        try:
+            payload = json.loads(body.decode('utf-8')) if body else {}
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise HttpError(400, f"Некорректный JSON: {e}")
+
+        if in_executor:
+            return 200, await asyncio.get_running_loop().run_in_executor(None, handler, payload)
+        return 200, handler(payload)
+    except HttpError as e:
+        return e.status, {'error': e.message}
+    except Exception as e:
+        print(f"❌ Ошибка обработки {method} {path}: {e}")
+        return 500, {'error': "Внутренняя ошибка сервера"}
+
+
+async def send_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = (
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        f"\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+
+async def handle_connection(service, reader, writer):
+    """Обслуживает соединение клиента (с поддержкой keep-alive)"""
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except HttpError as e:
+                await send_response(writer, e.status, {'error': e.message}, keep_alive=False)
+                break
+
+            if request is None:
+                break
+
+            method, path, version, headers, body = request
+            keep_alive = keep_alive_requested(version, headers)
+            status, payload = await dispatch(service, method, path, body)
+            await send_response(writer, status, payload, keep_alive)
+
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+
+async def watch_statistics(service, interval):
+    """Периодически проверяет файлы статистики и перезагружает модель при их изменении"""
+    while True:
+        await asyncio.sleep(interval)
+        service.reload_if_changed()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, reload_interval=RELOAD_INTERVAL):
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(service, reader, writer),
+        host, port, limit=MAX_HEADER_SIZE
+    )
+    print(f"🚀 Сервис прогноза запущен: http://{host}:{port} (POST /predict, POST /predict/batch, GET /health)")
+
+    watcher = None
+    if reload_interval > 0:
+        watcher = asyncio.create_task(watch_statistics(service, reload_interval))
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+
+
+def main(argv=None):
+    """Запуск сервиса: python -m src.server --port 8911"""
+    parser = argparse.ArgumentParser(description="HTTP-сервис прогноза успешности объявлений Pet911")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"Адрес (по умолчанию {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Порт (по умолчанию {DEFAULT_PORT})")
+    parser.add_argument('--stats-dir', default=STATS_DIR, help="Папка со статистикой из step_3_1")
+    parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL,
+                        help="Период проверки файлов статистики в секундах (0 - без перезагрузки)")
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+
+    service = PredictionService(stats_dir=args.stats_dir)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.reload_interval))
+    except KeyboardInterrupt:
+        print("👋 Сервис остановлен")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,17 @@
 from .deps import *
+from .dataset import load_dataset, fill_category, LOST_FILE, FOUND_FILE
+from .charts import submit_chart, chart_batch, chart_annotations
+from .metrics import instrumented
 
 
 
+@instrumented('load')
 def load_and_prepare_data(file_path, dataset_type):
     """Загрузка и подготовка данных для lost или found датасета"""
-    df = pd.read_csv(file_path)
-
-    # Преобразование даты
-    df['дата_публикации'] = pd.to_datetime(df['дата_публикации'], format='%a, %d.%m.%Y', errors='coerce')
+    df = load_dataset(dataset_type, file_path)
 
     # Заполнение пропущенных регионов
-    df['регион'] = df['регион'].fillna('Неизвестно')
+    df['регион'] = fill_category(df['регион'], 'Неизвестно')
 
     # Создание флага "найдено" в зависимости от типа датасета
     if dataset_type == 'lost':
@@ -21,11 +22,12 @@ def load_and_prepare_data(file_path, dataset_type):
     return df
 
 
+@instrumented('aggregate')
 def analyze_regions(df, top_regions_count=5):
     """Анализ региональной статистики с группировкой по топ-N регионов"""
 
     # Группировка по регионам
-    region_stats = df.groupby('регион').agg({
+    region_stats = df.groupby('регион', observed=True).agg({
         'id': 'count',  # общее количество заявок
         'найдено': 'sum'  # количество найденных
     }).rename(columns={'id': 'общее_количество', 'найдено': 'найдено_количество'})
@@ -62,6 +64,7 @@ def analyze_regions(df, top_regions_count=5):
     return final_stats, region_stats
 
 
+@instrumented('plot')
 def create_regions_table(region_stats_full, dataset_type, top_regions_count=5, output_prefix=''):
     """Создание таблицы с топ-10 регионов по проценту найденных"""
 
@@ -71,11 +74,6 @@ def create_regions_table(region_stats_full, dataset_type, top_regions_count=5, o
     # Сортировка по проценту найденных (по убыванию)
     top_regions = filtered_stats.sort_values('процент_найденных', ascending=False).head(10)
 
-    # Создаем таблицу
-    fig, ax = plt.subplots(figsize=(14, 8))
-    ax.axis('tight')
-    ax.axis('off')
-
     # Подготовка данных для таблицы
     table_data = []
     for region, row in top_regions.iterrows():
@@ -86,6 +84,27 @@ def create_regions_table(region_stats_full, dataset_type, top_regions_count=5, o
             f"{row['процент_найденных']}%"
         ])
 
+    title_map = {
+        'lost': 'поиска питомцев',
+        'found': 'поиска хозяев'
+    }
+
+    submit_chart(
+        f'results/Результаты 1 главы анализа/1.1.1 Топ-10 регионов по проценту успешных случаев для {output_prefix}.png',
+        draw_regions_table, table_data, title_map[dataset_type]
+    )
+
+    return top_regions
+
+
+def draw_regions_table(table_data, dataset_title):
+    """Таблица топ-10 регионов по проценту найденных"""
+
+    # Создаем таблицу
+    fig, ax = plt.subplots(figsize=(14, 8))
+    ax.axis('tight')
+    ax.axis('off')
+
     # Создание таблицы
     table = ax.table(
         cellText=table_data,
@@ -109,13 +128,6 @@ def create_regions_table(region_stats_full, dataset_type, top_regions_count=5, o
             else:  # Данные
                 table[(i, j)].set_facecolor('#f0f0f0')
 
-    title_map = {
-        'lost': 'поиска питомцев',
-        'found': 'поиска хозяев'
-    }
-
-    dataset_title = title_map[dataset_type]
-
     plt.title(f'Топ-10 регионов по проценту успешных случаев {dataset_title}',
               fontsize=14, fontweight='bold', pad=20)
 
@@ -125,12 +137,9 @@ def create_regions_table(region_stats_full, dataset_type, top_regions_count=5, o
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout()
-    plt.savefig(f'results/Результаты 1 главы анализа/1.1.1 Топ-10 регионов по проценту успешных случаев для {output_prefix}.png', dpi=300, bbox_inches='tight')
-    plt.close()
-
-    return top_regions
 
 
+@instrumented('plot')
 def create_visualizations(region_stats, dataset_type, top_regions_count=5, output_prefix=''):
     """Создание визуализаций для анализа регионов"""
 
@@ -140,8 +149,20 @@ def create_visualizations(region_stats, dataset_type, top_regions_count=5, outpu
     }
 
     dataset_title = title_map[dataset_type]
+    chart_dir = 'results/Результаты 1 главы анализа'
+
+    submit_chart(f'{chart_dir}/1.1.2. Распределение количества заявок по регионам для {output_prefix}.png',
+                 draw_requests_by_region, region_stats, dataset_title, top_regions_count)
+    submit_chart(f'{chart_dir}/1.1.3. Распределение количества заявок по регионам для {output_prefix} (Круговая диаграмма).png',
+                 draw_requests_pie, region_stats, dataset_title, top_regions_count)
+    submit_chart(f'{chart_dir}/1.1.4. Процент успешных случаев поиска по регионам для {output_prefix}.png',
+                 draw_success_rate_by_region, region_stats, dataset_title, top_regions_count)
+    submit_chart(f'{chart_dir}/1.1.5. Сравнение общего количества заявок и успешных случаев по регионам для {output_prefix}.png',
+                 draw_requests_vs_success, region_stats, dataset_title, top_regions_count)
+
 
-    # 1. Горизонтальная гистограмма - регионы по общему количеству заявок
+def draw_requests_by_region(region_stats, dataset_title, top_regions_count):
+    """Горизонтальная гистограмма - регионы по общему количеству заявок"""
     fig, ax = plt.subplots(figsize=(12, 8))
     bars = ax.barh(region_stats.index, region_stats['общее_количество'])
     ax.set_xlabel('Количество заявок')
@@ -149,10 +170,11 @@ def create_visualizations(region_stats, dataset_type, top_regions_count=5, outpu
     ax.grid(axis='x', alpha=0.3)
 
     # Добавление значений на столбцы
-    for bar, value in zip(bars, region_stats['общее_количество']):
-        ax.text(bar.get_width() + max(region_stats['общее_количество']) * 0.01,
-                bar.get_y() + bar.get_height() / 2,
-                f'{value}', va='center', ha='left', fontsize=10)
+    if chart_annotations():
+        for bar, value in zip(bars, region_stats['общее_количество']):
+            ax.text(bar.get_width() + max(region_stats['общее_количество']) * 0.01,
+                    bar.get_y() + bar.get_height() / 2,
+                    f'{value}', va='center', ha='left', fontsize=10)
 
     # Добавляем пояснение про "Другие" в окошке внизу слева если нужно
     if 'Другие' in region_stats.index:
@@ -161,10 +183,10 @@ def create_visualizations(region_stats, dataset_type, top_regions_count=5, outpu
                     bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout()
-    plt.savefig(f'results/Результаты 1 главы анализа/1.1.2. Распределение количества заявок по регионам для {output_prefix}.png', dpi=300, bbox_inches='tight')
-    plt.close()
 
-    # 2. Круговая диаграмма - распределение заявок по регионам
+
+def draw_requests_pie(region_stats, dataset_title, top_regions_count):
+    """Круговая диаграмма - распределение заявок по регионам"""
     fig, ax = plt.subplots(figsize=(12, 8))
 
     # Рассчитываем проценты для круговой диаграммы
@@ -201,10 +223,10 @@ def create_visualizations(region_stats, dataset_type, top_regions_count=5, outpu
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout()
-    plt.savefig(f'results/Результаты 1 главы анализа/1.1.3. Распределение количества заявок по регионам для {output_prefix} (Круговая диаграмма).png', dpi=300, bbox_inches='tight')
-    plt.close()
 
-    # 3. График эффективности регионов (процент найденных)
+
+def draw_success_rate_by_region(region_stats, dataset_title, top_regions_count):
+    """График эффективности регионов (процент найденных)"""
     fig, ax = plt.subplots(figsize=(12, 8))
 
     # Сортируем по проценту найденных для лучшего отображения
@@ -216,9 +238,10 @@ def create_visualizations(region_stats, dataset_type, top_regions_count=5, outpu
     ax.grid(axis='x', alpha=0.3)
 
     # Добавление значений на столбцы
-    for bar, value in zip(bars, region_stats_sorted_eff['процент_найденных']):
-        ax.text(bar.get_width() + 1, bar.get_y() + bar.get_height() / 2,
-                f'{value}%', va='center', ha='left', fontsize=10)
+    if chart_annotations():
+        for bar, value in zip(bars, region_stats_sorted_eff['процент_найденных']):
+            ax.text(bar.get_width() + 1, bar.get_y() + bar.get_height() / 2,
+                    f'{value}%', va='center', ha='left', fontsize=10)
 
     # Добавляем пояснение в окошке внизу слева
     explanation = "За 100% принято общее количество заявок в регионе"
@@ -229,10 +252,10 @@ def create_visualizations(region_stats, dataset_type, top_regions_count=5, outpu
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout()
-    plt.savefig(f'results/Результаты 1 главы анализа/1.1.4. Процент успешных случаев поиска по регионам для {output_prefix}.png', dpi=300, bbox_inches='tight')
-    plt.close()
 
-    # 4. Столбчатая диаграмма - сравнение абсолютных чисел
+
+def draw_requests_vs_success(region_stats, dataset_title, top_regions_count):
+    """Столбчатая диаграмма - сравнение абсолютных чисел"""
     fig, ax = plt.subplots(figsize=(12, 8))
 
     x = np.arange(len(region_stats))
@@ -253,21 +276,22 @@ def create_visualizations(region_stats, dataset_type, top_regions_count=5, outpu
     ax.legend(loc='upper right', fontsize=10)
 
     # Добавление значений на столбцы
-    for bar in bars1:
-        height = bar.get_height()
-        ax.annotate(f'{height}',
-                    xy=(bar.get_x() + bar.get_width() / 2, height),
-                    xytext=(0, 3),
-                    textcoords="offset points",
-                    ha='center', va='bottom', fontsize=9)
-
-    for bar in bars2:
-        height = bar.get_height()
-        ax.annotate(f'{height}',
-                    xy=(bar.get_x() + bar.get_width() / 2, height),
-                    xytext=(0, 3),
-                    textcoords="offset points",
-                    ha='center', va='bottom', fontsize=9)
+    if chart_annotations():
+        for bar in bars1:
+            height = bar.get_height()
+            ax.annotate(f'{height}',
+                        xy=(bar.get_x() + bar.get_width() / 2, height),
+                        xytext=(0, 3),
+                        textcoords="offset points",
+                        ha='center', va='bottom', fontsize=9)
+
+        for bar in bars2:
+            height = bar.get_height()
+            ax.annotate(f'{height}',
+                        xy=(bar.get_x() + bar.get_width() / 2, height),
+                        xytext=(0, 3),
+                        textcoords="offset points",
+                        ha='center', va='bottom', fontsize=9)
 
     # Добавляем пояснение в окошке внизу слева
     explanation = "Проценты успешных случаев рассчитываются от общего количества заявок в регионе"
@@ -278,8 +302,6 @@ def create_visualizations(region_stats, dataset_type, top_regions_count=5, outpu
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout()
-    plt.savefig(f'results/Результаты 1 главы анализа/1.1.5. Сравнение общего количества заявок и успешных случаев по регионам для {output_prefix}.png', dpi=300, bbox_inches='tight')
-    plt.close()
 
 
 def analyze_dataset(file_path, dataset_type, top_regions_count=5):
@@ -311,12 +333,14 @@ def step_1_1():
     # Создаем папку для результатов
     os.makedirs('results/Результаты 1 главы анализа', exist_ok=True)
 
-    # Анализ для lost датасета (поиск питомцев)
-    df_lost, stats_lost_viz, stats_lost_full = analyze_dataset(
-        'data/Dataset_final_Pet911_lost.csv', 'lost', top_regions_count=5
-    )
-
-    # Анализ для found датасета (поиск хозяев)
-    df_found, stats_found_viz, stats_found_full = analyze_dataset(
-        'data/dataset_final_Pet911_found.csv', 'found', top_regions_count=5
-    )
+    # Графики обоих датасетов рисуются одной пачкой в пуле процессов
+    with chart_batch():
+        # Анализ для lost датасета (поиск питомцев)
+        df_lost, stats_lost_viz, stats_lost_full = analyze_dataset(
+            LOST_FILE, 'lost', top_regions_count=5
+        )
+
+        # Анализ для found датасета (поиск хозяев)
+        df_found, stats_found_viz, stats_found_full = analyze_dataset(
+            FOUND_FILE, 'found', top_regions_count=5
+        )
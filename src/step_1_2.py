@@ -1,33 +1,13 @@
 from .deps import *
+from .dataset import load_dataset, parse_russian_dates, LOST_FILE, FOUND_FILE
+from .charts import submit_chart, chart_batch, chart_annotations
+from .metrics import instrumented
 
+@instrumented('load')
 def load_and_prepare_data(file_path, dataset_type):
     """Загрузка и подготовка данных"""
-    df = pd.read_csv(file_path)
-
-    # Функция для преобразования русских дат
-    def parse_russian_date(date_str):
-        try:
-            russian_to_english = {
-                'пн': 'Mon', 'вт': 'Tue', 'ср': 'Wed', 'чт': 'Thu',
-                'пт': 'Fri', 'сб': 'Sat', 'вс': 'Sun'
-            }
-
-            parts = date_str.split(', ')
-            if len(parts) == 2:
-                day_abbr = parts[0].strip()
-                date_part = parts[1].strip()
-
-                if day_abbr in russian_to_english:
-                    english_abbr = russian_to_english[day_abbr]
-                    english_date_str = f"{english_abbr}, {date_part}"
-                    return pd.to_datetime(english_date_str, format='%a, %d.%m.%Y')
-
-            return pd.to_datetime(date_str, errors='coerce')
-        except:
-            return pd.NaT
-
-    # Применяем функцию преобразования дат
-    df['дата_публикации'] = df['дата_публикации'].apply(parse_russian_date)
+    df = load_dataset(dataset_type, file_path)
+    df['дата_публикации'] = parse_russian_dates(df['дата_публикации'])
 
     # Удаляем строки с некорректными датами
     df_clean = df.dropna(subset=['дата_публикации'])
@@ -35,6 +15,7 @@ def load_and_prepare_data(file_path, dataset_type):
     return df_clean
 
 
+@instrumented('aggregate')
 def prepare_monthly_data(df):
     """Подготовка месячных данных"""
     if df is None or len(df) == 0:
@@ -55,6 +36,7 @@ def prepare_monthly_data(df):
     return monthly_data
 
 
+@instrumented('aggregate')
 def prepare_weekly_data(df):
     """Подготовка недельных данных"""
     if df is None or len(df) == 0:
@@ -70,6 +52,7 @@ def prepare_weekly_data(df):
     return weekly_data
 
 
+@instrumented('aggregate')
 def prepare_daily_data(df):
     """Подготовка дневных данных по дням недели"""
     if df is None or len(df) == 0:
@@ -91,6 +74,7 @@ def prepare_daily_data(df):
     return daily_data
 
 
+@instrumented('plot')
 def create_daily_analysis(daily_data, dataset_type, df, output_prefix=''):
     """Анализ данных по дням недели"""
 
@@ -104,11 +88,26 @@ def create_daily_analysis(daily_data, dataset_type, df, output_prefix=''):
     if daily_data is None or len(daily_data) == 0:
         return
 
-    plt.figure(figsize=(10, 6))
-
     # Сортируем по дню недели
     daily_data = daily_data.sort_values('день_недели')
 
+    # Добавляем пояснение
+    start_date = df['дата_публикации'].min().strftime('%d.%m.%Y')
+    end_date = df['дата_публикации'].max().strftime('%d.%m.%Y')
+    total_days = (df['дата_публикации'].max() - df['дата_публикации'].min()).days + 1
+    explanation = (f"Анализ основан на данных с {start_date} по {end_date} "
+                   f"({total_days} дней)\n"
+                   f"Значения показывают общее количество заявок по каждому дню недели за весь период")
+
+    submit_chart(f'results/Результаты 1 главы анализа/1.2.1. Распределение общего количества заявок по дням недели для {output_prefix}.png',
+                 draw_daily_analysis, daily_data, dataset_title, explanation)
+
+
+def draw_daily_analysis(daily_data, dataset_title, explanation):
+    """Столбчатая диаграмма заявок по дням недели"""
+
+    plt.figure(figsize=(10, 6))
+
     bars = plt.bar(daily_data['название_дня'], daily_data['количество_заявок'],
                    color=['lightblue' if i < 5 else 'orange' for i in range(7)],
                    alpha=0.7)
@@ -118,25 +117,18 @@ def create_daily_analysis(daily_data, dataset_type, df, output_prefix=''):
     plt.grid(True, alpha=0.3)
 
     # Добавляем значения на столбцы
-    for bar, value in zip(bars, daily_data['количество_заявок']):
-        plt.text(bar.get_x() + bar.get_width() / 2, value + max(daily_data['количество_заявок']) * 0.01,
-                 f'{value}', ha='center', va='bottom', fontweight='bold')
+    if chart_annotations():
+        for bar, value in zip(bars, daily_data['количество_заявок']):
+            plt.text(bar.get_x() + bar.get_width() / 2, value + max(daily_data['количество_заявок']) * 0.01,
+                     f'{value}', ha='center', va='bottom', fontweight='bold')
 
-    # Добавляем пояснение
-    start_date = df['дата_публикации'].min().strftime('%d.%m.%Y')
-    end_date = df['дата_публикации'].max().strftime('%d.%m.%Y')
-    total_days = (df['дата_публикации'].max() - df['дата_публикации'].min()).days + 1
-    explanation = (f"Анализ основан на данных с {start_date} по {end_date} "
-                   f"({total_days} дней)\n"
-                   f"Значения показывают общее количество заявок по каждому дню недели за весь период")
     plt.figtext(0.02, 0.02, explanation, fontsize=9, style='italic',
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout()
-    plt.savefig(f'results/Результаты 1 главы анализа/1.2.1. Распределение общего количества заявок по дням недели для {output_prefix}.png', dpi=300, bbox_inches='tight')
-    plt.close()
 
 
+@instrumented('plot')
 def create_weekly_analysis(weekly_data, dataset_type, df, output_prefix=''):
     """Анализ недельных данных"""
 
@@ -150,8 +142,6 @@ def create_weekly_analysis(weekly_data, dataset_type, df, output_prefix=''):
     if weekly_data is None or len(weekly_data) < 2:
         return
 
-    plt.figure(figsize=(12, 6))
-
     # Форматируем даты для отображения (начало недели - конец недели)
     # Учитываем разные годы в данных
     def format_week_range(start_date):
@@ -165,6 +155,23 @@ def create_weekly_analysis(weekly_data, dataset_type, df, output_prefix=''):
 
     weekly_data['метка'] = weekly_data.index.map(format_week_range)
 
+    # Добавляем пояснение
+    start_date = df['дата_публикации'].min().strftime('%d.%m.%Y')
+    end_date = df['дата_публикации'].max().strftime('%d.%m.%Y')
+    total_weeks = len(weekly_data)
+    explanation = (f"Анализ основан на данных с {start_date} по {end_date} "
+                   f"({total_weeks} недель)\n"
+                   f"Каждая точка показывает количество заявок за неделю")
+
+    submit_chart(f'results/Результаты 1 главы анализа/1.2.2. Распределение общего количества заявок по неделям для {output_prefix}.png',
+                 draw_weekly_analysis, weekly_data, dataset_title, explanation)
+
+
+def draw_weekly_analysis(weekly_data, dataset_title, explanation):
+    """Линейный график заявок по неделям"""
+
+    plt.figure(figsize=(12, 6))
+
     plt.plot(weekly_data['метка'], weekly_data['количество_заявок'],
              marker='o', linewidth=2, color='green', alpha=0.7)
     plt.title(f'Динамика заявок по неделям ({dataset_title})',
@@ -179,21 +186,13 @@ def create_weekly_analysis(weekly_data, dataset_type, df, output_prefix=''):
 
     plt.grid(True, alpha=0.3)
 
-    # Добавляем пояснение
-    start_date = df['дата_публикации'].min().strftime('%d.%m.%Y')
-    end_date = df['дата_публикации'].max().strftime('%d.%m.%Y')
-    total_weeks = len(weekly_data)
-    explanation = (f"Анализ основан на данных с {start_date} по {end_date} "
-                   f"({total_weeks} недель)\n"
-                   f"Каждая точка показывает количество заявок за неделю")
     plt.figtext(0.02, 0.02, explanation, fontsize=9, style='italic',
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout()
-    plt.savefig(f'results/Результаты 1 главы анализа/1.2.2. Распределение общего количества заявок по неделям для {output_prefix}.png', dpi=300, bbox_inches='tight')
-    plt.close()
 
 
+@instrumented('plot')
 def create_monthly_forecast(monthly_data, dataset_type, df, output_prefix=''):
     """Прогноз на 3 месяца вперед"""
 
@@ -207,9 +206,6 @@ def create_monthly_forecast(monthly_data, dataset_type, df, output_prefix=''):
     if monthly_data is None or len(monthly_data) < 1:
         return
 
-    # Создаем визуализацию
-    plt.figure(figsize=(12, 6))
-
     # Подготовка данных для прогноза
     last_date = monthly_data.index[-1]
     forecast_months = []
@@ -234,8 +230,27 @@ def create_monthly_forecast(monthly_data, dataset_type, df, output_prefix=''):
     all_labels = historical_labels + forecast_labels
     all_values = monthly_data['количество_заявок'].tolist() + forecast_values
 
+    # Добавляем пояснение
+    start_date = df['дата_публикации'].min().strftime('%d.%m.%Y')
+    end_date = df['дата_публикации'].max().strftime('%d.%m.%Y')
+    total_months = len(monthly_data)
+    explanation = (f"Анализ основан на данных с {start_date} по {end_date} "
+                   f"({total_months} месяцев)\n"
+                   f"Прогноз построен на основе среднемесячных значений с учетом случайных вариаций")
+
+    submit_chart(f'results/Результаты 1 главы анализа/1.2.3. Прогноз на основе общего количества заявок по месяцам для{output_prefix}.png',
+                 draw_monthly_forecast, all_labels, all_values, len(monthly_data), len(forecast_months),
+                 dataset_title, explanation)
+
+
+def draw_monthly_forecast(all_labels, all_values, n_historical, n_forecast, dataset_title, explanation):
+    """Столбчатая диаграмма: фактические месяцы и прогноз на 3 месяца"""
+
+    # Создаем визуализацию
+    plt.figure(figsize=(12, 6))
+
     # График с фактическими данными и прогнозом
-    colors = ['lightblue'] * len(monthly_data) + ['lightcoral'] * len(forecast_months)
+    colors = ['lightblue'] * n_historical + ['lightcoral'] * n_forecast
 
     bars = plt.bar(range(len(all_labels)), all_values, color=colors, alpha=0.7)
     plt.title(f'Прогноз количества заявок на 3 месяца ({dataset_title})',
@@ -245,28 +260,20 @@ def create_monthly_forecast(monthly_data, dataset_type, df, output_prefix=''):
     plt.grid(True, alpha=0.3)
 
     # Добавляем разделительную линию между фактом и прогнозом
-    plt.axvline(x=len(monthly_data) - 0.5, color='red', linestyle='--', alpha=0.7)
-    plt.text(len(monthly_data) - 0.5, max(all_values) * 0.9, 'Прогноз',
+    plt.axvline(x=n_historical - 0.5, color='red', linestyle='--', alpha=0.7)
+    plt.text(n_historical - 0.5, max(all_values) * 0.9, 'Прогноз',
              rotation=90, ha='right', va='top', color='red', fontweight='bold')
 
     # Добавляем значения на столбцы
-    for i, value in enumerate(all_values):
-        plt.text(i, value + max(all_values) * 0.01, f'{value:.0f}',
-                 ha='center', va='bottom', fontweight='bold')
+    if chart_annotations():
+        for i, value in enumerate(all_values):
+            plt.text(i, value + max(all_values) * 0.01, f'{value:.0f}',
+                     ha='center', va='bottom', fontweight='bold')
 
-    # Добавляем пояснение
-    start_date = df['дата_публикации'].min().strftime('%d.%m.%Y')
-    end_date = df['дата_публикации'].max().strftime('%d.%m.%Y')
-    total_months = len(monthly_data)
-    explanation = (f"Анализ основан на данных с {start_date} по {end_date} "
-                   f"({total_months} месяцев)\n"
-                   f"Прогноз построен на основе среднемесячных значений с учетом случайных вариаций")
     plt.figtext(0.02, 0.02, explanation, fontsize=9, style='italic',
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout()
-    plt.savefig(f'results/Результаты 1 главы анализа/1.2.3. Прогноз на основе общего количества заявок по месяцам для{output_prefix}.png', dpi=300, bbox_inches='tight')
-    plt.close()
 
 
 def analyze_dataset(file_path, dataset_type, output_prefix=''):
@@ -302,8 +309,10 @@ def step_1_2():
     # Создаем папку для результатов
     os.makedirs('results/Результаты 1 главы анализа', exist_ok=True)
 
-    # Анализ для lost датасета (поиск питомцев)
-    analyze_dataset('data/Dataset_final_Pet911_lost.csv', 'lost', output_prefix='lost')
+    # Графики обоих датасетов рисуются одной пачкой в пуле процессов
+    with chart_batch():
+        # Анализ для lost датасета (поиск питомцев)
+        analyze_dataset(LOST_FILE, 'lost', output_prefix='lost')
 
-    # Анализ для found датасета (поиск хозяев)
-    analyze_dataset('data/dataset_final_Pet911_found.csv', 'found', output_prefix='found')
+        # Анализ для found датасета (поиск хозяев)
+        analyze_dataset(FOUND_FILE, 'found', output_prefix='found')
@@ -1,33 +1,24 @@
 from .deps import *
+from .dataset import load_dataset, LOST_FILE, FOUND_FILE
+from .charts import submit_chart, chart_batch, chart_annotations
+from .metrics import instrumented
 
-def load_data(file_path):
+@instrumented('load')
+def load_data(file_path, dataset_type):
     """Загрузка данных"""
     try:
-        if not os.path.exists(file_path):
-            print(f"ОШИБКА: Файл {file_path} не найден!")
-            return None
+        return load_dataset(dataset_type, file_path)
 
-        encodings = ['utf-8', 'cp1251', 'latin1']
-        df = None
-
-        for encoding in encodings:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-
-        if df is None:
-            print("ОШИБКА: Не удалось загрузить файл")
-            return None
-
-        return df
+    except FileNotFoundError:
+        print(f"ОШИБКА: Файл {file_path} не найден!")
+        return None
 
     except Exception as e:
         print(f"ОШИБКА при загрузке данных: {e}")
         return None
 
 
+@instrumented('aggregate')
 def analyze_comments_correlation(df, dataset_type):
     """Анализ корреляции между комментариями и успешностью поиска"""
 
@@ -62,14 +53,23 @@ def analyze_comments_correlation(df, dataset_type):
     return df_analysis, correlation, p_value, success_stats, success_description, display_name
 
 
+@instrumented('plot')
 def create_mean_comments_chart(success_stats, display_name):
     """Создание диаграммы среднего количества комментариев"""
 
+    means = [success_stats.loc[0, 'mean'], success_stats.loc[1, 'mean']]
+    means = [0 if pd.isna(x) else x for x in means]
+
+    submit_chart(f'results/Результаты 2 главы анализа/2.1.1. Среднее количество комментариев для {display_name}.png',
+                 draw_mean_comments_chart, means, display_name)
+
+
+def draw_mean_comments_chart(means, display_name):
+    """Столбчатая диаграмма среднего количества комментариев"""
+
     plt.figure(figsize=(10, 7))
 
     categories = ['Не найдено', 'Найдено']
-    means = [success_stats.loc[0, 'mean'], success_stats.loc[1, 'mean']]
-    means = [0 if pd.isna(x) else x for x in means]
 
     bars = plt.bar(categories, means, color=['lightcoral', 'lightgreen'], alpha=0.7, width=0.6)
 
@@ -79,15 +79,15 @@ def create_mean_comments_chart(success_stats, display_name):
     plt.grid(True, alpha=0.3, axis='y')
 
     # Добавление значений на столбцы
-    for bar, value in zip(bars, means):
-        plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.05,
-                 f'{value:.1f}', ha='center', va='bottom', fontsize=12, fontweight='bold')
+    if chart_annotations():
+        for bar, value in zip(bars, means):
+            plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.05,
+                     f'{value:.1f}', ha='center', va='bottom', fontsize=12, fontweight='bold')
 
     plt.tight_layout()
-    plt.savefig(f'results/Результаты 2 главы анализа/2.1.1. Среднее количество комментариев для {display_name}.png', dpi=300, bbox_inches='tight')
-    plt.close()
 
 
+@instrumented('plot')
 def create_success_rate_by_comments_chart(df_analysis, display_name, success_description):
     """Создание диаграммы доли успешных по группам комментариев"""
 
@@ -99,6 +99,15 @@ def create_success_rate_by_comments_chart(df_analysis, display_name, success_des
     success_rate_by_group = df_analysis.groupby('группа_комментариев')['успех'].mean() * 100
     success_rate_by_group = success_rate_by_group.fillna(0)
 
+    submit_chart(f'results/Результаты 2 главы анализа/2.1.2. Зависимость успешности поиска от количества комментариев для {display_name}.png',
+                 draw_success_rate_by_comments_chart, success_rate_by_group, display_name, success_description)
+
+    return success_rate_by_group
+
+
+def draw_success_rate_by_comments_chart(success_rate_by_group, display_name, success_description):
+    """Столбчатая диаграмма доли успешных по группам комментариев"""
+
     plt.figure(figsize=(12, 7))
 
     bars = plt.bar(range(len(success_rate_by_group)), success_rate_by_group.values,
@@ -112,9 +121,10 @@ def create_success_rate_by_comments_chart(df_analysis, display_name, success_des
     plt.grid(True, alpha=0.3, axis='y')
 
     # Добавление значений на столбцы
-    for bar, value in zip(bars, success_rate_by_group.values):
-        plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.5,
-                 f'{value:.1f}%', ha='center', va='bottom', fontsize=11, fontweight='bold')
+    if chart_annotations():
+        for bar, value in zip(bars, success_rate_by_group.values):
+            plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.5,
+                     f'{value:.1f}%', ha='center', va='bottom', fontsize=11, fontweight='bold')
 
     # Добавляем поясняющую подпись (только на этой диаграмме с процентами)
     plt.figtext(0.02, 0.02, f"Проценты рассчитываются в рамках каждой группы комментариев\n{success_description}",
@@ -122,17 +132,13 @@ def create_success_rate_by_comments_chart(df_analysis, display_name, success_des
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout(rect=[0, 0.08, 1, 0.95])
-    plt.savefig(f'results/Результаты 2 главы анализа/2.1.2. Зависимость успешности поиска от количества комментариев для {display_name}.png', dpi=300, bbox_inches='tight')
-    plt.close()
-
-    return success_rate_by_group
 
 
 def analyze_single_dataset(file_path, dataset_type):
     """Анализ одного датасета"""
 
     # Загрузка данных
-    df = load_data(file_path)
+    df = load_data(file_path, dataset_type)
 
     if df is None:
         return
@@ -154,8 +160,10 @@ def step_2_1():
     # Создаем папку для результатов
     os.makedirs('results/Результаты 2 главы анализа', exist_ok=True)
 
-    # Анализ датасета найденных животных (поиск хозяина)
-    analyze_single_dataset('data/dataset_final_Pet911_found.csv', 'found')
+    # Графики обоих датасетов рисуются одной пачкой в пуле процессов
+    with chart_batch():
+        # Анализ датасета найденных животных (поиск хозяина)
+        analyze_single_dataset(FOUND_FILE, 'found')
 
-    # Анализ датасета потерянных животных (поиск питомца)
-    analyze_single_dataset('data/Dataset_final_Pet911_lost.csv', 'lost')
+        # Анализ датасета потерянных животных (поиск питомца)
+        analyze_single_dataset(LOST_FILE, 'lost')
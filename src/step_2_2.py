@@ -1,33 +1,24 @@
 from .deps import *
+from .dataset import load_dataset, LOST_FILE, FOUND_FILE
+from .charts import submit_chart, chart_batch, chart_annotations
+from .metrics import instrumented
 
-def load_data(file_path):
+@instrumented('load')
+def load_data(file_path, dataset_type):
     """Загрузка данных"""
     try:
-        if not os.path.exists(file_path):
-            print(f"ОШИБКА: Файл {file_path} не найден!")
-            return None
+        return load_dataset(dataset_type, file_path)
 
-        encodings = ['utf-8', 'cp1251', 'latin1']
-        df = None
-
-        for encoding in encodings:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-
-        if df is None:
-            print("ОШИБКА: Не удалось загрузить файл")
-            return None
-
-        return df
+    except FileNotFoundError:
+        print(f"ОШИБКА: Файл {file_path} не найден!")
+        return None
 
     except Exception as e:
         print(f"ОШИБКА при загрузке данных: {e}")
         return None
 
 
+@instrumented('aggregate')
 def analyze_publication_factors(df, dataset_type):
     """Анализ влияния фото и описания на успешность"""
 
@@ -61,28 +52,37 @@ def analyze_publication_factors(df, dataset_type):
     return df_analysis, photo_success, photo_corr, photos_count_corr, desc_length_corr, success_description, display_name
 
 
+@instrumented('plot')
 def create_photo_success_chart(photo_success, display_name, success_description):
     """Создание диаграммы успешности по наличию фото"""
 
-    plt.figure(figsize=(10, 7))
-
-    categories = ['Без фото', 'С фото']
-
     # Проверяем на NaN и заменяем на 0
     success_rates = [
         (photo_success.loc[0, 'mean'] * 100) if 0 in photo_success.index else 0,
         (photo_success.loc[1, 'mean'] * 100) if 1 in photo_success.index else 0
     ]
 
+    submit_chart(f'results/Результаты 2 главы анализа/2.2.1. Успешность поиска в зависимости от наличия фото для {display_name}.png',
+                 draw_photo_success_chart, success_rates, display_name, success_description)
+
+
+def draw_photo_success_chart(success_rates, display_name, success_description):
+    """Столбчатая диаграмма успешности по наличию фото"""
+
+    plt.figure(figsize=(10, 7))
+
+    categories = ['Без фото', 'С фото']
+
     bars = plt.bar(categories, success_rates, color=['lightcoral', 'lightgreen'], alpha=0.7, width=0.6)
     plt.title(f'Успешность поиска по наличию фото ({display_name})', fontsize=14, fontweight='bold')
     plt.ylabel('Доля успешных поисков (%)')
     plt.grid(True, alpha=0.3, axis='y')
 
     # Добавление значений на столбцы
-    for bar, rate in zip(bars, success_rates):
-        plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.5,
-                 f'{rate:.1f}%', ha='center', va='bottom', fontsize=12, fontweight='bold')
+    if chart_annotations():
+        for bar, rate in zip(bars, success_rates):
+            plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.5,
+                     f'{rate:.1f}%', ha='center', va='bottom', fontsize=12, fontweight='bold')
 
     # Добавляем поясняющую подпись
     plt.figtext(0.02, 0.02, success_description,
@@ -90,10 +90,9 @@ def create_photo_success_chart(photo_success, display_name, success_description)
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout(rect=[0, 0.05, 1, 0.95])
-    plt.savefig(f'results/Результаты 2 главы анализа/2.2.1. Успешность поиска в зависимости от наличия фото для {display_name}.png', dpi=300, bbox_inches='tight')
-    plt.close()
 
 
+@instrumented('plot')
 def create_photos_count_chart(df_analysis, display_name, success_description):
     """Создание диаграммы успешности по количеству фото"""
 
@@ -107,6 +106,15 @@ def create_photos_count_chart(df_analysis, display_name, success_description):
     # Заменяем NaN на 0
     photos_success = photos_success.fillna(0)
 
+    submit_chart(f'results/Результаты 2 главы анализа/2.2.2. Успешность поиска в зависимости от количества фото для {display_name}.png',
+                 draw_photos_count_chart, photos_success, display_name, success_description)
+
+    return photos_success
+
+
+def draw_photos_count_chart(photos_success, display_name, success_description):
+    """Столбчатая диаграмма успешности по количеству фото"""
+
     plt.figure(figsize=(12, 7))
 
     bars = plt.bar(range(len(photos_success)), photos_success.values,
@@ -118,9 +126,10 @@ def create_photos_count_chart(df_analysis, display_name, success_description):
     plt.grid(True, alpha=0.3, axis='y')
 
     # Добавление значений на столбцы
-    for bar, value in zip(bars, photos_success.values):
-        plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.5,
-                 f'{value:.1f}%', ha='center', va='bottom', fontsize=11, fontweight='bold')
+    if chart_annotations():
+        for bar, value in zip(bars, photos_success.values):
+            plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.5,
+                     f'{value:.1f}%', ha='center', va='bottom', fontsize=11, fontweight='bold')
 
     # Добавляем поясняющую подпись
     plt.figtext(0.02, 0.02, success_description,
@@ -128,12 +137,9 @@ def create_photos_count_chart(df_analysis, display_name, success_description):
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout(rect=[0, 0.05, 1, 0.95])
-    plt.savefig(f'results/Результаты 2 главы анализа/2.2.2. Успешность поиска в зависимости от количества фото для {display_name}.png', dpi=300, bbox_inches='tight')
-    plt.close()
-
-    return photos_success
 
 
+@instrumented('plot')
 def create_description_length_chart(df_analysis, display_name, success_description):
     """Создание диаграммы успешности по длине описания"""
 
@@ -158,6 +164,15 @@ def create_description_length_chart(df_analysis, display_name, success_descripti
     # Заменяем NaN на 0
     desc_success = desc_success.fillna(0)
 
+    submit_chart(f'results/Результаты 2 главы анализа/2.2.3. Успешность поиска в зависимости от длины описания для {display_name}.png',
+                 draw_description_length_chart, desc_success, display_name, success_description)
+
+    return desc_success
+
+
+def draw_description_length_chart(desc_success, display_name, success_description):
+    """Столбчатая диаграмма успешности по длине описания"""
+
     plt.figure(figsize=(12, 7))
 
     bars = plt.bar(range(len(desc_success)), desc_success.values,
@@ -169,9 +184,10 @@ def create_description_length_chart(df_analysis, display_name, success_descripti
     plt.grid(True, alpha=0.3, axis='y')
 
     # Добавление значений на столбцы
-    for bar, value in zip(bars, desc_success.values):
-        plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.5,
-                 f'{value:.1f}%', ha='center', va='bottom', fontsize=11, fontweight='bold')
+    if chart_annotations():
+        for bar, value in zip(bars, desc_success.values):
+            plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.5,
+                     f'{value:.1f}%', ha='center', va='bottom', fontsize=11, fontweight='bold')
 
     # Добавляем поясняющую подпись
     plt.figtext(0.02, 0.02, success_description,
@@ -179,12 +195,9 @@ def create_description_length_chart(df_analysis, display_name, success_descripti
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout(rect=[0, 0.05, 1, 0.95])
-    plt.savefig(f'results/Результаты 2 главы анализа/2.2.3. Успешность поиска в зависимости от длины описания для {display_name}.png', dpi=300, bbox_inches='tight')
-    plt.close()
-
-    return desc_success
 
 
+@instrumented('plot')
 def create_combined_factors_chart(df_analysis, display_name, success_description):
     """Создание диаграммы успешности по комбинации факторов (фото + описание)"""
 
@@ -218,6 +231,15 @@ def create_combined_factors_chart(df_analysis, display_name, success_description
     # Заменяем NaN на 0
     combined_success['mean'] = combined_success['mean'].fillna(0) * 100
 
+    submit_chart(f'results/Результаты 2 главы анализа/2.2.4. Успешность поиска в зависимости от комбинированных факторов для {display_name}.png',
+                 draw_combined_factors_chart, combined_success, display_name, success_description)
+
+    return combined_success
+
+
+def draw_combined_factors_chart(combined_success, display_name, success_description):
+    """Столбчатая диаграмма успешности по комбинации факторов"""
+
     plt.figure(figsize=(14, 8))
 
     colors = ['lightcoral', 'lightcoral', 'orange', 'orange', 'lightgreen', 'lightgreen']
@@ -232,9 +254,10 @@ def create_combined_factors_chart(df_analysis, display_name, success_description
     plt.grid(True, alpha=0.3, axis='y')
 
     # Добавление значений и количества наблюдений
-    for i, (bar, (group, row)) in enumerate(zip(bars, combined_success.iterrows())):
-        plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.5,
-                 f'{row["mean"]:.1f}%', ha='center', va='bottom', fontsize=10, fontweight='bold')
+    if chart_annotations():
+        for i, (bar, (group, row)) in enumerate(zip(bars, combined_success.iterrows())):
+            plt.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + 0.5,
+                     f'{row["mean"]:.1f}%', ha='center', va='bottom', fontsize=10, fontweight='bold')
 
     # Добавляем поясняющую подпись (только про 100%, без упоминания цветов)
     plt.figtext(0.02, 0.02, success_description,
@@ -242,17 +265,13 @@ def create_combined_factors_chart(df_analysis, display_name, success_description
                 bbox={'facecolor': 'lightgray', 'alpha': 0.7, 'pad': 5})
 
     plt.tight_layout(rect=[0, 0.05, 1, 0.95])
-    plt.savefig(f'results/Результаты 2 главы анализа/2.2.4. Успешность поиска в зависимости от комбинированных факторов для {display_name}.png', dpi=300, bbox_inches='tight')
-    plt.close()
-
-    return combined_success
 
 
 def analyze_single_dataset_publication(file_path, dataset_type):
     """Анализ одного датасета для публикационных факторов"""
 
     # Загрузка данных
-    df = load_data(file_path)
+    df = load_data(file_path, dataset_type)
 
     if df is None:
         return
@@ -277,9 +296,11 @@ def step_2_2():
     # Создаем папку для результатов
     os.makedirs('results/Результаты 2 главы анализа', exist_ok=True)
 
-    # Анализ датасета найденных животных (поиск хозяина)
-    analyze_single_dataset_publication('data/dataset_final_Pet911_found.csv', 'found')
+    # Графики обоих датасетов рисуются одной пачкой в пуле процессов
+    with chart_batch():
+        # Анализ датасета найденных животных (поиск хозяина)
+        analyze_single_dataset_publication(FOUND_FILE, 'found')
 
-    # Анализ датасета потерянных животных (поиск питомца)
-    analyze_single_dataset_publication('data/Dataset_final_Pet911_lost.csv', 'lost')
+        # Анализ датасета потерянных животных (поиск питомца)
+        analyze_single_dataset_publication(LOST_FILE, 'lost')
 
@@ -1,5 +1,17 @@
 # -*- coding: utf-8 -*-
 from .deps import *
+from .dataset import load_dataset, map_categories, LOST_FILE, FOUND_FILE
+from .charts import submit_chart, chart_batch, chart_annotations
+from .metrics import instrumented
+
+# Имена колонок, под которыми анализатор работает с общей схемой
+COLUMN_RENAMES = {
+    'тип объявления': 'тип_объявления',
+    'место события': 'место_события',
+    'Длина_описания_в_словах': 'длина_описания',
+    'дата пропажи': 'дата_события',
+    'дата находки': 'дата_события'
+}
 
 class PetSearchAnalyzer:
     def __init__(self, file_path, file_type, results_dir):
@@ -16,42 +28,19 @@ class PetSearchAnalyzer:
         else:
             print("❌ Не удалось загрузить данные")
     
+    @instrumented('load')
     def load_proper_csv(self, file_path):
-        """Загружает CSV файл с правильным парсингом кавычек, пропускает первую строку"""
+        """Загружает датасет через общий слой загрузки и переименовывает колонки под анализатор"""
         try:
-            encodings = ['utf-8', 'cp1251', 'latin1']
-            
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        reader = csv.reader(f)
-                        rows = list(reader)
-                    
-                    if rows:
-                        print(f"✅ Успешно загружено с кодировкой {encoding}")
-                        break
-                except UnicodeDecodeError:
-                    continue
-            else:
-                print("❌ Не удалось загрузить файл с доступными кодировками")
-                return pd.DataFrame()
+            df = load_dataset(self.file_type, file_path)
             
-            if len(rows) > 1:
-                data_rows = rows[1:]
-                print(f"📊 Строк данных: {len(data_rows)}")
-            else:
+            if df.empty:
                 print("❌ В файле нет данных кроме заголовка")
                 return pd.DataFrame()
             
-            column_names = [
-                'url', 'id', 'тип_объявления', 'регион', 'статус', 'тип_животного', 
-                'окрас', 'порода', 'место_события', 'дата_публикации', 'пол', 
-                'возраст', 'описание', 'длина_описания', 'наличие_описания', 
-                'есть_фото', 'количество_фото', 'количество_комментариев', 
-                'дата_события', 'есть_контакты'
-            ]
+            print(f"📊 Строк данных: {len(df)}")
             
-            df = pd.DataFrame(data_rows, columns=column_names[:len(data_rows[0])])
+            df = df.rename(columns=COLUMN_RENAMES)
             print(f"✅ Создано {len(df)} строк с {len(df.columns)} колонками")
             
             return df
@@ -60,23 +49,24 @@ class PetSearchAnalyzer:
             print(f"❌ Ошибка загрузки файла: {e}")
             return pd.DataFrame()
         
+    @instrumented('preprocess')
     def preprocess_data(self):
         """Предобработка данных"""
         print("🔧 Предобработка данных...")
         
+        # Типы уже приведены при загрузке (src/dataset.py): построчное приведение всех колонок к строкам не нужно
         df = self.df.copy()
         
-        # Очищаем данные от лишних кавычек и пробелов
-        for col in df.columns:
-            df[col] = df[col].astype(str).str.strip().str.strip('"').str.strip("'")
-        
-        # Приводим текстовые колонки к нижнему регистру
+        # Приводим текстовые колонки к нижнему регистру (у категориальных - только словарь категорий)
         text_columns = ['тип_объявления', 'регион', 'статус', 'тип_животного', 
                        'пол', 'окрас', 'порода', 'место_события']
         
         for col in text_columns:
             if col in df.columns:
-                df[col] = df[col].str.lower()
+                if isinstance(df[col].dtype, pd.CategoricalDtype):
+                    df[col] = map_categories(df[col], str.lower)
+                else:
+                    df[col] = df[col].str.lower()
         
         # Создаем целевую переменную is_success
         if 'статус' in df.columns:
@@ -87,13 +77,12 @@ class PetSearchAnalyzer:
             
             df['is_success'] = df['is_success'].astype(int)
         
-        # Обработка бинарных признаков
-        binary_mapping = {'true': 1, 'false': 0, 'да': 1, 'нет': 0, '1': 1, '0': 0}
+        # Бинарные признаки - bool по схеме, для статистики нужны 0/1
         binary_columns = ['наличие_описания', 'есть_фото', 'есть_контакты']
         
         for col in binary_columns:
             if col in df.columns:
-                df[col] = df[col].str.lower().map(binary_mapping).fillna(0).astype(int)
+                df[col] = df[col].astype(int)
         
         # Заполнение пропусков в числовых колонках
         numeric_columns = ['количество_фото', 'длина_описания', 'количество_комментариев']
@@ -110,60 +99,34 @@ class PetSearchAnalyzer:
         self.stats_results['total_ads'] = len(df)
         self.stats_results['successful_ads'] = df['is_success'].sum()
     
+    @instrumented('plot')
     def plot_success_by_animal_type(self):
         """График 3 и 7: Доля успеха по типам животных"""
         if 'тип_животного' not in self.df_processed.columns:
             return
         
         df = self.df_processed
-        animal_success = df.groupby('тип_животного')['is_success'].agg(['count', 'mean']).round(3)
+        animal_success = df.groupby('тип_животного', observed=True)['is_success'].agg(['count', 'mean']).round(3)
         animal_success = animal_success[animal_success['count'] >= 3]
         animal_success = animal_success.sort_values('mean', ascending=False)
         
-        fig, ax = plt.subplots(figsize=(10, 7))
-        
-        bars = ax.bar(animal_success.index, animal_success['mean'] * 100, 
-                      color='lightgreen', alpha=0.7)
-        
         title = f'Доля успеха "потерян" по типам животных' if self.file_type == 'lost' else f'Доля успеха "найден" по типам животных'
         
-        # Автоматическое позиционирование заголовка
-        max_value = max(animal_success['mean'] * 100)
-        title_y = 1.05 if max_value > 70 else 1.02
-        ax.set_title(title, fontsize=14, fontweight='bold', y=title_y)
-        
-        ax.set_ylabel('Доля успеха, %', fontsize=12)
-        ax.set_xlabel('Тип животного', fontsize=12)
-        plt.xticks(rotation=45, ha='right')
-        ax.grid(axis='y', alpha=0.3)
-        
-        # Увеличиваем верхний лимит оси Y чтобы было место для текста
-        ax.set_ylim(0, max(animal_success['mean'] * 100) * 1.15)
-        
-        for bar in bars:
-            height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height + 1,
-                    f'{height:.1f}%', ha='center', va='bottom', fontweight='bold',
-                    fontsize=9)
-        
-        plt.tight_layout()
-        plt.subplots_adjust(top=0.9)
-        
         filename = f"3.1.3 Доля успешных поисков по типу животного для '{self.file_type}'.png"
         # ИЗМЕНИТЬ путь сохранения
-        plt.savefig(os.path.join(self.results_dir, filename), dpi=300, bbox_inches='tight')
-        plt.close()
+        submit_chart(os.path.join(self.results_dir, filename), draw_success_by_animal_type, animal_success, title)
         
         return animal_success
     
     
+    @instrumented('aggregate')
     def calculate_animal_statistics(self):
         """Рассчитывает статистику по типам животных"""
         if 'тип_животного' not in self.df_processed.columns:
             return
         
         df = self.df_processed
-        animal_stats = df.groupby('тип_животного').agg({
+        animal_stats = df.groupby('тип_животного', observed=True).agg({
             'is_success': ['count', 'sum', 'mean']
         }).round(4)
         animal_stats.columns = ['count', 'success_count', 'success_rate']
@@ -172,6 +135,7 @@ class PetSearchAnalyzer:
         
         return animal_stats
     
+    @instrumented('aggregate')
     def calculate_photo_statistics(self):
         """Рассчитывает статистику по фото"""
         photo_stats = {}
@@ -195,6 +159,7 @@ class PetSearchAnalyzer:
         self.stats_results['photo_statistics'] = photo_stats
         return photo_stats
     
+    @instrumented('aggregate')
     def calculate_description_statistics(self):
         """Рассчитывает статистику по описанию"""
         desc_stats = {}
@@ -218,6 +183,7 @@ class PetSearchAnalyzer:
         self.stats_results['description_statistics'] = desc_stats
         return desc_stats
     
+    @instrumented('aggregate')
     def calculate_contacts_statistics(self):
         """Рассчитывает статистику по контактам"""
         if 'есть_контакты' not in self.df_processed.columns:
@@ -231,6 +197,7 @@ class PetSearchAnalyzer:
         
         return contacts_stats
     
+    @instrumented('save')
     def save_statistics(self, output_dir=None):
         """Сохраняет статистику в файлы"""
         if output_dir is None:
@@ -255,8 +222,12 @@ class PetSearchAnalyzer:
         
         serializable_stats = convert_to_serializable(self.stats_results)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
+        # Пишем во временный файл и атомарно подменяем: сервис прогноза (src/server.py) следит за этим файлом
+        # и не должен прочитать его наполовину записанным
+        tmp_path = f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(serializable_stats, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, filepath)
         
         print(f"💾 Статистика сохранена в: {filepath}")
         
@@ -343,15 +314,62 @@ class PetSearchAnalyzer:
         
         return self.stats_results
 
+def draw_success_by_animal_type(animal_success, title):
+    """Столбчатая диаграмма доли успеха по типам животных"""
+    
+    fig, ax = plt.subplots(figsize=(10, 7))
+    
+    bars = ax.bar(animal_success.index, animal_success['mean'] * 100, 
+                  color='lightgreen', alpha=0.7)
+    
+    # Автоматическое позиционирование заголовка
+    max_value = max(animal_success['mean'] * 100)
+    title_y = 1.05 if max_value > 70 else 1.02
+    ax.set_title(title, fontsize=14, fontweight='bold', y=title_y)
+    
+    ax.set_ylabel('Доля успеха, %', fontsize=12)
+    ax.set_xlabel('Тип животного', fontsize=12)
+    plt.xticks(rotation=45, ha='right')
+    ax.grid(axis='y', alpha=0.3)
+    
+    # Увеличиваем верхний лимит оси Y чтобы было место для текста
+    ax.set_ylim(0, max(animal_success['mean'] * 100) * 1.15)
+    
+    if chart_annotations():
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height + 1,
+                    f'{height:.1f}%', ha='center', va='bottom', fontweight='bold',
+                    fontsize=9)
+    
+    plt.tight_layout()
+    plt.subplots_adjust(top=0.9)
+
+@instrumented('plot')
 def plot_comparison_charts(lost_analyzer, found_analyzer):
     """Графики 1 и 2: Сравнительные графики для обоих файлов"""
     
+    counts = [len(lost_analyzer.df_processed), len(found_analyzer.df_processed)]
+    lost_success = lost_analyzer.df_processed['is_success'].mean() * 100
+    found_success = found_analyzer.df_processed['is_success'].mean() * 100
+    
+    # Сохраняем вместо показа - ИЗМЕНИТЬ путь
+    results_dir = lost_analyzer.results_dir  # Используем папку результатов из анализатора
+    submit_chart(os.path.join(results_dir, "3.1.1.+3.1.2. Распределение и успешность поиска по типам объявлений.png"),
+                 draw_comparison_charts, counts, lost_success, found_success)
+    
+    print(f"\n📊 СВОДНАЯ СТАТИСТИКА:")
+    print(f"   Потерянные животные: {lost_success:.1f}% успеха")
+    print(f"   Найденные животные: {found_success:.1f}% успеха")
+
+def draw_comparison_charts(counts, lost_success, found_success):
+    """Круговая диаграмма типов объявлений и доля успеха по типам"""
+    
     fig = plt.figure(figsize=(12, 5))
     
     # График 1: Диаграмма распределения типов объявлений
     plt.subplot(1, 2, 1)
     types = ['Потерян', 'Найден']
-    counts = [len(lost_analyzer.df_processed), len(found_analyzer.df_processed)]
     colors = ['lightblue', 'lightcoral']
     
     plt.pie(counts, labels=types, autopct='%1.1f%%', colors=colors)
@@ -359,8 +377,6 @@ def plot_comparison_charts(lost_analyzer, found_analyzer):
     
     # График 2: Доля успеха по типам объявлений
     plt.subplot(1, 2, 2)
-    lost_success = lost_analyzer.df_processed['is_success'].mean() * 100
-    found_success = found_analyzer.df_processed['is_success'].mean() * 100
     
     bars = plt.bar(['Потерян', 'Найден'], [lost_success, found_success], 
                   color=['lightblue', 'lightcoral'])
@@ -371,23 +387,14 @@ def plot_comparison_charts(lost_analyzer, found_analyzer):
     max_value = max(lost_success, found_success)
     plt.ylim(0, max_value * 1.15)
     
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height + 1,
-                f'{height:.1f}%', ha='center', va='bottom', fontweight='bold')
+    if chart_annotations():
+        for bar in bars:
+            height = bar.get_height()
+            plt.text(bar.get_x() + bar.get_width()/2., height + 1,
+                    f'{height:.1f}%', ha='center', va='bottom', fontweight='bold')
     
     plt.tight_layout()
     plt.subplots_adjust(top=0.85)
-    
-    # Сохраняем вместо показа - ИЗМЕНИТЬ путь
-    results_dir = lost_analyzer.results_dir  # Используем папку результатов из анализатора
-    plt.savefig(os.path.join(results_dir, "3.1.1.+3.1.2. Распределение и успешность поиска по типам объявлений.png"), 
-                dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    print(f"\n📊 СВОДНАЯ СТАТИСТИКА:")
-    print(f"   Потерянные животные: {lost_success:.1f}% успеха")
-    print(f"   Найденные животные: {found_success:.1f}% успеха")
 
 def step_3_1():
     """Основная функция программы анализа"""
@@ -407,40 +414,42 @@ def step_3_1():
     print(f"📁 Создана папка для результатов: {results_dir}")
     
     # Файлы для анализа
-    lost_file = 'data/Dataset_final_Pet911_lost.csv'
-    found_file = 'data/dataset_final_Pet911_found.csv'
+    lost_file = LOST_FILE
+    found_file = FOUND_FILE
     
     all_statistics = {}
     analyzers = {}
     
-    # Анализ потерянных животных
-    if os.path.exists(lost_file):
-        print(f"\n{'🔍'*20} АНАЛИЗ ПОТЕРЯННЫХ ЖИВОТНЫХ {'🔍'*20}")
-        # ПЕРЕДАЕМ ПАПКУ РЕЗУЛЬТАТОВ В КОНСТРУКТОР
-        lost_analyzer = PetSearchAnalyzer(lost_file, 'lost', results_dir)
-        if not lost_analyzer.df.empty:
-            stats_lost = lost_analyzer.comprehensive_analysis()
-            all_statistics['lost'] = stats_lost
-            analyzers['lost'] = lost_analyzer
-    else:
-        print(f"❌ Файл {lost_file} не найден")
-    
-    # Анализ найденных животных
-    if os.path.exists(found_file):
-        print(f"\n{'🔍'*20} АНАЛИЗ НАЙДЕННЫХ ЖИВОТНЫХ {'🔍'*20}")
-        # ПЕРЕДАЕМ ПАПКУ РЕЗУЛЬТАТОВ В КОНСТРУКТОР
-        found_analyzer = PetSearchAnalyzer(found_file, 'found', results_dir)
-        if not found_analyzer.df.empty:
-            stats_found = found_analyzer.comprehensive_analysis()
-            all_statistics['found'] = stats_found
-            analyzers['found'] = found_analyzer
-    else:
-        print(f"❌ Файл {found_file} не найден")
-    
-    # Сравнительные графики
-    if 'lost' in analyzers and 'found' in analyzers:
-        print(f"\n{'📊'*20} СРАВНИТЕЛЬНЫЕ ГРАФИКИ {'📊'*20}")
-        plot_comparison_charts(analyzers['lost'], analyzers['found'])
+    # Графики обоих анализаторов и сравнительные графики рисуются одной пачкой в пуле процессов
+    with chart_batch():
+        # Анализ потерянных животных
+        if os.path.exists(lost_file):
+            print(f"\n{'🔍'*20} АНАЛИЗ ПОТЕРЯННЫХ ЖИВОТНЫХ {'🔍'*20}")
+            # ПЕРЕДАЕМ ПАПКУ РЕЗУЛЬТАТОВ В КОНСТРУКТОР
+            lost_analyzer = PetSearchAnalyzer(lost_file, 'lost', results_dir)
+            if not lost_analyzer.df.empty:
+                stats_lost = lost_analyzer.comprehensive_analysis()
+                all_statistics['lost'] = stats_lost
+                analyzers['lost'] = lost_analyzer
+        else:
+            print(f"❌ Файл {lost_file} не найден")
+    
+        # Анализ найденных животных
+        if os.path.exists(found_file):
+            print(f"\n{'🔍'*20} АНАЛИЗ НАЙДЕННЫХ ЖИВОТНЫХ {'🔍'*20}")
+            # ПЕРЕДАЕМ ПАПКУ РЕЗУЛЬТАТОВ В КОНСТРУКТОР
+            found_analyzer = PetSearchAnalyzer(found_file, 'found', results_dir)
+            if not found_analyzer.df.empty:
+                stats_found = found_analyzer.comprehensive_analysis()
+                all_statistics['found'] = stats_found
+                analyzers['found'] = found_analyzer
+        else:
+            print(f"❌ Файл {found_file} не найден")
+    
+        # Сравнительные графики
+        if 'lost' in analyzers and 'found' in analyzers:
+            print(f"\n{'📊'*20} СРАВНИТЕЛЬНЫЕ ГРАФИКИ {'📊'*20}")
+            plot_comparison_charts(analyzers['lost'], analyzers['found'])
     
     print(f"\n✅ Анализ завершен! Все результаты сохранены в папке '{results_dir}/'")
     print("💡 Теперь можно запустить программу прогнозирования!")
@@ -1,22 +1,182 @@
 # -*- coding: utf-8 -*-
 from .deps import *
+import argparse
+import sys
+from contextlib import redirect_stdout
+from .dataset import load_dataset, fill_category
+from .metrics import phase
+from .charts import output_params
+
+STATS_DIR = 'results/Результаты 3 главы анализа/3.1 Stats for 3.2 Prediction'
+BATCH_OUTPUT_FILE = 'results/Результаты 3 главы анализа/3.2. Прогноз для объявлений из датасета.csv'
+
+# Файлы статистики, которые сохраняет step_3_1.PetSearchAnalyzer.save_statistics
+STATS_FILES = {
+    'lost': 'pet911_lost_statistics.json',
+    'found': 'pet911_found_statistics.json'
+}
+AD_TYPES = tuple(STATS_FILES)
+
+# Поля объявления и значения по умолчанию (как в explain_probability)
+AD_FIELD_DEFAULTS = {
+    'animal_type': 'другое',
+    'has_photos': 'нет',
+    'photo_count': 0,
+    'has_description': 'нет',
+    'desc_length': 0,
+    'has_contacts': 'нет'
+}
+
+# Соответствие колонок датасета полям объявления
+DATASET_FIELD_MAP = {
+    'тип_животного': 'animal_type',
+    'есть_фото': 'has_photos',
+    'количество_фото': 'photo_count',
+    'наличие_описания': 'has_description',
+    'Длина_описания_в_словах': 'desc_length',
+    'есть_контакты': 'has_contacts'
+}
+
+FLAG_FIELDS = ['has_photos', 'has_description', 'has_contacts']
+# Прежний calculate_probability считал 'нет' только само 'нет' (любое другое значение - 'да').
+# Для JSON сервиса и CSV добавлены синонимы: false/0/no/n/н, пустое значение и пропуск тоже означают 'нет'
+FLAG_VALUES = {
+    'true': 'да', '1': 'да', 'yes': 'да', 'y': 'да', 'да': 'да', 'д': 'да',
+    'false': 'нет', '0': 'нет', 'no': 'нет', 'n': 'нет', 'нет': 'нет', 'н': 'нет', '': 'нет', 'nan': 'нет'
+}
+
+# Порядок факторов в скомпилированных таблицах
+FACTOR_COLUMNS = ['animal_impact', 'photo_impact', 'description_impact', 'contacts_impact']
+
+def normalize_flag(value):
+    """
+    Приводит бинарный признак к 'да'/'нет' по FLAG_VALUES (True, 'yes', '1', ... / False, 'no', '0', '', NaN);
+    прочие значения - как есть (flag_code считает их 'да', как и прежний calculate_probability)
+    """
+    text = str(value).strip().lower()
+    return FLAG_VALUES.get(text, text)
+
+def flag_code(value):
+    """Код бинарного признака: 0 для 'нет' (и его синонимов), 1 для остальных значений"""
+    # Уже нормализованные значения (normalize_ad) - без разбора строки
+    if value == 'да':
+        return 1
+    if value == 'нет':
+        return 0
+    return 0 if normalize_flag(value) == 'нет' else 1
+
+def normalize_ad(ad_data):
+    """Приводит одно объявление (например, JSON из формы) к полям explain_probability"""
+    ad = dict(AD_FIELD_DEFAULTS)
+    ad.update({field: value for field, value in ad_data.items() if value is not None})
+    ad['animal_type'] = str(ad['animal_type']).strip().lower()
+    for field in FLAG_FIELDS:
+        ad[field] = normalize_flag(ad[field])
+    return ad
+
+def map_unique(values, func):
+    """Применяет func только к уникальным значениям колонки (их единицы) и раскладывает результат обратно"""
+    codes, uniques = pd.factorize(values)
+    mapped = np.array([func(value) for value in uniques], dtype=object)
+    return mapped[codes]
+
+class CompiledStatistics:
+    """
+    Статистика одного типа объявлений, скомпилированная в плотные массивы.
+    Прогноз сводится к индексированию по кодам категорий и сумме - без обхода JSON-словарей.
+    
+    Факторы те же, что в прежнем calculate_probability: тип животного, фото, описание, контакты.
+    Группа длины описания (description_length_impact из step_3_1) в прогноз не входит: прежняя формула её
+    не использовала, а группа '0' повторяет has_description_impact['0'] - описание учитывалось бы дважды
+    и все прогнозы разошлись бы с прежними. Длина описания используется только в тексте объяснения.
+    """
+    def __init__(self, stats, fallback_rate=0.15):
+        stats = stats or {}
+        self.base_rate = stats.get('base_success_rate', fallback_rate)
+        base_rate = self.base_rate
+        
+        # Тип животного: код 0 - нет статистики (вклад 0), далее по словарю
+        animal_rates = stats.get('animal_success_rates', {})
+        self.animal_codes = {name: code for code, name in enumerate(animal_rates, start=1)}
+        self.animal_impact = np.array([0.0] + [rate - base_rate for rate in animal_rates.values()])
+        
+        # Бинарные факторы: [вклад при 'нет', вклад при 'да']; фактор без статистики не попадает в объяснение
+        photo_stats = stats.get('photo_statistics', {}).get('has_photo_impact')
+        desc_stats = stats.get('description_statistics', {}).get('has_description_impact')
+        contacts_stats = stats.get('contacts_impact')
+        self.photo_impact = self._binary_table(photo_stats, base_rate)
+        self.description_impact = self._binary_table(desc_stats, base_rate)
+        self.contacts_impact = self._binary_table(contacts_stats, base_rate)
+        
+        # Строки объяснения собираются один раз: при прогнозе остаётся выбрать их по кодам
+        self.animal_texts = {name: f"Тип животного ({name}): {rate - base_rate:+.1%}" for name, rate in animal_rates.items()}
+        self.factor_texts = [
+            [f"{label}: {impact:+.1%}" for label, impact in zip(labels, table)] if stats_present else None
+            for labels, table, stats_present in (
+                (("Отсутствие фото", "Наличие фото"), self.photo_impact, photo_stats is not None),
+                (("Отсутствие описания", "Наличие описания ({} слов)"), self.description_impact, desc_stats is not None),
+                (("Отсутствие контактов", "Наличие контактов"), self.contacts_impact, contacts_stats is not None)
+            )
+        ]
+        
+        self.scalar_tables = [table.tolist() for table in
+                              (self.animal_impact, self.photo_impact, self.description_impact, self.contacts_impact)]
+    
+    @staticmethod
+    def _binary_table(impact_stats, base_rate):
+        if impact_stats is None:
+            return np.zeros(2)
+        return np.array([impact_stats.get('0', 0) - base_rate, impact_stats.get('1', base_rate) - base_rate])
+    
+    def encode_animals(self, animal_types):
+        """Векторное кодирование типов животных (нижний регистр) в индексы таблицы"""
+        return pd.Series(animal_types).map(self.animal_codes).fillna(0).astype(np.intp).to_numpy()
+    
+    def impacts(self, animal_code, photo_code, desc_code, contacts_code):
+        """Вклады факторов (скаляры или массивы кодов) в порядке FACTOR_COLUMNS"""
+        return (self.animal_impact[animal_code], self.photo_impact[photo_code],
+                self.description_impact[desc_code], self.contacts_impact[contacts_code])
+    
+    def probability(self, animal_code, photo_code, desc_code, contacts_code):
+        """Вероятность для массивов кодов"""
+        total = self.base_rate + sum(self.impacts(animal_code, photo_code, desc_code, contacts_code))
+        # Ограничиваем вероятность
+        return np.clip(total, 0.01, 0.95)
+    
+    def probability_one(self, animal_code, photo_code, desc_code, contacts_code):
+        """Вероятность для одного объявления (списки вместо массивов - без накладных расходов numpy на скалярах)"""
+        total = (self.base_rate + self.scalar_tables[0][animal_code] + self.scalar_tables[1][photo_code]
+                 + self.scalar_tables[2][desc_code] + self.scalar_tables[3][contacts_code])
+        return max(0.01, min(0.95, total))
+    
+    def explain(self, animal_type, photo_code, desc_code, contacts_code, desc_length=0):
+        """Вклады факторов одного объявления текстом: 'Наличие фото: +5.0%', ... (порядок - как в FACTOR_COLUMNS)"""
+        factors = [self.animal_texts.get(animal_type) or f"Тип животного ({animal_type}): статистика недоступна"]
+        photo_texts, desc_texts, contacts_texts = self.factor_texts
+        if photo_texts:
+            factors.append(photo_texts[photo_code])
+        if desc_texts:
+            factors.append(desc_texts[desc_code].format(desc_length))
+        if contacts_texts:
+            factors.append(contacts_texts[contacts_code])
+        return factors
 
 class PetSearchPredictor:
-    def __init__(self):
+    def __init__(self, stats_dir=STATS_DIR):
         self.stats_lost = None
         self.stats_found = None
-        self.results_dir = "results/Результаты 3 главы анализа"  # Папка для сохранения графиков
-        os.makedirs(self.results_dir, exist_ok=True)  # Создаем папку при инициализации
+        self.stats_dir = stats_dir
+        self.results_dir = "results/Результаты 3 главы анализа"  # Папка для сохранения графиков (создаётся при сохранении)
         self.load_statistics()
     
     def load_statistics(self):
         """Загружает статистику из сохраненных файлов"""
         print("📊 Загрузка статистики для прогнозирования...")
         
-        stats_dir = 'results/Результаты 3 главы анализа/3.1 Stats for 3.2 Prediction'
+        stats_dir = self.stats_dir
         
         # Загружаем статистику для потерянных
-        lost_file = os.path.join(stats_dir, 'pet911_lost_statistics.json')
+        lost_file = os.path.join(stats_dir, STATS_FILES['lost'])
         if os.path.exists(lost_file):
             with open(lost_file, 'r', encoding='utf-8') as f:
                 self.stats_lost = json.load(f)
@@ -25,86 +185,137 @@ class PetSearchPredictor:
             print(f"❌ Файл статистики для потерянных не найден: {lost_file}")
         
         # Загружаем статистику для найденных
-        found_file = os.path.join(stats_dir, 'pet911_found_statistics.json')
+        found_file = os.path.join(stats_dir, STATS_FILES['found'])
         if os.path.exists(found_file):
             with open(found_file, 'r', encoding='utf-8') as f:
                 self.stats_found = json.load(f)
             print(f"✅ Статистика для найденных загружена")
         else:
             print(f"❌ Файл статистики для найденных не найден: {found_file}")
-    
-    def calculate_probability(self, ad_data, ad_type):
-        """Рассчитывает вероятность успеха на основе реальной статистики"""
-        if ad_type == 'lost' and self.stats_lost:
-            stats = self.stats_lost
-            base_rate = stats['base_success_rate']
-        elif ad_type == 'found' and self.stats_found:
-            stats = self.stats_found
-            base_rate = stats['base_success_rate']
-        else:
-            # Fallback если статистика не загружена
-            base_rate = 0.15
-            stats = {}
-        
-        probability = base_rate
-        factors_log = []
-        
-        # Влияние типа животного
-        animal_type = ad_data.get('animal_type', 'другое').lower()
-        if 'animal_success_rates' in stats and animal_type in stats['animal_success_rates']:
-            animal_rate = stats['animal_success_rates'][animal_type]
-            animal_impact = animal_rate - base_rate
-            probability += animal_impact
-            factors_log.append(f"Тип животного ({animal_type}): {animal_impact:+.1%}")
-        else:
-            factors_log.append(f"Тип животного ({animal_type}): статистика недоступна")
-        
-        # Влияние фото
-        has_photos = ad_data.get('has_photos', 'нет').lower()
-        if 'photo_statistics' in stats and 'has_photo_impact' in stats['photo_statistics']:
-            photo_stats = stats['photo_statistics']['has_photo_impact']
-            if has_photos == 'нет':
-                photo_impact = photo_stats.get('0', 0) - base_rate
-                probability += photo_impact
-                factors_log.append(f"Отсутствие фото: {photo_impact:+.1%}")
-            else:
-                photo_count = ad_data.get('photo_count', 1)
-                # Используем статистику для фото > 0
-                photo_impact = photo_stats.get('1', base_rate) - base_rate
-                probability += photo_impact
-                factors_log.append(f"Наличие фото: {photo_impact:+.1%}")
-        
-        # Влияние описания
-        has_description = ad_data.get('has_description', 'нет').lower()
-        if 'description_statistics' in stats and 'has_description_impact' in stats['description_statistics']:
-            desc_stats = stats['description_statistics']['has_description_impact']
-            if has_description == 'нет':
-                desc_impact = desc_stats.get('0', 0) - base_rate
-                probability += desc_impact
-                factors_log.append(f"Отсутствие описания: {desc_impact:+.1%}")
-            else:
-                desc_impact = desc_stats.get('1', base_rate) - base_rate
-                probability += desc_impact
-                desc_length = ad_data.get('desc_length', 0)
-                factors_log.append(f"Наличие описания ({desc_length} слов): {desc_impact:+.1%}")
-        
-        # Влияние контактов
-        has_contacts = ad_data.get('has_contacts', 'нет').lower()
-        if 'contacts_impact' in stats:
-            contacts_stats = stats['contacts_impact']
-            if has_contacts == 'нет':
-                contacts_impact = contacts_stats.get('0', 0) - base_rate
-                probability += contacts_impact
-                factors_log.append(f"Отсутствие контактов: {contacts_impact:+.1%}")
-            else:
-                contacts_impact = contacts_stats.get('1', base_rate) - base_rate
-                probability += contacts_impact
-                factors_log.append(f"Наличие контактов: {contacts_impact:+.1%}")
-        
-        # Ограничиваем вероятность
-        probability = max(0.01, min(0.95, probability))
         
-        return probability, factors_log, base_rate
+        self.compile_statistics()
+    
+    def stats_signature(self):
+        """Отпечаток файлов статистики (mtime и размер) - по его изменению сервис перезагружает модель"""
+        signature = []
+        for ad_type, filename in STATS_FILES.items():
+            path = os.path.join(self.stats_dir, filename)
+            try:
+                st = os.stat(path)
+                signature.append((ad_type, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append((ad_type, None, None))
+        return tuple(signature)
+    
+    def compile_statistics(self):
+        """Компилирует загруженную статистику в таблицы для быстрого прогноза"""
+        self.compiled = {
+            'lost': CompiledStatistics(self.stats_lost),
+            'found': CompiledStatistics(self.stats_found)
+        }
+        # Для неизвестного типа или незагруженной статистики - базовый уровень 0.15 без факторов
+        self.compiled_fallback = CompiledStatistics(None)
+    
+    def get_compiled(self, ad_type):
+        return self.compiled.get(ad_type) or self.compiled_fallback
+    
+    @staticmethod
+    def encode_ad(table, ad_data):
+        """Тип животного (нижний регистр) и коды факторов одного объявления для таблицы table"""
+        animal_type = str(ad_data.get('animal_type', AD_FIELD_DEFAULTS['animal_type'])).lower()
+        codes = (
+            table.animal_codes.get(animal_type, 0),
+            flag_code(ad_data.get('has_photos', 'нет')),
+            flag_code(ad_data.get('has_description', 'нет')),
+            flag_code(ad_data.get('has_contacts', 'нет'))
+        )
+        return animal_type, codes
+    
+    def predict_proba(self, ad_data, ad_type):
+        """
+        Быстрый прогноз одного объявления по скомпилированным таблицам (без текстового лога факторов).
+        Для объяснения факторов используйте explain_probability.
+        """
+        table = self.get_compiled(ad_type)
+        _, codes = self.encode_ad(table, ad_data)
+        return table.probability_one(*codes)
+    
+    def explain_probability(self, ad_data, ad_type):
+        """
+        Вероятность успеха одного объявления по скомпилированным таблицам и вклад каждого фактора текстом.
+        Возвращает (вероятность, список факторов, базовый уровень)
+        """
+        table = self.get_compiled(ad_type)
+        animal_type, codes = self.encode_ad(table, ad_data)
+        factors_log = table.explain(animal_type, *codes[1:], desc_length=ad_data.get('desc_length', 0))
+        return table.probability_one(*codes), factors_log, table.base_rate
+
+    def normalize_ads(self, ads, ad_type=None):
+        """
+        Приводит пакет объявлений к полям explain_probability.
+        Принимает поля объявления (animal_type, has_photos, ...) или колонки датасета (тип_животного, есть_фото, ...).
+        Тип объявления (ad_type или колонка 'ad_type') каждой строки должен быть из AD_TYPES, иначе ValueError.
+        """
+        df = pd.DataFrame(ads).rename(columns=DATASET_FIELD_MAP)
+        df = df.reset_index(drop=True)
+        
+        for field, default in AD_FIELD_DEFAULTS.items():
+            if field not in df.columns:
+                df[field] = default
+            df[field] = fill_category(df[field], default)
+        
+        if ad_type is not None:
+            df['ad_type'] = ad_type
+        elif 'ad_type' not in df.columns:
+            raise ValueError("Не указан тип объявления: передайте ad_type или колонку 'ad_type'")
+        
+        invalid = np.flatnonzero(~df['ad_type'].isin(AD_TYPES))
+        if len(invalid):
+            raise ValueError(f"Поле ad_type должно быть одним из {list(AD_TYPES)}: некорректно "
+                             f"в {len(invalid)} объявлениях (номера с 0: {invalid[:10].tolist()})")
+        
+        df['animal_type'] = map_unique(df['animal_type'], lambda value: str(value).strip().lower())
+        for field in FLAG_FIELDS:
+            df[field] = map_unique(df[field], normalize_flag)
+        
+        return df
+    
+    def score_batch(self, ads, ad_type=None, explain=True):
+        """
+        Пакетный прогноз по скомпилированным таблицам: вероятность успеха для всех объявлений
+        и (при explain=True) вклад каждого фактора. Результат совпадает с explain_probability.
+        """
+        df = self.normalize_ads(ads, ad_type)
+        columns = ['base_rate'] + FACTOR_COLUMNS + ['probability'] if explain else ['probability']
+        values = np.zeros((len(df), len(columns)))
+        
+        flag_codes = {field: (df[field] != 'нет').to_numpy(dtype=np.intp) for field in FLAG_FIELDS}
+        ad_types = df['ad_type'].to_numpy()
+        
+        for current_type in pd.unique(ad_types):
+            rows = np.flatnonzero(ad_types == current_type)
+            table = self.get_compiled(current_type)
+            codes = (
+                table.encode_animals(df['animal_type'].to_numpy()[rows]),
+                flag_codes['has_photos'][rows],
+                flag_codes['has_description'][rows],
+                flag_codes['has_contacts'][rows]
+            )
+            values[rows, -1] = table.probability(*codes)
+            if explain:
+                values[rows, 0] = table.base_rate
+                for i, impact in enumerate(table.impacts(*codes), start=1):
+                    values[rows, i] = impact
+        
+        result = pd.DataFrame(values, columns=columns, index=df.index)
+        result.insert(0, 'ad_type', df['ad_type'])
+        return result
+    
+    def score_file(self, file_path, ad_type=None):
+        """Пакетный прогноз для файла объявлений (.jsonl или .csv)"""
+        ads = load_ads(file_path)
+        scores = self.score_batch(ads, ad_type)
+        return pd.concat([ads.reset_index(drop=True), scores.drop(columns=['ad_type'])], axis=1)
 
     def get_recommendations(self, ad_data, current_probability, ad_type, base_rate):
         """Генерирует рекомендации на основе реальной статистики"""
@@ -182,7 +393,7 @@ class PetSearchPredictor:
         print(f"📊 Базовый уровень успешности: {base_rate*100:.1f}%")
         
         ad_data = self.collect_ad_data('lost')
-        probability, factors_log, base_rate = self.calculate_probability(ad_data, 'lost')
+        probability, factors_log, base_rate = self.explain_probability(ad_data, 'lost')
         
         self.display_prediction(probability, factors_log, ad_data, 'lost', base_rate)
         
@@ -201,7 +412,7 @@ class PetSearchPredictor:
         print(f"📊 Базовый уровень успешности: {base_rate*100:.1f}%")
         
         ad_data = self.collect_ad_data('found')
-        probability, factors_log, base_rate = self.calculate_probability(ad_data, 'found')
+        probability, factors_log, base_rate = self.explain_probability(ad_data, 'found')
         
         self.display_prediction(probability, factors_log, ad_data, 'found', base_rate)
         
@@ -303,14 +514,39 @@ class PetSearchPredictor:
         # Сохраняем график в файл
         timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
         filename = f"3.2. Прогноз_{ad_type}_{timestamp}.png"
-        filepath = os.path.join(self.results_dir, filename)
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
+        os.makedirs(self.results_dir, exist_ok=True)
+        filepath, save_params = output_params(os.path.join(self.results_dir, filename))
+        plt.savefig(filepath, **save_params)
         print(f"💾 График сохранен: {filepath}")
         
         # Показываем график
         plt.show()
 
-def step_3_2():
+def load_ads(file_path):
+    """Читает объявления из JSONL (по объекту на строку) или CSV"""
+    if file_path.endswith('.jsonl'):
+        return pd.read_json(file_path, lines=True, dtype=False)
+    return pd.read_csv(file_path)
+
+def score_datasets(predictor, output_file=BATCH_OUTPUT_FILE):
+    """Неинтерактивный режим: прогноз для всех объявлений из датасетов lost и found"""
+    frames = []
+    for ad_type in ('lost', 'found'):
+        with phase('load') as record:
+            df = load_dataset(ad_type)
+            record.rows = len(df)
+        with phase('predict', rows=len(df)):
+            scores = predictor.score_batch(df[list(DATASET_FIELD_MAP)], ad_type)
+            frames.append(pd.concat([df[['id', 'статус']], scores], axis=1))
+    
+    result = pd.concat(frames, ignore_index=True)
+    with phase('save', rows=len(result)):
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        result.to_csv(output_file, index=False, encoding='utf-8-sig')
+    print(f"💾 Прогноз для {len(result)} объявлений сохранен: {output_file}")
+    return result
+
+def step_3_2(interactive=None):
     """Основная функция программы прогнозирования"""
 
     warnings.filterwarnings('ignore')
@@ -321,6 +557,13 @@ def step_3_2():
     
     predictor = PetSearchPredictor()
     
+    # Без терминала (Docker, cron) меню недоступно - считаем прогноз пакетно
+    if interactive is None:
+        interactive = sys.stdin is not None and sys.stdin.isatty()
+    if not interactive:
+        score_datasets(predictor)
+        return
+    
     while True:
         print("\n📋 ВЫБЕРИТЕ ТИП ПРОГНОЗА:")
         print("1. 🐕 Прогноз для потерянного животного")
@@ -345,5 +588,31 @@ def step_3_2():
                 print("👋 До свидания!")
                 break
 
-if __name__ == "__step_3_2__":
-    step_3_2()
\ No newline at end of file
+def main(argv=None):
+    """CLI пакетного прогноза: python -m src.step_3_2 --input ads.jsonl --ad-type lost --output scores.csv"""
+    parser = argparse.ArgumentParser(description="Пакетный прогноз успешности объявлений Pet911")
+    parser.add_argument('--input', help="Файл объявлений (.jsonl или .csv); без него - интерактивное меню")
+    parser.add_argument('--ad-type', choices=list(AD_TYPES), default=None,
+                        help="Тип объявлений (если в файле нет колонки ad_type)")
+    parser.add_argument('--output', default=None, help="Куда сохранить результат (.csv или .jsonl); по умолчанию stdout")
+    parser.add_argument('--stats-dir', default=STATS_DIR, help="Папка со статистикой из step_3_1")
+    args = parser.parse_args(argv)
+    
+    if not args.input:
+        step_3_2(interactive=True)
+        return
+    
+    # Служебные сообщения - в stderr, чтобы stdout содержал только результат
+    with redirect_stdout(sys.stderr):
+        predictor = PetSearchPredictor(stats_dir=args.stats_dir)
+        result = predictor.score_file(args.input, args.ad_type)
+    
+    if args.output and args.output.endswith('.jsonl'):
+        result.to_json(args.output, orient='records', lines=True, force_ascii=False)
+    elif args.output:
+        result.to_csv(args.output, index=False, encoding='utf-8-sig')
+    else:
+        result.to_csv(sys.stdout, index=False)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,4 +1,21 @@
 from .deps import *
+from .dataset import load_combined_dataset, LOST_FILE, FOUND_FILE
+from .lemmatizer import LEMMA_CACHE, lemmatize_text
+from .corpus import load_or_build_corpus, load_or_fit_tfidf, streaming_tfidf
+from .charts import submit_chart, chart_batch
+from .metrics import instrumented, phase
+
+# Параметры TF-IDF (входят в ключ кэша матрицы)
+TFIDF_PARAMS = {
+    'max_features': 1500,
+    'min_df': 5,
+    'max_df': 0.8,
+    'ngram_range': (1, 2)  # Учитываем отдельные слова и биграммы
+}
+
+# Режим TF-IDF: 'exact' - TfidfVectorizer по всему корпусу (матрица кэшируется),
+# 'streaming' - хэширование по порциям без загрузки корпуса и матрицы в память (для многолетних архивов)
+TFIDF_MODE = os.environ.get('PET911_TFIDF_MODE', 'exact')
 
 # Для текстовой обработки
 
@@ -17,6 +34,7 @@ def setup_directories():
     
     return main_dir, analysis_dir
 
+@instrumented('preprocess')
 def setup_russian_analysis():
     """Настройка инструментов для русского языка"""
     try:
@@ -28,58 +46,29 @@ def setup_russian_analysis():
     # Инициализация лемматизатора
     morph = pymorphy3.MorphAnalyzer()
     
-    return russian_stopwords, morph
+    # Множество вместо списка: проверка стоп-слова за O(1)
+    return frozenset(russian_stopwords), morph
 
-def preprocess_text(text, stopwords_list, morph_analyzer):
+def preprocess_text(text, stopwords_list, morph_analyzer, lemma_cache=None):
     """
     Функция для предобработки текста: приведение к нижнему регистру, удаление пунктуации,
     чисел, стоп-слов и лемматизация.
+    Леммы берутся из кэша (по умолчанию общий кэш процесса LEMMA_CACHE), разбор pymorphy3 - только для новых слов.
     """
-    if pd.isna(text):
-        return ""
-    
-    # Приводим к нижнему регистру
-    text = text.lower()
-    # Удаляем пунктуацию и цифры
-    text = re.sub(f'[{string.punctuation}«»—…"",,,""]', ' ', text)
-    text = re.sub(r'\d+', '', text)
-    # Удаляем множественные пробелы
-    text = re.sub(r'\s+', ' ', text).strip()
-    # Разбиваем на слова
-    words = text.split()
-    # Удаляем стоп-слова и применяем лемматизацию
-    processed_words = []
-    for word in words:
-        if word not in stopwords_list and len(word) > 2:
-            parsed_word = morph_analyzer.parse(word)[0]
-            lemma = parsed_word.normal_form
-            processed_words.append(lemma)
-    
-    return " ".join(processed_words)
+    if lemma_cache is None:
+        lemma_cache = LEMMA_CACHE
+    
+    return lemmatize_text(text, stopwords_list, morph_analyzer, lemma_cache)
 
+@instrumented('load')
 def load_and_prepare_data(lost_file, found_file):
     """
     Загружает данные из двух файлов, объединяет их и создает целевую переменную is_success.
     """
     print("Загрузка данных...")
     
-    # Загрузка данных
-    df_lost = pd.read_csv(lost_file)
-    df_found = pd.read_csv(found_file)
-    
-    # Добавляем метку типа объявления
-    df_lost['объявление_тип'] = 'lost'
-    df_found['объявление_тип'] = 'found'
-    
-    # Объединяем датасеты
-    df_combined = pd.concat([df_lost, df_found], ignore_index=True)
-    
-    # Создаем целевую переменную is_success
-    success_conditions = (
-        (df_combined['статус'] == 'питомец найден') | 
-        (df_combined['статус'] == 'хозяин найден')
-    )
-    df_combined['is_success'] = success_conditions
+    # Загрузка данных (объединение lost + found и целевая переменная is_success)
+    df_combined = load_combined_dataset(lost_file, found_file)
     
     print(f"Всего объявлений: {len(df_combined)}")
     print(f"Успешных случаев: {df_combined['is_success'].sum()}")
@@ -88,83 +77,73 @@ def load_and_prepare_data(lost_file, found_file):
     
     return df_combined
 
-def analyze_word_frequencies(df, stopwords_list, morph_analyzer):
+@instrumented('preprocess')
+def prepare_corpus(df, stopwords_list, morph_analyzer):
     """
-    Анализирует частоты слов в успешных и неуспешных объявлениях.
+    Лемматизированный корпус описаний. Хранится на диске (data/cache/corpus) по хэшу описаний:
+    на неизменном архиве лемматизация не повторяется. Большой корпус лемматизируется параллельно
+    (PET911_TEXT_WORKERS процессов), порядок строк сохраняется.
     """
     print("\nПредобработка текстов...")
-    df['описание_обработанное'] = df['описание'].apply(
-        lambda x: preprocess_text(x, stopwords_list, morph_analyzer)
-    )
+    return load_or_build_corpus(df['описание'], stopwords_list, morph_analyzer)
+
+@instrumented('aggregate')
+def analyze_word_frequencies(df, corpus, min_occurrences=10):
+    """
+    Анализирует частоты слов в успешных и неуспешных объявлениях.
+    Считается по разреженной матрице документ-лемма корпуса: число вхождений по группам - суммы столбцов,
+    поэтому память зависит от размера словаря, а не от общего числа слов.
+    """
+    is_success = df['is_success'].to_numpy(dtype=bool)
+    doc_lengths = np.diff(corpus.offsets)
     
-    # Разделяем на успешные и неуспешные
-    success_texts = df[df['is_success'] == True]['описание_обработанное']
-    fail_texts = df[df['is_success'] == False]['описание_обработанное']
+    print(f"Успешных объявлений с описанием: {np.count_nonzero(doc_lengths[is_success])}")
+    print(f"Неуспешных объявлений с описанием: {np.count_nonzero(doc_lengths[~is_success])}")
     
-    print(f"Успешных объявлений с описанием: {success_texts.str.len().gt(0).sum()}")
-    print(f"Неуспешных объявлений с описанием: {fail_texts.str.len().gt(0).sum()}")
+    # Число вхождений каждой леммы в успешных и неуспешных объявлениях (столбцы 0 и 1)
+    groups = np.column_stack([is_success, ~is_success]).astype(np.int64)
+    group_counts = np.asarray(corpus.count_matrix().T @ groups)
+    success_count = group_counts[:, 0]
+    fail_count = group_counts[:, 1]
     
-    # Собираем все слова
-    all_success_words = ' '.join(success_texts).split()
-    all_fail_words = ' '.join(fail_texts).split()
+    # Общее число слов в группах (включая короткие)
+    total_success, total_fail = group_counts.sum(axis=0)
     
-    # Считаем частоты
-    success_freq = Counter(all_success_words)
-    fail_freq = Counter(all_fail_words)
+    # Вычисляем относительные частоты (на 1000 слов)
+    success_rel = success_count / total_success * 1000 if total_success > 0 else np.zeros(len(success_count))
+    fail_rel = fail_count / total_fail * 1000 if total_fail > 0 else np.zeros(len(fail_count))
     
     # Создаем DataFrame для сравнения
-    all_words = set(all_success_words + all_fail_words)
-    word_comparison = []
-    
-    for word in all_words:
-        if len(word) > 2:  # Игнорируем слишком короткие слова
-            success_count = success_freq.get(word, 0)
-            fail_count = fail_freq.get(word, 0)
-            total_success = len(all_success_words)
-            total_fail = len(all_fail_words)
-            
-            # Вычисляем относительные частоты (на 1000 слов)
-            success_rel = (success_count / total_success * 1000) if total_success > 0 else 0
-            fail_rel = (fail_count / total_fail * 1000) if total_fail > 0 else 0
-            
-            word_comparison.append({
-                'word': word,
-                'success_count': success_count,
-                'fail_count': fail_count,
-                'success_freq_per_1000': success_rel,
-                'fail_freq_per_1000': fail_rel,
-                'freq_difference': success_rel - fail_rel
-            })
-    
-    word_df = pd.DataFrame(word_comparison)
-    
-    # Фильтруем слова, которые встречаются достаточно часто
-    min_occurrences = 10
+    word_df = pd.DataFrame({
+        'word': corpus.vocabulary,
+        'success_count': success_count,
+        'fail_count': fail_count,
+        'success_freq_per_1000': success_rel,
+        'fail_freq_per_1000': fail_rel,
+        'freq_difference': success_rel - fail_rel
+    })
+    
+    # Игнорируем слишком короткие слова и оставляем слова, которые встречаются достаточно часто
     word_df = word_df[
-        (word_df['success_count'] >= min_occurrences) | 
-        (word_df['fail_count'] >= min_occurrences)
+        (word_df['word'].str.len() > 2) &
+        ((word_df['success_count'] >= min_occurrences) | (word_df['fail_count'] >= min_occurrences))
     ]
     
-    return word_df, success_texts, fail_texts
+    return word_df
 
-def analyze_with_tfidf(df, success_texts, fail_texts):
+@instrumented('aggregate')
+def analyze_with_tfidf(df, corpus):
     """
     Анализирует слова с помощью TF-IDF подхода.
+    Матрица TF-IDF по всем текстам сохраняется рядом с корпусом (sparse .npz) и при повторном запуске
+    читается из кэша вместо обучения векторайзера.
     """
     print("\nАнализ с помощью TF-IDF...")
     
-    # Создаем TF-IDF векторайзер
-    vectorizer = TfidfVectorizer(
-        max_features=1500, 
-        min_df=5, 
-        max_df=0.8,
-        ngram_range=(1, 2)  # Учитываем отдельные слова и биграммы
-    )
+    if TFIDF_MODE == 'streaming':
+        return analyze_with_tfidf_streaming(df, corpus)
     
-    # Применяем ко всем текстам
-    all_texts = df['описание_обработанное']
-    X = vectorizer.fit_transform(all_texts)
-    feature_names = vectorizer.get_feature_names_out()
+    X, feature_names = load_or_fit_tfidf(corpus, TFIDF_PARAMS)
     
     # Разделяем на успешные и неуспешные индексы
     success_idx = df[df['is_success'] == True].index
@@ -187,6 +166,23 @@ def analyze_with_tfidf(df, success_texts, fail_texts):
     
     return tfidf_comparison
 
+def analyze_with_tfidf_streaming(df, corpus):
+    """
+    Потоковый вариант analyze_with_tfidf (PET911_TFIDF_MODE=streaming): корпус читается порциями,
+    частоты терминов оцениваются по хэш-ячейкам; в памяти - одна порция, счётчики ячеек и не больше
+    STREAM_MAX_TERMS терминов-кандидатов, независимо от объёма архива.
+    """
+    print("Потоковый режим TF-IDF (хэширование по порциям)")
+    labels = df['is_success'].to_numpy(dtype=bool)
+    tfidf_comparison = streaming_tfidf(lambda: corpus.iter_chunks(labels), TFIDF_PARAMS)
+    
+    # Вычисляем разницу и относительную важность
+    tfidf_comparison['tfidf_difference'] = tfidf_comparison['success_tfidf'] - tfidf_comparison['fail_tfidf']
+    tfidf_comparison['abs_difference'] = abs(tfidf_comparison['tfidf_difference'])
+    
+    return tfidf_comparison
+
+@instrumented('plot')
 def visualize_results(word_df, tfidf_df, main_dir):
     """
     Визуализирует результаты анализа.
@@ -201,6 +197,18 @@ def visualize_results(word_df, tfidf_df, main_dir):
     top_success_tfidf = tfidf_df.nlargest(20, 'tfidf_difference')
     top_fail_tfidf = tfidf_df.nsmallest(20, 'tfidf_difference')
     
+    # Сохраняем в основную папку
+    submit_chart(os.path.join(main_dir, '4.1.1. Комплексные результаты топ 20 слов для двух видов анализа.png'),
+                 draw_top_words, top_success_freq, top_fail_freq, top_success_tfidf, top_fail_tfidf)
+    submit_chart(os.path.join(main_dir, '4.1.2. Сравнения частот для топ 10 слов успешных и неуспешных объявлений.png'),
+                 draw_top_words_comparison, top_success_freq.head(10), top_fail_freq.head(10))
+    
+    return top_success_freq, top_fail_freq, top_success_tfidf, top_fail_tfidf
+
+def draw_top_words(top_success_freq, top_fail_freq, top_success_tfidf, top_fail_tfidf):
+    """
+    Топ-20 слов успешных и неуспешных объявлений по разнице частот и по разнице TF-IDF.
+    """
     # Создаем фигуру с 4 субплогами
     fig, axes = plt.subplots(2, 2, figsize=(20, 16))
     
@@ -237,17 +245,14 @@ def visualize_results(word_df, tfidf_df, main_dir):
     axes[1, 1].grid(axis='x', alpha=0.3)
     
     plt.tight_layout()
-    
-    # Сохраняем в основную папку
-    plt.savefig(os.path.join(main_dir, '4.1.1. Комплексные результаты топ 20 слов для двух видов анализа.png'), 
-                dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    # Дополнительная визуализация: сравнение топ-10 слов
+
+def draw_top_words_comparison(top_10_success, top_10_fail):
+    """
+    Дополнительная визуализация: сравнение частот топ-10 слов между группами.
+    """
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(18, 8))
     
     # Сравнение частот для топ-10 успешных слов
-    top_10_success = top_success_freq.head(10)
     x = range(len(top_10_success))
     width = 0.35
     
@@ -264,7 +269,6 @@ def visualize_results(word_df, tfidf_df, main_dir):
     ax1.grid(axis='y', alpha=0.3)
     
     # Сравнение частот для топ-10 неуспешных слов
-    top_10_fail = top_fail_freq.head(10)
     x = range(len(top_10_fail))
     
     ax2.bar([i - width/2 for i in x], top_10_fail['success_freq_per_1000'], 
@@ -280,13 +284,6 @@ def visualize_results(word_df, tfidf_df, main_dir):
     ax2.grid(axis='y', alpha=0.3)
     
     plt.tight_layout()
-    
-    # Сохраняем в основную папку
-    plt.savefig(os.path.join(main_dir, '4.1.2. Сравнения частот для топ 10 слов успешных и неуспешных объявлений.png'), 
-                dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    return top_success_freq, top_fail_freq, top_success_tfidf, top_fail_tfidf
 
 def print_insights(success_words_freq, fail_words_freq, success_words_tfidf, fail_words_tfidf):
     """
@@ -324,10 +321,6 @@ def step_4_1():
     pd.set_option('display.max_columns', None)
 
 
-    # Укажите пути к вашим файлам
-    LOST_FILE = 'data/Dataset_final_Pet911_lost.csv'
-    FOUND_FILE = 'data/dataset_final_Pet911_found.csv'
-    
     try:
         print("=== ЛИНГВИСТИЧЕСКИЙ АНАЛИЗ ОПИСАНИЙ ===")
         print("Загрузка и настройка...")
@@ -341,27 +334,30 @@ def step_4_1():
         # Загрузка данных
         df = load_and_prepare_data(LOST_FILE, FOUND_FILE)
         
+        # Лемматизированный корпус описаний (из кэша, если описания не менялись)
+        corpus = prepare_corpus(df, stopwords_list, morph_analyzer)
+        
         # Анализ частот слов
-        word_freq_df, success_texts, fail_texts = analyze_word_frequencies(
-            df, stopwords_list, morph_analyzer
-        )
+        word_freq_df = analyze_word_frequencies(df, corpus)
         
         # Анализ TF-IDF
-        tfidf_df = analyze_with_tfidf(df, success_texts, fail_texts)
+        tfidf_df = analyze_with_tfidf(df, corpus)
         
-        # Визуализация результатов
-        success_freq, fail_freq, success_tfidf, fail_tfidf = visualize_results(
-            word_freq_df, tfidf_df, main_dir
-        )
+        # Визуализация результатов (графики рисуются параллельно в пуле процессов)
+        with chart_batch():
+            success_freq, fail_freq, success_tfidf, fail_tfidf = visualize_results(
+                word_freq_df, tfidf_df, main_dir
+            )
         
         # Вывод инсайтов
         print_insights(success_freq, fail_freq, success_tfidf, fail_tfidf)
         
         # Сохранение результатов в папку анализа
-        word_freq_df.to_csv(os.path.join(analysis_dir, 'word_frequency_analysis.csv'), 
+        with phase('save', rows=len(word_freq_df) + len(tfidf_df)):
+            word_freq_df.to_csv(os.path.join(analysis_dir, 'word_frequency_analysis.csv'), 
+                               index=False, encoding='utf-8-sig')
+            tfidf_df.to_csv(os.path.join(analysis_dir, 'tfidf_analysis.csv'), 
                            index=False, encoding='utf-8-sig')
-        tfidf_df.to_csv(os.path.join(analysis_dir, 'tfidf_analysis.csv'), 
-                       index=False, encoding='utf-8-sig')
         
         print(f"Результаты сохранены в папке 'results/Результаты 4 главы анализа'")
 
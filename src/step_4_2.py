@@ -1,5 +1,45 @@
 from .deps import *
+from .dataset import load_combined_dataset, parse_russian_dates, LOST_FILE, FOUND_FILE
+from .clustering import (
+    selection_mode, fast_k_sweep, make_kmeans, sampled_silhouette,
+    ClusterModel, CLUSTER_MODEL_FILE, CLUSTER_REFIT
+)
+from .charts import submit_chart, chart_batch, chart_annotations
+from .metrics import instrumented, phase
 
+# Ключевые поля анкеты для полноты заполнения и значения, которые считаются незаполненными
+KEY_COLUMNS = ['тип_животного', 'порода', 'пол', 'возраст', 'окрас', 'место события']
+EMPTY_VALUES = ['', 'Неизвестно', 'Unknown']
+
+
+def filled_mask(values):
+    """
+    Маска заполненности столбца: не пропуск и не пустое/'Неизвестно' значение.
+    У категориального столбца проверяется только словарь категорий, строки получают результат по кодам.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = pd.Series(values.cat.categories.astype(str))
+        filled_categories = ~categories.str.strip().isin(EMPTY_VALUES).to_numpy()
+        # Код -1 (пропуск) попадает на добавленный в конец False
+        return pd.Series(np.append(filled_categories, False)[values.cat.codes.to_numpy()], index=values.index)
+    return values.notna() & ~values.astype(str).str.strip().isin(EMPTY_VALUES)
+
+def calculate_completeness(df, key_columns=KEY_COLUMNS):
+    """
+    Доля заполненных ключевых полей по каждой строке: маска заполненности по каждому столбцу
+    (filled_mask), сумма масок делится на число полей.
+    Отсутствующий в датафрейме столбец считается незаполненным.
+    """
+    filled = pd.Series(0, index=df.index)
+    for col in key_columns:
+        if col in df.columns:
+            filled += filled_mask(df[col]).astype(int)
+    
+    return filled / len(key_columns) if len(key_columns) > 0 else filled
+
+def calculate_time_diff(published, event):
+    """Разница в днях между публикацией и событием; отрицательные значения и пропуски дат -> 0"""
+    return (published - event).dt.days.clip(lower=0).fillna(0).astype('int64')
 
 
 def create_directories():
@@ -16,40 +56,28 @@ def create_directories():
     
     return base_dir, clustering_dir
 
+@instrumented('load')
 def load_and_prepare_data(lost_file, found_file):
     """
     Загружает данные из двух файлов и объединяет их.
     """
     print("Загрузка данных...")
     
-    # Загрузка данных
-    df_lost = pd.read_csv(lost_file)
-    df_found = pd.read_csv(found_file)
-    
-    # Добавляем метку типа объявления
-    df_lost['объявление_тип'] = 'lost'
-    df_found['объявление_тип'] = 'found'
-    
-    # Объединяем датасеты
-    df_combined = pd.concat([df_lost, df_found], ignore_index=True)
-    
-    # Создаем целевую переменную is_success
-    success_conditions = (
-        (df_combined['статус'] == 'питомец найден') | 
-        (df_combined['статус'] == 'хозяин найден')
-    )
-    df_combined['is_success'] = success_conditions
+    # Загрузка данных (объединение lost + found и целевая переменная is_success)
+    df_combined = load_combined_dataset(lost_file, found_file)
     
     print(f"Всего объявлений: {len(df_combined)}")
     print(f"Успешных случаев: {df_combined['is_success'].sum()}")
     
     return df_combined
 
-def create_clustering_features(df):
+@instrumented('preprocess')
+def create_clustering_features(df, verbose=True):
     """
     Создает признаки для кластеризации на основе качества оформления заявок.
     """
-    print("\nСоздание признаков для кластеризации...")
+    if verbose:
+        print("\nСоздание признаков для кластеризации...")
     
     # 1. Количество фото (прямой признак)
     df['количество_фото_норм'] = df['количество_фото'].fillna(0)
@@ -58,54 +86,19 @@ def create_clustering_features(df):
     df['длина_описания_норм'] = df['Длина_описания_в_словах'].fillna(0)
     
     # 3. Полнота заполнения (вычисляем процент заполненных ключевых полей)
-    key_columns = ['тип_животного', 'порода', 'пол', 'возраст', 'окрас', 'место события']
-    
-    def calculate_completeness(row):
-        filled = 0
-        total = len(key_columns)
-        
-        for col in key_columns:
-            if (col in row and 
-                pd.notna(row[col]) and 
-                str(row[col]).strip() not in ['', 'Неизвестно', 'Unknown']):
-                filled += 1
-        
-        return filled / total if total > 0 else 0
-    
-    df['полнота_заполнения'] = df.apply(calculate_completeness, axis=1)
+    df['полнота_заполнения'] = calculate_completeness(df)
     
     # 4. Скорость публикации (разница между датой события и публикации)
-    def parse_date(date_str):
-        """Парсит дату из формата 'вс, 12.10.2025'"""
-        try:
-            if pd.isna(date_str):
-                return None
-            # Убираем день недели и лишние пробелы
-            date_part = str(date_str).split(',')[-1].strip()
-            return datetime.strptime(date_part, '%d.%m.%Y')
-        except:
-            return None
-    
-    # Парсим даты
-    df['дата_публикации_парс'] = df['дата_публикации'].apply(parse_date)
+    # Исходные строки дат остаются в колонках для отчёта, разобранные даты - в отдельных колонках
+    df['дата_публикации_парс'] = parse_russian_dates(df['дата_публикации'])
     
     # Определяем столбец с датой события в зависимости от типа объявления
-    def get_event_date(row):
-        if row['объявление_тип'] == 'lost':
-            return parse_date(row['дата пропажи'])
-        else:
-            return parse_date(row['дата находки'])
-    
-    df['дата_события_парс'] = df.apply(get_event_date, axis=1)
-    
-    # Вычисляем разницу в днях
-    def calculate_time_diff(row):
-        if pd.isna(row['дата_публикации_парс']) or pd.isna(row['дата_события_парс']):
-            return 0
-        diff = (row['дата_публикации_парс'] - row['дата_события_парс']).days
-        return max(0, diff)  # Отрицательные значения не имеют смысла
+    df['дата_события_парс'] = parse_russian_dates(df['дата пропажи']).where(
+        df['объявление_тип'] == 'lost', parse_russian_dates(df['дата находки'])
+    )
     
-    df['скорость_публикации_дни'] = df.apply(calculate_time_diff, axis=1)
+    # Вычисляем разницу в днях (отрицательные значения не имеют смысла)
+    df['скорость_публикации_дни'] = calculate_time_diff(df['дата_публикации_парс'], df['дата_события_парс'])
     
     # 5. Активность обсуждения
     df['активность_обсуждения'] = df['количество_комментариев'].fillna(0)
@@ -119,11 +112,13 @@ def create_clustering_features(df):
     # Заполняем пропуски
     clustering_features = clustering_features.fillna(0)
     
-    print("Статистика признаков для кластеризации:")
-    print(clustering_features.describe().round(2))
+    if verbose:
+        print("Статистика признаков для кластеризации:")
+        print(clustering_features.describe().round(2))
     
     return clustering_features, df
 
+@instrumented('model')
 def find_optimal_clusters(features_scaled, clustering_dir):
     """
     Находит оптимальное количество кластеров.
@@ -132,14 +127,62 @@ def find_optimal_clusters(features_scaled, clustering_dir):
     
     silhouette_scores = []
     wcss = []  # Within-Cluster Sum of Square
-    k_range = range(2, 8)
-    
-    for k in k_range:
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        cluster_labels = kmeans.fit_predict(features_scaled)
+    silhouette_errors = None
+    k_range = list(range(2, 8))
+    
+    if selection_mode(len(features_scaled)) == 'fast':
+        # Большой архив: параллельный перебор с тёплым стартом, silhouette по выборке с 95% интервалом
+        print("Быстрый режим: параллельный перебор k, silhouette по стратифицированной выборке")
+        sweep = fast_k_sweep(features_scaled, k_range)
+        for _, row in sweep.iterrows():
+            print(f"  k={row['k']:.0f}: WCSS={row['inertia']:.1f}, silhouette={row['silhouette']:.3f} "
+                  f"[{row['silhouette_low']:.3f}; {row['silhouette_high']:.3f}]")
         
-        silhouette_scores.append(silhouette_score(features_scaled, cluster_labels))
-        wcss.append(kmeans.inertia_)
+        silhouette_scores = sweep['silhouette'].tolist()
+        wcss = sweep['inertia'].tolist()
+        silhouette_errors = [
+            (sweep['silhouette'] - sweep['silhouette_low']).tolist(),
+            (sweep['silhouette_high'] - sweep['silhouette']).tolist()
+        ]
+    else:
+        for k in k_range:
+            kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
+            cluster_labels = kmeans.fit_predict(features_scaled)
+            
+            silhouette_scores.append(float(silhouette_score(features_scaled, cluster_labels)))
+            wcss.append(float(kmeans.inertia_))
+    
+    # Результаты подбора сохраняются вместе с моделью, чтобы график 4.2.1 строился и без переобучения
+    selection = {
+        'k_range': k_range,
+        'wcss': wcss,
+        'silhouette': silhouette_scores,
+        'silhouette_errors': silhouette_errors
+    }
+    plot_cluster_selection(selection)
+    
+    # Выбираем k=4 согласно требованиям
+    optimal_k = 4
+    print(f"Выбрано количество кластеров: {optimal_k}")
+    
+    return optimal_k, selection
+
+def plot_cluster_selection(selection):
+    """
+    Строит график выбора k (метод локтя и silhouette) по результатам подбора.
+    """
+    # Сохраняем в папку кластеризации
+    output_path = os.path.join('results/Результаты 4 главы анализа/4.2.1. Оптимальное количество кластеров.png')
+    submit_chart(output_path, draw_cluster_selection, selection)
+
+def draw_cluster_selection(selection):
+    """
+    График выбора k: метод локтя и silhouette (с интервалами в быстром режиме).
+    """
+    k_range = selection['k_range']
+    wcss = selection['wcss']
+    silhouette_scores = selection['silhouette']
+    silhouette_errors = selection['silhouette_errors']
     
     # Визуализация выбора k
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 5))
@@ -152,39 +195,87 @@ def find_optimal_clusters(features_scaled, clustering_dir):
     ax1.grid(True, alpha=0.3)
     
     # Silhouette score
-    ax2.plot(k_range, silhouette_scores, 'ro-', linewidth=2, markersize=8)
+    if silhouette_errors is None:
+        ax2.plot(k_range, silhouette_scores, 'ro-', linewidth=2, markersize=8)
+    else:
+        ax2.errorbar(k_range, silhouette_scores, yerr=silhouette_errors, fmt='ro-',
+                     linewidth=2, markersize=8, capsize=5)
     ax2.set_xlabel('Количество кластеров')
     ax2.set_ylabel('Silhouette Score')
     ax2.set_title('Silhouette Analysis')
     ax2.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    
-    # Сохраняем в папку кластеризации
-    output_path = os.path.join('results/Результаты 4 главы анализа/4.2.1. Оптимальное количество кластеров.png')
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    # Выбираем k=4 согласно требованиям
-    optimal_k = 4
-    print(f"Выбрано количество кластеров: {optimal_k}")
-    
-    return optimal_k
 
+@instrumented('model')
 def perform_clustering(features_scaled, optimal_k):
     """
     Выполняет кластеризацию K-means.
     """
     print(f"\nВыполнение кластеризации с {optimal_k} кластерами...")
     
-    kmeans = KMeans(n_clusters=optimal_k, random_state=42, n_init=10)
-    cluster_labels = kmeans.fit_predict(features_scaled)
-    
-    silhouette_avg = silhouette_score(features_scaled, cluster_labels)
-    print(f"Средний silhouette score: {silhouette_avg:.3f}")
+    if selection_mode(len(features_scaled)) == 'fast':
+        kmeans = make_kmeans(optimal_k, len(features_scaled), n_init=10)
+        cluster_labels = kmeans.fit_predict(features_scaled)
+        
+        silhouette_avg, low, high = sampled_silhouette(features_scaled, cluster_labels)
+        print(f"Средний silhouette score (по выборке): {silhouette_avg:.3f}, 95% интервал [{low:.3f}; {high:.3f}]")
+    else:
+        kmeans = KMeans(n_clusters=optimal_k, random_state=42, n_init=10)
+        cluster_labels = kmeans.fit_predict(features_scaled)
+        
+        silhouette_avg = silhouette_score(features_scaled, cluster_labels)
+        print(f"Средний silhouette score: {silhouette_avg:.3f}")
     
     return cluster_labels, kmeans
 
+@instrumented('model')
+def load_reusable_model(clustering_features):
+    """
+    Загружает сохранённую модель кластеров и проверяет дрейф текущих данных.
+    Возвращает (модель, масштабированные признаки, метки) или None, если нужно обучение заново.
+    """
+    if CLUSTER_REFIT == 'always':
+        return None
+    
+    model = ClusterModel.load(feature_names=clustering_features.columns)
+    if model is None:
+        print("\nСохранённой модели кластеров нет - обучаем заново")
+        return None
+    
+    # Разметка по ближайшему центроиду: O(n·k), без подбора k и KMeans
+    features_scaled = model.transform(clustering_features)
+    cluster_labels, sq_distances = model.nearest(features_scaled)
+    metrics, exceeded = model.drift(cluster_labels, sq_distances)
+    
+    print(f"\nМодель кластеров от {model.fitted_at} (k={model.k}, обучена на {model.reference['n_samples']} объявлениях)")
+    print(f"Дрейф: рост расстояния до центроидов {metrics['inertia_growth']:+.1%}, "
+          f"сдвиг долей кластеров {metrics['share_shift']:.1%}")
+    
+    if exceeded and CLUSTER_REFIT != 'never':
+        print("Дрейф превышает порог - модель обучается заново")
+        return None
+    
+    return model, features_scaled, cluster_labels
+
+def assign_clusters(df_new, model=None):
+    """
+    Размечает объявления по сохранённой модели кластеров без переобучения (ближайший центроид, O(n·k)).
+    df_new - объявления в схеме общего слоя загрузки (с колонкой объявление_тип).
+    Возвращает копию с признаками кластеризации и колонками cluster и название_кластера.
+    """
+    if model is None:
+        model = ClusterModel.load()
+        if model is None:
+            raise FileNotFoundError(f"Модель кластеров {CLUSTER_MODEL_FILE} не найдена - сначала запустите step_4_2")
+    
+    clustering_features, df_result = create_clustering_features(df_new.copy(), verbose=False)
+    df_result['cluster'] = model.predict(clustering_features)
+    df_result['название_кластера'] = df_result['cluster'].map(model.cluster_names)
+    
+    return df_result
+
+@instrumented('plot')
 def visualize_clusters_2d(features_scaled, cluster_labels, feature_names, clustering_dir):
     """
     Визуализирует кластеры в 2D пространстве с помощью PCA.
@@ -195,6 +286,16 @@ def visualize_clusters_2d(features_scaled, cluster_labels, feature_names, cluste
     pca = PCA(n_components=2, random_state=42)
     features_2d = pca.fit_transform(features_scaled)
     
+    # Сохраняем в папку кластеризации
+    output_path = os.path.join('results/Результаты 4 главы анализа/4.2.2. Визуализация кластеров.png')
+    submit_chart(output_path, draw_clusters_2d, features_2d, cluster_labels, pca.explained_variance_ratio_)
+    
+    return features_2d
+
+def draw_clusters_2d(features_2d, cluster_labels, explained_var):
+    """
+    Кластеры в пространстве двух главных компонент: все точки и точки с центроидами.
+    """
     # Создаем красивую визуализацию
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(20, 8))
     
@@ -207,7 +308,6 @@ def visualize_clusters_2d(features_scaled, cluster_labels, feature_names, cluste
     ax1.grid(True, alpha=0.3)
     
     # Добавляем объяснение компонент
-    explained_var = pca.explained_variance_ratio_
     ax1.text(0.02, 0.98, f'Объясненная дисперсия:\nPC1: {explained_var[0]:.1%}\nPC2: {explained_var[1]:.1%}', 
              transform=ax1.transAxes, verticalalignment='top',
              bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
@@ -233,17 +333,12 @@ def visualize_clusters_2d(features_scaled, cluster_labels, feature_names, cluste
     ax2.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    
-    # Сохраняем в папку кластеризации
-    output_path = os.path.join('results/Результаты 4 главы анализа/4.2.2. Визуализация кластеров.png')
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    return features_2d
 
-def create_cluster_profiles(df, cluster_labels, feature_names):
+@instrumented('aggregate')
+def create_cluster_profiles(df, cluster_labels, feature_names, saved_names=None):
     """
     Создает профили кластеров и интерпретирует их.
+    saved_names - названия из сохранённой модели (тогда кластеры не переименовываются).
     """
     print("\nСоздание профилей кластеров...")
     
@@ -284,6 +379,9 @@ def create_cluster_profiles(df, cluster_labels, feature_names):
     
     # Присваиваем названия в порядке качества
     sorted_clusters = quality_scores.sort_values().index
+    if saved_names is not None:
+        cluster_names = dict(saved_names)
+        sorted_clusters = []
     for i, cluster_id in enumerate(sorted_clusters):
         if i == 0:
             cluster_names[cluster_id] = "Минимальные анкеты"
@@ -301,18 +399,32 @@ def create_cluster_profiles(df, cluster_labels, feature_names):
     
     return df_result, cluster_analysis, cluster_names
 
+@instrumented('plot')
 def visualize_cluster_profiles(cluster_analysis, cluster_names, clustering_dir):
     """
     Визуализирует профили кластеров.
     """
     print("\nВизуализация профилей кластеров...")
     
-    # 1. Radar chart для сравнения кластеров
+    chart_dir = 'results/Результаты 4 главы анализа'
+    submit_chart(os.path.join(chart_dir, '4.2.3. Средние значения данных анкет внутри кластеров.png'),
+                 draw_cluster_radar, cluster_analysis, cluster_names)
+    submit_chart(os.path.join(chart_dir, '4.2.4. Успешность поиска по типам кластеров.png'),
+                 draw_cluster_success, cluster_analysis)
+    submit_chart(os.path.join(chart_dir, '4.2.5. Тепловая карта кластеров.png'),
+                 draw_cluster_heatmap, cluster_analysis)
+
+# Признаки для radar chart и тепловой карты (исключаем размер и успешность)
+RADAR_FEATURES = ['Ср_фото', 'Ср_длина_описания', 'Ср_полнота', 
+                  'Ср_скорость_публикации', 'Ср_активность']
+
+def draw_cluster_radar(cluster_analysis, cluster_names):
+    """
+    Radar chart для сравнения кластеров.
+    """
     fig, axes = plt.subplots(2, 2, figsize=(20, 16))
     
-    # Признаки для radar chart (исключаем размер и успешность)
-    radar_features = ['Ср_фото', 'Ср_длина_описания', 'Ср_полнота', 
-                     'Ср_скорость_публикации', 'Ср_активность']
+    radar_features = RADAR_FEATURES
     n_features = len(radar_features)
     
     # Углы для radar chart
@@ -346,13 +458,11 @@ def visualize_cluster_profiles(cluster_analysis, cluster_names, clustering_dir):
         ax.grid(True)
     
     plt.tight_layout()
-    
-    # Сохраняем radar chart
-    radar_path = os.path.join('results/Результаты 4 главы анализа/4.2.3. Средние значения данных анкет внутри кластеров.png')
-    plt.savefig(radar_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    # 2. Bar plot сравнения успешности
+
+def draw_cluster_success(cluster_analysis):
+    """
+    Bar plot сравнения успешности кластеров.
+    """
     plt.figure(figsize=(12, 6))
     success_data = cluster_analysis[['Доля_успеха', 'Название']].sort_values('Доля_успеха')
     
@@ -364,19 +474,19 @@ def visualize_cluster_profiles(cluster_analysis, cluster_names, clustering_dir):
     plt.xticks(range(len(success_data)), success_data['Название'], rotation=45)
     
     # Добавляем значения на столбцы
-    for bar, value in zip(bars, success_data['Доля_успеха']):
-        plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.01, 
-                f'{value:.1%}', ha='center', va='bottom', fontweight='bold')
+    if chart_annotations():
+        for bar, value in zip(bars, success_data['Доля_успеха']):
+            plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.01, 
+                    f'{value:.1%}', ha='center', va='bottom', fontweight='bold')
     
     plt.grid(True, alpha=0.3, axis='y')
     plt.tight_layout()
-    
-    # Сохраняем bar plot
-    bar_path = os.path.join('results/Результаты 4 главы анализа/4.2.4. Успешность поиска по типам кластеров.png')
-    plt.savefig(bar_path, dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    # 3. Heatmap характеристик кластеров
+
+def draw_cluster_heatmap(cluster_analysis):
+    """
+    Heatmap характеристик кластеров.
+    """
+    radar_features = RADAR_FEATURES
     plt.figure(figsize=(12, 8))
     
     # Подготовка данных для heatmap
@@ -390,15 +500,10 @@ def visualize_cluster_profiles(cluster_analysis, cluster_names, clustering_dir):
         if max_val > 0:
             heatmap_data[feature] = heatmap_data[feature] / max_val
     
-    sns.heatmap(heatmap_data.T, annot=True, cmap='YlOrRd', 
+    sns.heatmap(heatmap_data.T, annot=chart_annotations(), cmap='YlOrRd', 
                 fmt='.2f', linewidths=1, cbar_kws={'label': 'Нормализованное значение'})
     plt.title('Сравнение характеристик кластеров (Heatmap)')
     plt.tight_layout()
-    
-    # Сохраняем heatmap
-    heatmap_path = os.path.join('results/Результаты 4 главы анализа/4.2.5. Тепловая карта кластеров.png')
-    plt.savefig(heatmap_path, dpi=300, bbox_inches='tight')
-    plt.close()
 
 def print_cluster_insights(cluster_analysis, cluster_names):
     """
@@ -444,10 +549,6 @@ def step_4_2():
     sns.set_palette("husl")
     pd.set_option('display.max_columns', None)
 
-    # Укажите пути к вашим файлам
-    LOST_FILE = 'data/Dataset_final_Pet911_lost.csv'
-    FOUND_FILE = 'data/dataset_final_Pet911_found.csv'
-    
     try:
         print("=== КЛАСТЕРИЗАЦИЯ ПО КАЧЕСТВУ ОФОРМЛЕНИЯ АНКЕТ ===")
         
@@ -458,27 +559,46 @@ def step_4_2():
         df = load_and_prepare_data(LOST_FILE, FOUND_FILE)
         clustering_features, df_with_features = create_clustering_features(df)
         
-        # 2. Масштабирование признаков
-        scaler = StandardScaler()
-        features_scaled = scaler.fit_transform(clustering_features)
         feature_names = clustering_features.columns.tolist()
         
-        # 3. Поиск оптимального количества кластеров
-        optimal_k = find_optimal_clusters(features_scaled, clustering_dir)
+        # Графики шагов 3-7 рисуются одной пачкой в пуле процессов
+        with chart_batch():
+            # 2. Сохранённая модель кластеров, если данные не сдвинулись (иначе обучение заново)
+            reused = load_reusable_model(clustering_features)
+            saved_names = None
+        
+            if reused is not None:
+                model, features_scaled, cluster_labels = reused
+                saved_names = model.cluster_names
+                if model.selection is not None:
+                    plot_cluster_selection(model.selection)
+            else:
+                # Масштабирование признаков
+                scaler = StandardScaler()
+                features_scaled = scaler.fit_transform(clustering_features)
+            
+                # 3. Поиск оптимального количества кластеров
+                optimal_k, selection = find_optimal_clusters(features_scaled, clustering_dir)
+            
+                # 4. Выполнение кластеризации
+                cluster_labels, kmeans_model = perform_clustering(features_scaled, optimal_k)
         
-        # 4. Выполнение кластеризации
-        cluster_labels, kmeans_model = perform_clustering(features_scaled, optimal_k)
+            # 5. Визуализация в 2D
+            features_2d = visualize_clusters_2d(features_scaled, cluster_labels, feature_names, clustering_dir)
         
-        # 5. Визуализация в 2D
-        features_2d = visualize_clusters_2d(features_scaled, cluster_labels, feature_names, clustering_dir)
+            # 6. Создание профилей кластеров
+            df_result, cluster_analysis, cluster_names = create_cluster_profiles(
+                df_with_features, cluster_labels, feature_names, saved_names
+            )
         
-        # 6. Создание профилей кластеров
-        df_result, cluster_analysis, cluster_names = create_cluster_profiles(
-            df_with_features, cluster_labels, feature_names
-        )
+            if reused is None:
+                ClusterModel.from_fit(
+                    scaler, kmeans_model, feature_names, cluster_names, features_scaled, cluster_labels, selection
+                ).save()
+                print(f"💾 Модель кластеров сохранена: {CLUSTER_MODEL_FILE}")
         
-        # 7. Визуализация профилей
-        visualize_cluster_profiles(cluster_analysis, cluster_names, clustering_dir)
+            # 7. Визуализация профилей
+            visualize_cluster_profiles(cluster_analysis, cluster_names, clustering_dir)
         
         # 8. Вывод инсайтов
         print_cluster_insights(cluster_analysis, cluster_names)
@@ -488,8 +608,9 @@ def step_4_2():
         csv_result_path = os.path.join(clustering_dir, 'объявления_с_кластерами.csv')
         csv_analysis_path = os.path.join(clustering_dir, 'анализ_кластеров.csv')
         
-        df_result.to_csv(csv_result_path, index=False, encoding='utf-8-sig')
-        cluster_analysis.to_csv(csv_analysis_path, encoding='utf-8-sig')
+        with phase('save', rows=len(df_result)):
+            df_result.to_csv(csv_result_path, index=False, encoding='utf-8-sig')
+            cluster_analysis.to_csv(csv_analysis_path, encoding='utf-8-sig')
         
 
         
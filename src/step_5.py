@@ -1,12 +1,15 @@
 from .deps import *
+from .dataset import load_dataset, parse_russian_dates, LOST_FILE, FOUND_FILE
+from .charts import submit_chart, chart_batch
+from .metrics import instrumented
 
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Константы по умолчанию (пути/названия столбцов)
 # ----------------------------------------------------------------------------------------------------------------------
-DEFAULT_LOST_FILE = 'data/Dataset_final_Pet911_lost.csv'
-DEFAULT_FOUND_FILE = 'data/dataset_final_Pet911_found.csv'
+DEFAULT_LOST_FILE = LOST_FILE
+DEFAULT_FOUND_FILE = FOUND_FILE
 DEFAULT_OUTPUT_DIR = 'results/Результаты 5 главы анализа'
 
 COLUMN_NAMES_LOST = [
@@ -23,12 +26,36 @@ COLUMN_NAMES_FOUND = [
     'количество_фото', 'количество_комментариев', 'дата находки', 'есть_контакты'
 ]
 
-# Словарь замены русских дней недели
-DAY_MAP = {'пн': 'Mon', 'вт': 'Tue', 'ср': 'Wed', 'чт': 'Thu', 'пт': 'Fri', 'сб': 'Sat', 'вс': 'Sun'}
-
 # Ключевые города для определения "город/область"
 URBAN_KEYWORDS = ['москва', 'санкт-петербург', 'vidnoye', 'kolomna', 'obninsk', 'moskva']
 
+# Параметры сохранения графиков главы 5
+SAVEFIG_PARAMS = {'dpi': 150}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Функции рисования (выполняются в процессах отрисовки)
+# ----------------------------------------------------------------------------------------------------------------------
+def draw_status_boxplot(data: pd.DataFrame, y: str, title: str, ylabel: str, xlabel: str):
+    """Boxplot значения y по статусу объявления (статусы - в порядке появления, как у строковой колонки)"""
+    plt.figure(figsize=(10, 6))
+    sns.boxplot(data=data, x='статус', y=y, order=list(data['статус'].unique()))
+    plt.title(title)
+    plt.ylabel(ylabel)
+    plt.xlabel(xlabel)
+    plt.tight_layout()
+
+
+def draw_rate_bar(rates: pd.Series, title: str, ylabel: str, xlabel: str):
+    """Столбчатая диаграмма доли успешных объявлений по группам"""
+    plt.figure(figsize=(8, 6))
+    rates.plot(kind='bar')
+    plt.title(title)
+    plt.ylabel(ylabel)
+    plt.xlabel(xlabel)
+    plt.xticks(rotation=0)
+    plt.tight_layout()
+
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Класс-аналитик
@@ -62,44 +89,20 @@ class Pet911Analyzer:
         os.makedirs(self.output_dir, exist_ok=True)
 
     # ----------------------------- Работа с файлами и загрузка -----------------------------
-    def load_data(self, file_path: str, columns: list) -> pd.DataFrame:
+    @instrumented('load')
+    def load_data(self, file_path: str, columns: list, dataset_type: str) -> pd.DataFrame:
         """
-        Загружает CSV с заданными колонками. Поведение совпадает с оригиналом:
-        - использует encoding='utf-8'
-        - header=None и передаёт names=columns
-        - удаляет первую строку, если она похоже на заголовки (проверяется по 'url')
+        Загружает датасет через общий слой загрузки (типы и даты уже приведены к схеме)
+        и оставляет заданные колонки в исходном порядке.
         """
         try:
-            df = pd.read_csv(file_path, names=columns, header=None, encoding='utf-8')
-            # Удаляем первую строку, если это заголовки (как в оригинале)
-            if isinstance(df.iloc[0]['url'], str) and 'http' not in df.iloc[0]['url']:
-                df = df.drop(0).reset_index(drop=True)
-            return df
+            df = load_dataset(dataset_type, file_path)
+            return df[columns]
         except Exception as e:
             print(f"❌ Ошибка загрузки {file_path}: {e}")
             return pd.DataFrame()
 
     # ----------------------------- Вспомогательные функции для обработки -----------------------------
-    @staticmethod
-    def parse_russian_date(date_str: str):
-        """
-        Парсит строку вида 'пн, 01.01.2020' -> pd.Timestamp
-        Поведение и проверки совпадают с оригиналом.
-        """
-        if pd.isna(date_str) or str(date_str).strip() in ['Неизвестно', '', 'nan']:
-            return pd.NaT
-        try:
-            parts = str(date_str).strip().split(', ')
-            if len(parts) != 2:
-                return pd.NaT
-            day_en = DAY_MAP.get(parts[0].strip())
-            if not day_en:
-                return pd.NaT
-            full_str = f"{day_en}, {parts[1]}"
-            return pd.to_datetime(full_str, format='%a, %d.%m.%Y', errors='coerce')
-        except Exception:
-            return pd.NaT
-
     @staticmethod
     def clean_age(age):
         """
@@ -123,10 +126,10 @@ class Pet911Analyzer:
         return 'Да'
 
     # ----------------------------- Подготовка данных -----------------------------
+    @instrumented('preprocess')
     def prepare_data(self):
         """
         Выполняет все шаги предобработки, идентичные оригиналу:
-        - парсит даты
         - считает время_до_публикации
         - очищает возраст
         - определяет тип_местности
@@ -134,8 +137,8 @@ class Pet911Analyzer:
         """
         # Загружаем
         print("🔍 Начало загрузки данных...")
-        self.lost_df = self.load_data(self.lost_file, COLUMN_NAMES_LOST)
-        self.found_df = self.load_data(self.found_file, COLUMN_NAMES_FOUND)
+        self.lost_df = self.load_data(self.lost_file, COLUMN_NAMES_LOST, 'lost')
+        self.found_df = self.load_data(self.found_file, COLUMN_NAMES_FOUND, 'found')
 
         if self.lost_df.empty or self.found_df.empty:
             print("❌ Не удалось загрузить данные. Проверьте пути к файлам.")
@@ -144,20 +147,14 @@ class Pet911Analyzer:
         print("✅ Данные успешно загружены")
         print(f"📊 Пропавшие: {len(self.lost_df)}, Найденные: {len(self.found_df)}")
 
-        # Парсинг дат и расчёт времени до публикации (lost)
-        for col in ['дата_публикации', 'дата пропажи']:
-            if col in self.lost_df.columns:
-                self.lost_df[col] = self.lost_df[col].astype(str).apply(self.parse_russian_date)
+        # Расчёт времени до публикации (lost); разбираются только различные строки дат
         self.lost_df['время_до_публикации'] = (
-            self.lost_df['дата_публикации'] - self.lost_df['дата пропажи']
+            parse_russian_dates(self.lost_df['дата_публикации']) - parse_russian_dates(self.lost_df['дата пропажи'])
         ).dt.days
 
-        # Парсинг дат и расчёт времени до публикации (found)
-        for col in ['дата_публикации', 'дата находки']:
-            if col in self.found_df.columns:
-                self.found_df[col] = self.found_df[col].astype(str).apply(self.parse_russian_date)
+        # Расчёт времени до публикации (found)
         self.found_df['время_до_публикации'] = (
-            self.found_df['дата_публикации'] - self.found_df['дата находки']
+            parse_russian_dates(self.found_df['дата_публикации']) - parse_russian_dates(self.found_df['дата находки'])
         ).dt.days
 
         # Очистка возраста
@@ -177,6 +174,7 @@ class Pet911Analyzer:
         self.found_df['породистое'] = self.found_df['порода'].apply(self.is_pedigree)
 
     # ----------------------------- Генерация графиков -----------------------------
+    @instrumented('plot')
     def generate_plots(self):
         """
         Генерирует и сохраняет все графики в директорию output_dir,
@@ -189,50 +187,29 @@ class Pet911Analyzer:
         # 1. Время до публикации (lost)
         valid_data = self.lost_df[['статус', 'время_до_публикации']].dropna()
         if len(valid_data) > 0 and valid_data['статус'].nunique() > 1:
-            plt.figure(figsize=(10, 6))
-            sns.boxplot(data=valid_data, x='статус', y='время_до_публикации')
-            plt.title("Влияние скорости публикации на успех (При пропаже)")
-            plt.ylabel("Время до публикации, дни")
-            plt.xlabel("Статус объявления")
-            plt.tight_layout()
-            plt.savefig(os.path.join(self.output_dir, '5.1. Влияние скорости публикации на успех (При пропаже).png'), dpi=150)
-            plt.close()
+            submit_chart(os.path.join(self.output_dir, '5.1. Влияние скорости публикации на успех (При пропаже).png'),
+                         draw_status_boxplot, valid_data, 'время_до_публикации',
+                         "Влияние скорости публикации на успех (При пропаже)", "Время до публикации, дни",
+                         "Статус объявления", save=SAVEFIG_PARAMS)
 
         # 2. Возраст (lost)
         age_data = self.lost_df[self.lost_df['возраст_число'].notna()]
         if len(age_data) > 0:
-            plt.figure(figsize=(10, 6))
-            sns.boxplot(data=age_data, x='статус', y='возраст_число')
-            plt.title("Возраст (При пропаже)")
-            plt.ylabel("Возраст, лет")
-            plt.xlabel("Статус")
-            plt.tight_layout()
-            plt.savefig(os.path.join(self.output_dir, '5.2. Возраст (При пропаже).png'), dpi=150)
-            plt.close()
+            submit_chart(os.path.join(self.output_dir, '5.2. Возраст (При пропаже).png'),
+                         draw_status_boxplot, age_data[['статус', 'возраст_число']], 'возраст_число',
+                         "Возраст (При пропаже)", "Возраст, лет", "Статус", save=SAVEFIG_PARAMS)
 
         # 3. Местность (lost)
-        plt.figure(figsize=(8, 6))
         terrain_success = self.lost_df.groupby('тип_местности')['статус'].apply(lambda x: (x == 'питомец найден').mean())
-        terrain_success.plot(kind='bar')
-        plt.title("Успешность по типу местности (При пропаже)")
-        plt.ylabel("Доля найденных")
-        plt.xlabel("Тип местности")
-        plt.xticks(rotation=0)
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, '5.3. Успешность по типу местности (При пропаже).png'), dpi=150)
-        plt.close()
+        submit_chart(os.path.join(self.output_dir, '5.3. Успешность по типу местности (При пропаже).png'),
+                     draw_rate_bar, terrain_success, "Успешность по типу местности (При пропаже)",
+                     "Доля найденных", "Тип местности", save=SAVEFIG_PARAMS)
 
         # 4. Породистость (lost)
-        plt.figure(figsize=(8, 6))
         breed_success = self.lost_df.groupby('породистое')['статус'].apply(lambda x: (x == 'питомец найден').mean())
-        breed_success.plot(kind='bar')
-        plt.title("Влияние породистости на успех (При пропаже)")
-        plt.ylabel("Доля найденных")
-        plt.xlabel("Породистое животное")
-        plt.xticks(rotation=0)
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, '5.4. Влияние породистости на успех (При пропаже).png'), dpi=150)
-        plt.close()
+        submit_chart(os.path.join(self.output_dir, '5.4. Влияние породистости на успех (При пропаже).png'),
+                     draw_rate_bar, breed_success, "Влияние породистости на успех (При пропаже)",
+                     "Доля найденных", "Породистое животное", save=SAVEFIG_PARAMS)
 
         # ------------------ По находке ------------------
         print("\n📌 Генерация графиков по находке...")
@@ -244,40 +221,25 @@ class Pet911Analyzer:
         # 1. Время до публикации (found)
         valid_data = self.found_df[['статус', 'время_до_публикации']].dropna()
         if len(valid_data) > 0 and valid_data['статус'].nunique() > 1:
-            plt.figure(figsize=(10, 6))
-            sns.boxplot(data=valid_data, x='статус', y='время_до_публикации')
-            plt.title("Влияние скорости публикации на успех (При находке)")
-            plt.ylabel("Время до публикации, дни")
-            plt.xlabel("Статус")
-            plt.tight_layout()
-            plt.savefig(os.path.join(self.output_dir, '5.5. Влияние скорости публикации на успех (При находке).png'), dpi=150)
-            plt.close()
+            submit_chart(os.path.join(self.output_dir, '5.5. Влияние скорости публикации на успех (При находке).png'),
+                         draw_status_boxplot, valid_data, 'время_до_публикации',
+                         "Влияние скорости публикации на успех (При находке)", "Время до публикации, дни",
+                         "Статус", save=SAVEFIG_PARAMS)
 
         # 2. Местность (found)
-        plt.figure(figsize=(8, 6))
         place_success = self.found_df.groupby('тип_местности')['статус'].apply(lambda x: (x == 'хозяин найден').mean())
-        place_success.plot(kind='bar')
-        plt.title("Успешность по типу местности (При находке)")
-        plt.ylabel("Доля возвратов")
-        plt.xlabel("Тип местности")
-        plt.xticks(rotation=0)
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, '5.6. Успешность по типу местности (При находке).png'), dpi=150)
-        plt.close()
+        submit_chart(os.path.join(self.output_dir, '5.6. Успешность по типу местности (При находке).png'),
+                     draw_rate_bar, place_success, "Успешность по типу местности (При находке)",
+                     "Доля возвратов", "Тип местности", save=SAVEFIG_PARAMS)
 
         # 3. Породистость (found)
-        plt.figure(figsize=(8, 6))
         breed_return = self.found_df.groupby('породистое')['статус'].apply(lambda x: (x == 'хозяин найден').mean())
-        breed_return.plot(kind='bar')
-        plt.title("Влияние породистости на успех (При находке)")
-        plt.ylabel("Доля возвратов")
-        plt.xlabel("Породистое животное")
-        plt.xticks(rotation=0)
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.output_dir, '5.7. Влияние породистости на успех (При находке).png'), dpi=150)
-        plt.close()
+        submit_chart(os.path.join(self.output_dir, '5.7. Влияние породистости на успех (При находке).png'),
+                     draw_rate_bar, breed_return, "Влияние породистости на успех (При находке)",
+                     "Доля возвратов", "Породистое животное", save=SAVEFIG_PARAMS)
 
     # ----------------------------- Сводный вывод (текст) -----------------------------
+    @instrumented('aggregate')
     def generate_summary(self) -> list:
         """
         Генерирует список строк с итоговым выводом (output_lines) — логика как в оригинале.
@@ -330,6 +292,7 @@ class Pet911Analyzer:
 
         return output_lines
 
+    @instrumented('save')
     def save_summary(self, output_lines: list):
         """
         Сохраняет output_lines в файл 'Вывод 5 главы.txt' в output_dir и печатает строки — поведение как в оригинале.
@@ -349,7 +312,9 @@ class Pet911Analyzer:
         prepare_data -> generate_plots -> generate_summary -> save_summary
         """
         self.prepare_data()
-        self.generate_plots()
+        # Графики рисуются одной пачкой в пуле процессов
+        with chart_batch():
+            self.generate_plots()
         summary = self.generate_summary()
         self.save_summary(summary)
 
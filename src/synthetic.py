@@ -0,0 +1,181 @@
+from .deps import *
+import argparse
+
+from .dataset import DATASET_FILES, EVENT_DATE_COLUMNS, ENCODINGS, parse_russian_dates
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Синтетические датасеты Pet911 для замеров на больших объёмах: распределения выучиваются по двум CSV из data,
+# результат - CSV той же схемы (те же колонки, формат дат, флагов и пустых значений) произвольного размера.
+# Генерация детерминирована: одинаковые seed и число строк дают одинаковые файлы
+# ----------------------------------------------------------------------------------------------------------------------
+SOURCE_DIR = 'data'
+SYNTHETIC_DIR = os.path.join('data', 'synthetic')
+
+# Генерация и запись частями: память не зависит от числа строк. У каждой части свой генератор случайных чисел
+# (seed, тип датасета, номер части)
+CHUNK_ROWS = 100_000
+
+# Поля объявления, которые берутся вместе из одной строки-образца: сохраняется совместное распределение
+# региона, места, статуса, типа животного, длины описания, фото, комментариев и задержки публикации
+CORE_COLUMNS = [
+    'тип объявления', 'регион', 'статус', 'тип_животного', 'место события', 'Длина_описания_в_словах',
+    'наличие_описания', 'есть_фото', 'количество_фото', 'количество_комментариев', 'есть_контакты'
+]
+# Приметы животного берутся из другой строки с тем же типом животного
+ANIMAL_COLUMNS = ['окрас', 'порода', 'пол', 'возраст']
+
+WEEKDAYS = ['пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс']
+DATASET_SEEDS = {'lost': 0, 'found': 1}
+
+
+def read_raw_csv(file_path):
+    """CSV без приведения типов: все поля - строки, пропуски - пустые строки (как в исходном файле)"""
+    for encoding in ENCODINGS:
+        try:
+            return pd.read_csv(file_path, encoding=encoding, dtype=str, keep_default_na=False)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Не удалось прочитать {file_path} ни в одной из кодировок {ENCODINGS}")
+
+
+def format_russian_dates(values):
+    """Обратное к parse_russian_dates: datetime64 -> 'пт, 26.09.2025', NaT -> пустая строка"""
+    codes, uniques = pd.factorize(pd.Series(values))
+    labels = [f"{WEEKDAYS[day.dayofweek]}, {day:%d.%m.%Y}" for day in pd.DatetimeIndex(uniques)]
+    return np.array(labels + [''], dtype=object)[codes]
+
+
+class SyntheticModel:
+    """
+    Распределения одного датасета (lost или found), выученные по настоящему CSV:
+    строки-образцы для совместного распределения полей, словарь описаний с частотами слов,
+    распределение дат публикации и формат идентификаторов.
+    """
+
+    def __init__(self, dataset_type, raw):
+        self.dataset_type = dataset_type
+        self.columns = list(raw.columns)
+        self.event_column = EVENT_DATE_COLUMNS[dataset_type]
+
+        self.templates = raw[CORE_COLUMNS + ANIMAL_COLUMNS].reset_index(drop=True)
+        self.url_prefixes = raw['url'].str.rsplit('/', n=1).str[0].to_numpy(dtype=object)
+
+        # Задержка публикации относительно события (дни) - из той же строки-образца;
+        # нераспознанная дата события ('Неизвестно') переносится из образца как есть
+        published = parse_russian_dates(raw['дата_публикации'])
+        self.lags = (published - parse_russian_dates(raw[self.event_column])).dt.days.to_numpy(dtype=float)
+        self.raw_events = raw[self.event_column].to_numpy(dtype=object)
+
+        # Даты публикации - эмпирическое распределение по дням
+        date_counts = published.dropna().value_counts().sort_index()
+        self.dates = date_counts.index.to_numpy(dtype='datetime64[D]')
+        self.date_probs = (date_counts / date_counts.sum()).to_numpy()
+
+        # Словарь описаний: слова (как в тексте, с пунктуацией) и их частоты
+        word_counts = raw['описание'].str.split().explode().dropna().value_counts()
+        self.vocabulary = word_counts.index.to_numpy(dtype=object)
+        self.word_probs = (word_counts / word_counts.sum()).to_numpy()
+
+        # Идентификаторы 'rl1076681': тот же префикс, номера - после максимального настоящего
+        parts = raw['id'].str.extract(r'^(\D*)(\d+)$')
+        self.id_prefix = parts[0].mode().iloc[0]
+        self.id_start = int(pd.to_numeric(parts[1]).max()) + 1
+
+        self.animal_rows = {
+            animal: np.flatnonzero(self.templates['тип_животного'].to_numpy() == animal)
+            for animal in self.templates['тип_животного'].unique()
+        }
+
+    @classmethod
+    def learn(cls, dataset_type, source_dir=SOURCE_DIR):
+        file_path = os.path.join(source_dir, os.path.basename(DATASET_FILES[dataset_type]))
+        return cls(dataset_type, read_raw_csv(file_path))
+
+    def descriptions(self, lengths, rng):
+        """Описания заданной длины в словах из словаря настоящих описаний (длина 0 - пустое описание)"""
+        lengths = np.asarray(lengths, dtype=np.int64)
+        words = self.vocabulary[rng.choice(len(self.vocabulary), size=int(lengths.sum()), p=self.word_probs)]
+        ends = np.cumsum(lengths)
+        return [' '.join(words[end - length:end]) for length, end in zip(lengths, ends)]
+
+    def sample(self, rows, rng, first_row=0):
+        """Часть синтетического датасета: rows строк, номера объявлений начиная с first_row"""
+        picks = rng.integers(0, len(self.templates), size=rows)
+        df = self.templates.iloc[picks, :len(CORE_COLUMNS)].reset_index(drop=True)
+
+        # Приметы - из случайной строки с тем же типом животного
+        animals = df['тип_животного'].to_numpy()
+        donors = np.empty(rows, dtype=np.int64)
+        for animal, candidates in self.animal_rows.items():
+            mask = animals == animal
+            donors[mask] = rng.choice(candidates, size=int(mask.sum()))
+        for col in ANIMAL_COLUMNS:
+            df[col] = self.templates[col].to_numpy(dtype=object)[donors]
+
+        ids = self.id_prefix + pd.Series(np.arange(first_row, first_row + rows) + self.id_start).astype(str)
+        df['id'] = ids.to_numpy(dtype=object)
+        df['url'] = self.url_prefixes[picks] + '/' + df['id'].to_numpy(dtype=object)
+
+        published = self.dates[rng.choice(len(self.dates), size=rows, p=self.date_probs)]
+        lags = self.lags[picks]
+        unknown = np.isnan(lags)
+        event = published - np.where(unknown, 0, lags).astype('timedelta64[D]')
+        df['дата_публикации'] = format_russian_dates(published)
+        df[self.event_column] = np.where(unknown, self.raw_events[picks], format_russian_dates(event))
+
+        df['описание'] = self.descriptions(df['Длина_описания_в_словах'].astype(int), rng)
+        return df[self.columns]
+
+    def write_csv(self, rows, file_path, seed=42, chunk_rows=CHUNK_ROWS):
+        """Записывает rows строк в CSV частями (временный файл + атомарная замена)"""
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8-sig', newline='') as f:
+            for chunk, first_row in enumerate(range(0, rows, chunk_rows)):
+                rng = np.random.default_rng([seed, DATASET_SEEDS[self.dataset_type], chunk])
+                part = self.sample(min(chunk_rows, rows - first_row), rng, first_row)
+                part.to_csv(f, index=False, header=first_row == 0, lineterminator='\n')
+        os.replace(tmp_path, file_path)
+        return file_path
+
+
+def generate_datasets(rows, output_dir=None, seed=42, source_dir=SOURCE_DIR, lost_share=None):
+    """
+    Генерирует пару lost/found CSV с общим числом строк rows в output_dir (по умолчанию data/synthetic/<rows>)
+    под теми же именами файлов, что и настоящие данные. Доля lost по умолчанию - как в исходных данных.
+    Возвращает словарь: тип датасета -> путь к файлу.
+    """
+    if output_dir is None:
+        output_dir = os.path.join(SYNTHETIC_DIR, str(rows))
+
+    models = {dataset_type: SyntheticModel.learn(dataset_type, source_dir) for dataset_type in DATASET_FILES}
+    if lost_share is None:
+        lost_share = len(models['lost'].templates) / sum(len(model.templates) for model in models.values())
+    lost_rows = int(round(rows * lost_share))
+    counts = {'lost': lost_rows, 'found': rows - lost_rows}
+
+    paths = {}
+    for dataset_type, model in models.items():
+        path = os.path.join(output_dir, os.path.basename(DATASET_FILES[dataset_type]))
+        paths[dataset_type] = model.write_csv(counts[dataset_type], path, seed)
+        print(f"✅ {dataset_type}: {counts[dataset_type]:,} строк -> {path}")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетических датасетов Pet911")
+    parser.add_argument('--rows', type=int, required=True, help="Общее число строк (lost + found)")
+    parser.add_argument('--seed', type=int, default=42, help="Зерно генератора")
+    parser.add_argument('--output-dir', default=None, help="Папка для CSV (по умолчанию data/synthetic/<rows>)")
+    parser.add_argument('--source-dir', default=SOURCE_DIR, help="Папка с настоящими CSV, по которым учатся распределения")
+    parser.add_argument('--lost-share', type=float, default=None, help="Доля объявлений lost (по умолчанию - как в данных)")
+    args = parser.parse_args()
+
+    start = datetime.now()
+    paths = generate_datasets(args.rows, args.output_dir, args.seed, args.source_dir, args.lost_share)
+    print(f"⏱️ Готово за {(datetime.now() - start).total_seconds():.1f} c. "
+          f"Запуск анализа на этих данных: PET911_DATA_DIR={os.path.dirname(paths['lost'])} python main.py")
+
+
+if __name__ == '__main__':
+    main()